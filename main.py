@@ -1,10 +1,43 @@
-from py_spring_core import PySpringApplication
-from py_spring_model import provide_py_spring_model
-from src.service.ticket_bot.google_login_handler import LoginCredential
-from src.service.ticket_bot.tixcraft_ticket_assistant import Event, TixcraftTicketAssistant
+import json
+from typing import TYPE_CHECKING, Optional
+import uuid
+
 import typer
 
+from src.commons.startup_profiler import startup_profiler
+
+if TYPE_CHECKING:
+    from py_spring_core import PySpringApplication
+
+# heavy imports (selenium, ddddocr, SQLAlchemy, FastAPI) are deferred into the commands
+# so --help, check-config and --profile-startup do not pay for them up front
+
 app = typer.Typer()
+tokens_app = typer.Typer(help="Bulk token health checks, import and export.")
+app.add_typer(tokens_app, name="tokens")
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile_startup: bool = typer.Option(False, "--profile-startup", help="Report import and init time per module and component."),
+):
+    if not profile_startup:
+        return
+    startup_profiler.enable()
+    ctx.call_on_close(lambda: typer.echo(startup_profiler.report()))
+
+
+def _create_application(config_file: str) -> "PySpringApplication":
+    with startup_profiler.span("import py_spring"):
+        from py_spring_core import PySpringApplication
+        from py_spring_model import provide_py_spring_model
+
+    with startup_profiler.span("PySpringApplication boot"):
+        app_instance = PySpringApplication(config_file, [provide_py_spring_model()])
+        app_instance.run()
+    return app_instance
+
 
 @app.command()
 def purchase_ticket(
@@ -19,6 +52,8 @@ def purchase_ticket(
     password: str = typer.Option(..., help="Password for Google login."),
     config_file: str = typer.Option("./app-config.json", help="Path to the app configuration file.")
 ):
+    from src.service.ticket_bot.google_login_handler import LoginCredential
+    from src.service.ticket_bot.tixcraft_ticket_assistant import Event, TixcraftTicketAssistant
 
     # Create Event and Credential objects
     event = Event(
@@ -33,13 +68,182 @@ def purchase_ticket(
     credential = LoginCredential(email=email, password=password)
 
     # Initialize and run the application
-    app_instance = PySpringApplication(config_file, [provide_py_spring_model()])
-    app_instance.run()
+    app_instance = _create_application(config_file)
 
     # Access the ticket assistant and purchase the ticket
     assistant = app_instance.app_context.get_component(TixcraftTicketAssistant)
     if assistant is not None:
         assistant.purchase_ticket(credential, event)
 
+@app.command()
+def serve(
+    config_file: str = typer.Option("./daemon-app-config.json", help="Path to the app configuration file, the server must be enabled in it.")
+):
+    # Boot once and keep the OCR engine, DB pool and drivers warm, jobs are submitted through the REST API
+    _create_application(config_file)
+
+@app.command()
+def warm_up(
+    launch_driver: bool = typer.Option(True, help="Launch and close one webdriver as part of the warm up."),
+    config_file: str = typer.Option("./app-config.json", help="Path to the app configuration file.")
+):
+    from src.service.preflight.preflight_service import PreflightService
+
+    app_instance = _create_application(config_file)
+    preflight_service = app_instance.app_context.get_component(PreflightService)
+    if preflight_service is None:
+        raise typer.Exit(code=1)
+    steps = preflight_service.warm_up(is_launching_driver=launch_driver)
+    for step in steps:
+        status = "OK" if step.is_succeeded else f"FAILED ({step.error})"
+        typer.echo(f"[PREFLIGHT] {step.name}: {step.seconds:.2f}s {status}")
+    if not all(step.is_succeeded for step in steps):
+        raise typer.Exit(code=1)
+
+@app.command()
+def run_manifest(
+    manifest_file: str = typer.Argument(..., help="JSONL or CSV manifest, one purchase per record."),
+    max_workers: Optional[int] = typer.Option(None, help="Size of the shared worker pool, defaults to purchase_job.max_workers."),
+    is_async: bool = typer.Option(False, "--async", help="Drive every purchase from one event loop through the async WebDriver client."),
+    config_file: str = typer.Option("./app-config.json", help="Path to the app configuration file.")
+):
+    from src.service.purchase_job.commons import JobState
+    from src.service.purchase_job.manifest import iter_manifest
+    from src.service.purchase_job.purchase_job_manager import PurchaseJobManager
+
+    app_instance = _create_application(config_file)
+    if is_async:
+        _run_manifest_async(app_instance, manifest_file)
+        return
+    job_manager = app_instance.app_context.get_component(PurchaseJobManager)
+    if job_manager is None:
+        raise typer.Exit(code=1)
+    job_manager.start_workers(max_workers)
+
+    job_ids: set[uuid.UUID] = set()
+    invalid_line_count = 0
+    for line in iter_manifest(manifest_file):
+        if line.request is None:
+            invalid_line_count += 1
+            typer.echo(f"[MANIFEST] Line {line.line_number} skipped: {line.error}")
+            continue
+        job_ids.add(job_manager.submit_job(line.request).id)
+    typer.echo(f"[MANIFEST] Submitted {len(job_ids)} jobs, skipped {invalid_line_count} invalid lines")
+
+    jobs = job_manager.wait_for_jobs(job_ids)
+    for state in JobState:
+        typer.echo(f"[MANIFEST] {state.value}: {sum(1 for job in jobs if job.state == state)}")
+
+def _run_manifest_async(app_instance, manifest_file: str) -> None:
+    from src.service.purchase_job.manifest import iter_manifest
+    from src.service.ticket_bot.async_tixcraft_ticket_assistant import AsyncTixcraftTicketAssistant
+
+    async_assistant = app_instance.app_context.get_component(AsyncTixcraftTicketAssistant)
+    if async_assistant is None:
+        raise typer.Exit(code=1)
+    requests = []
+    for line in iter_manifest(manifest_file):
+        if line.request is None:
+            typer.echo(f"[MANIFEST] Line {line.line_number} skipped: {line.error}")
+            continue
+        requests.append(line.request)
+    typer.echo(f"[MANIFEST] Running {len(requests)} purchases on one event loop")
+    results = async_assistant.purchase_all(requests)
+    succeeded_count = sum(1 for result in results if result.is_purchased)
+    typer.echo(f"[MANIFEST] succeeded: {succeeded_count}, failed: {len(results) - succeeded_count}")
+    for result in results:
+        if result.payment_session_id is not None:
+            typer.echo(f"[MANIFEST] Pay for {result.email} on grid session: {result.payment_session_id}")
+
+@tokens_app.command("check")
+def check_tokens(
+    config_file: str = typer.Option("./app-config.json", help="Path to the app configuration file.")
+):
+    from src.service.token_health.token_health_service import TokenHealthService, TokenStatus
+
+    app_instance = _create_application(config_file)
+    token_health_service = app_instance.app_context.get_component(TokenHealthService)
+    if token_health_service is None:
+        raise typer.Exit(code=1)
+    results = token_health_service.check_tokens()
+    for result in results:
+        typer.echo(f"[TOKEN HEALTH] {result.email}: {result.status.value}")
+    for status in TokenStatus:
+        typer.echo(f"[TOKEN HEALTH] {status.value}: {sum(1 for result in results if result.status == status)}")
+    typer.echo(f"[TOKEN HEALTH] Waiting for re-login: {len(token_health_service.get_relogin_queue())}")
+
+@tokens_app.command("export")
+def export_tokens(
+    output_file: str = typer.Argument(..., help="JSONL file the valid tokens are written to."),
+    config_file: str = typer.Option("./app-config.json", help="Path to the app configuration file.")
+):
+    from src.service.token_health.token_health_service import TokenHealthService, write_token_records
+
+    app_instance = _create_application(config_file)
+    token_health_service = app_instance.app_context.get_component(TokenHealthService)
+    if token_health_service is None:
+        raise typer.Exit(code=1)
+    written_count = write_token_records(output_file, token_health_service.export_tokens())
+    typer.echo(f"[TOKEN EXPORT] Exported {written_count} tokens to {output_file}")
+
+@tokens_app.command("import")
+def import_tokens(
+    input_file: str = typer.Argument(..., help="JSONL file with one token record per line."),
+    config_file: str = typer.Option("./app-config.json", help="Path to the app configuration file.")
+):
+    from src.service.token_health.token_health_service import TokenHealthService, read_token_records
+
+    app_instance = _create_application(config_file)
+    token_health_service = app_instance.app_context.get_component(TokenHealthService)
+    if token_health_service is None:
+        raise typer.Exit(code=1)
+    imported_count = token_health_service.import_tokens(read_token_records(input_file))
+    typer.echo(f"[TOKEN IMPORT] Imported {imported_count} tokens from {input_file}")
+
+def _discover_properties_classes() -> list[type]:
+    # modules declaring a Properties subclass are found by parsing the sources, so a new
+    # properties class is checked without being listed here. Those modules must not import selenium
+    import ast
+    import importlib
+    from pathlib import Path
+
+    from py_spring_core import Properties
+
+    root = Path(__file__).parent
+    for path in sorted((root / "src").rglob("*.py")):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        if any(
+            isinstance(node, ast.ClassDef)
+            and any(isinstance(base, ast.Name) and base.id == "Properties" for base in node.bases)
+            for node in tree.body
+        ):
+            importlib.import_module(".".join(path.relative_to(root).with_suffix("").parts))
+    return sorted(
+        (cls for cls in Properties.__subclasses__() if cls.__module__.startswith("src.")),
+        key=lambda cls: cls.__key__,
+    )
+
+@app.command()
+def check_config(
+    config_file: str = typer.Option("./app-config.json", help="Path to the app configuration file.")
+):
+    # Validates the properties without booting the application, no DB, OCR or browser is touched
+    with open(config_file) as file:
+        app_config = json.load(file)
+    with open(app_config["properties_file_path"]) as file:
+        properties = json.load(file)
+
+    is_valid = True
+    for properties_cls in _discover_properties_classes():
+        key = properties_cls.__key__
+        try:
+            properties_cls.model_validate(properties.get(key, {}))
+            typer.echo(f"[CHECK CONFIG] {key}: OK")
+        except Exception as error:
+            is_valid = False
+            typer.echo(f"[CHECK CONFIG] {key}: {error}")
+    if not is_valid:
+        raise typer.Exit(code=1)
+
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
@@ -0,0 +1,138 @@
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import statistics
+import threading
+import time
+from typing import Callable
+
+"""
+Per-command latency of the hot purchase commands, classic WebDriver against the
+CDP transport, on a local headless Chrome and a local page. The page is taller
+than the viewport and keeps the captcha below the fold like the ticket form, the
+captcha crop of both transports is checked before timing starts.
+
+python -m scripts.cdp_benchmark --iterations 200
+"""
+
+BENCHMARK_PAGE = """<!DOCTYPE html>
+<html><body style="margin: 0; background: #ffffff;">
+<ul id="all"><li><a href="#">Event</a></li></ul>
+<div style="height: 3000px;"></div>
+<div id="TicketForm_verifyCode-image" style="width: 120px; height: 40px; background: #ff0000;"></div>
+<div style="height: 1000px;"></div>
+<button id="submitButton" onclick="window.clicks = (window.clicks || 0) + 1">Submit</button>
+</body></html>
+"""
+
+EVALUATE_SCRIPT = "return Array.from(document.querySelectorAll('#all a')).map(a => a.innerText);"
+
+
+class BenchmarkHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        payload = BENCHMARK_PAGE.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+def is_captcha_crop(png: bytes) -> bool:
+    # the captcha stand-in is solid red, a crop taken at the wrong offset shows the white page
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(png)).convert("RGB")
+    red, green, blue = image.getpixel((image.width // 2, image.height // 2))
+    return red > 200 and green < 60 and blue < 60
+
+
+def measure(command: Callable[[], object], iterations: int) -> list[float]:
+    command()  # warm up, e.g. opening the websocket
+    latencies_ms = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        command()
+        latencies_ms.append((time.perf_counter() - started_at) * 1000)
+    return latencies_ms
+
+
+def percentile(latencies_ms: list[float], ratio: float) -> float:
+    ordered = sorted(latencies_ms)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="WebDriver vs CDP transport command latency")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--navigations", type=int, default=20, help="Navigations are slow, measure fewer")
+    args = parser.parse_args()
+
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+
+    from src.commons.cdp_transport import CdpTransport
+    from src.commons.properties import CdpTransportProperties
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), BenchmarkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}/"
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.get(url)
+        cookie = {"name": "SID", "value": "benchmark", "path": "/", "domain": "127.0.0.1"}
+        transport = CdpTransport(driver, CdpTransportProperties(is_enabled=True))
+        transport.sync_window()
+        for transport_name, png in [
+            ("webdriver", driver.find_element(By.ID, "TicketForm_verifyCode-image").screenshot_as_png),
+            ("cdp", transport.screenshot_as_png("#TicketForm_verifyCode-image")),
+        ]:
+            print(f"[CDP BENCHMARK] {transport_name} captcha crop after scrolling is correct: {is_captcha_crop(png)}")
+        commands: dict[str, tuple[Callable[[], object], Callable[[], object], int]] = {
+            "evaluate": (
+                lambda: driver.execute_script(EVALUATE_SCRIPT),
+                lambda: transport.execute_script(EVALUATE_SCRIPT),
+                args.iterations,
+            ),
+            "click": (
+                lambda: driver.find_element(By.ID, "submitButton").click(),
+                lambda: transport.click("#submitButton"),
+                args.iterations,
+            ),
+            "get_cookies": (driver.get_cookies, transport.get_cookies, args.iterations),
+            "add_cookie": (
+                lambda: driver.add_cookie(cookie),
+                lambda: transport.add_cookie(cookie),
+                args.iterations,
+            ),
+            "screenshot": (
+                lambda: driver.find_element(By.ID, "TicketForm_verifyCode-image").screenshot_as_png,
+                lambda: transport.screenshot_as_png("#TicketForm_verifyCode-image"),
+                args.iterations,
+            ),
+            "navigate": (lambda: driver.get(url), lambda: transport.get(url), args.navigations),
+        }
+        print(f"{'command':<12} {'transport':<10} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+        for name, (webdriver_command, cdp_command, iterations) in commands.items():
+            for transport_name, command in [("webdriver", webdriver_command), ("cdp", cdp_command)]:
+                latencies_ms = measure(command, iterations)
+                print(
+                    f"{name:<12} {transport_name:<10} {percentile(latencies_ms, 0.5):>8.2f} "
+                    f"{percentile(latencies_ms, 0.95):>8.2f} {statistics.mean(latencies_ms):>8.2f}"
+                )
+        if not transport.is_cdp_available:
+            print("[CDP BENCHMARK] CDP failed during the run, the cdp rows fell back to WebDriver")
+        transport.close()
+    finally:
+        driver.quit()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+"""
+Local stand-in for a tixcraft waiting room, used to exercise WaitingRoomGuard.
+
+GET /               assigns a ticket and redirects to the queue page
+GET /queue?id=N     interstitial first, then a queue page that polls /queue/status
+                    and moves itself to /area once the ticket is released
+GET /queue/status   JSON position / wait for a ticket
+GET /area           the seat list the purchase resumes on
+GET /stats          page loads per ticket, a reload shows up as queue_loads > 1
+
+python -m scripts.waiting_room_stub_server --initial-position 30 --release-per-second 3
+python -m scripts.waiting_room_stub_server --drive   # also runs the guard against it in headless Chrome
+"""
+
+QUEUE_PAGE = """<!DOCTYPE html>
+<html><body>
+<div class="waiting-room">
+  <p id="queue-title">請稍候</p>
+  <p>Position: <span id="queue-position"></span></p>
+  <p>Estimated wait: <span id="queue-wait"></span></p>
+</div>
+<script>
+  const ticket = new URLSearchParams(window.location.search).get("id");
+  async function poll() {
+    const status = await (await fetch(`/queue/status?id=${ticket}`)).json();
+    if (status.is_released) {
+      window.location.replace(`/area?id=${ticket}`);
+      return;
+    }
+    document.getElementById("queue-title").innerText = status.is_interstitial ? "請稍候" : "排隊中";
+    document.getElementById("queue-position").innerText = status.is_interstitial ? "" : status.position;
+    document.getElementById("queue-wait").innerText = status.is_interstitial ? "" : `${status.wait_seconds} seconds`;
+    setTimeout(poll, 1000);
+  }
+  poll();
+</script>
+</body></html>
+"""
+
+AREA_PAGE = """<!DOCTYPE html>
+<html><body>
+<ul class="area-list"><li><a href="#">A區 <font>剩餘 10</font></a></li></ul>
+</body></html>
+"""
+
+
+class QueueSimulation:
+    def __init__(self, initial_position: int, release_per_second: float, interstitial_seconds: float) -> None:
+        self.initial_position = initial_position
+        self.release_per_second = release_per_second
+        self.interstitial_seconds = interstitial_seconds
+        self.joined_at: dict[int, float] = {}
+        self.queue_loads: dict[int, int] = {}
+        self.ticket_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def join(self) -> int:
+        with self.lock:
+            ticket_id = next(self.ticket_ids)
+            self.joined_at[ticket_id] = time.monotonic()
+            self.queue_loads[ticket_id] = 0
+            return ticket_id
+
+    def record_queue_load(self, ticket_id: int) -> None:
+        with self.lock:
+            self.queue_loads[ticket_id] = self.queue_loads.get(ticket_id, 0) + 1
+
+    def status(self, ticket_id: int) -> dict:
+        waited_seconds = time.monotonic() - self.joined_at.get(ticket_id, time.monotonic())
+        is_interstitial = waited_seconds < self.interstitial_seconds
+        released_count = max(0.0, waited_seconds - self.interstitial_seconds) * self.release_per_second
+        position = max(0, self.initial_position - int(released_count))
+        return {
+            "is_interstitial": is_interstitial,
+            "is_released": not is_interstitial and position == 0,
+            "position": position,
+            "wait_seconds": int(position / self.release_per_second),
+        }
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"queue_loads": {str(ticket_id): count for ticket_id, count in self.queue_loads.items()}}
+
+
+def create_handler(simulation: QueueSimulation) -> type[BaseHTTPRequestHandler]:
+    class QueueHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            ticket_id = int(parse_qs(url.query).get("id", ["0"])[0])
+            if url.path == "/":
+                self.send_response(302)
+                self.send_header("Location", f"/queue?id={simulation.join()}")
+                self.end_headers()
+            elif url.path == "/queue":
+                simulation.record_queue_load(ticket_id)
+                self._send(QUEUE_PAGE, "text/html; charset=utf-8")
+            elif url.path == "/queue/status":
+                self._send(json.dumps(simulation.status(ticket_id)), "application/json")
+            elif url.path == "/area":
+                self._send(AREA_PAGE, "text/html; charset=utf-8")
+            elif url.path == "/stats":
+                self._send(json.dumps(simulation.stats()), "application/json")
+            else:
+                self.send_error(404)
+
+        def _send(self, body: str, content_type: str) -> None:
+            payload = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args) -> None:
+            return
+
+    return QueueHandler
+
+
+def drive(base_url: str, simulation: QueueSimulation, check_interval_seconds: float) -> bool:
+    from selenium import webdriver
+
+    from src.service.ticket_bot.purchase_control import PurchaseControl
+    from src.service.ticket_bot.commons import WaitingRoomProperties
+    from src.service.ticket_bot.waiting_room import WaitingRoomGuard
+
+    guard = WaitingRoomGuard()
+    guard.properties = WaitingRoomProperties(check_interval_seconds=check_interval_seconds, report_interval_seconds=1)
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.get(base_url)
+        optional_status = guard.hold(driver, PurchaseControl(driver_key="waiting-room-stub"))
+        is_resumed = "/area" in driver.current_url and len(driver.find_elements("class name", "area-list")) == 1
+        queue_loads = simulation.stats()["queue_loads"]
+        is_reload_free = all(count == 1 for count in queue_loads.values())
+        print(f"[WAITING ROOM STUB] Last status: {optional_status}")
+        print(f"[WAITING ROOM STUB] Resumed on area page: {is_resumed}, queue page loads: {queue_loads}")
+        return optional_status is not None and is_resumed and is_reload_free
+    finally:
+        driver.quit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Waiting room simulation for WaitingRoomGuard")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--initial-position", type=int, default=20)
+    parser.add_argument("--release-per-second", type=float, default=2)
+    parser.add_argument("--interstitial-seconds", type=float, default=3)
+    parser.add_argument("--check-interval-seconds", type=float, default=2)
+    parser.add_argument("--drive", action="store_true", help="Run the guard against the stub and exit")
+    args = parser.parse_args()
+    if args.release_per_second <= 0:
+        parser.error("--release-per-second must be greater than 0")
+
+    simulation = QueueSimulation(args.initial_position, args.release_per_second, args.interstitial_seconds)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), create_handler(simulation))
+    base_url = f"http://127.0.0.1:{args.port}/"
+    if not args.drive:
+        print(f"[WAITING ROOM STUB] Serving on {base_url}")
+        server.serve_forever()
+        return
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        is_passed = drive(base_url, simulation, args.check_interval_seconds)
+    finally:
+        server.shutdown()
+    sys.exit(0 if is_passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import asyncio
+import base64
+import time
+from typing import Any, Optional
+
+import httpx
+from loguru import logger
+from py_spring_core import Properties
+from pydantic import Field
+
+"""
+Minimal asyncio client for the W3C WebDriver protocol, covering the commands the
+purchase flow uses. Every session of an event loop shares one pooled httpx
+connection pool, so hundreds of sessions cost a coroutine each instead of a thread.
+Locator strategies accept the same strings as selenium's By ("id", "class name", ...).
+"""
+
+ELEMENT_KEY = "element-6066-11e4-a52f-4a05a2f6d5e1"
+
+SELECT_BY_VISIBLE_TEXT_SCRIPT = """
+    const [select, text] = arguments;
+    for (const option of select.options) {
+        if (option.text.trim() === text) {
+            select.value = option.value;
+            select.dispatchEvent(new Event("change", { bubbles: true }));
+            return true;
+        }
+    }
+    return false;
+"""
+
+
+class AsyncWebDriverProperties(Properties):
+    __key__: str = "async_webdriver"
+    server_url: str = Field(default="http://localhost:4444/wd/hub")
+    max_sessions: int = Field(default=200, gt=0)
+    max_connections: int = Field(default=400, gt=0)
+    max_keepalive_connections: int = Field(default=200, ge=0)
+    keepalive_expiry_seconds: float = Field(default=30, gt=0)
+    request_timeout_seconds: float = Field(default=60, gt=0)
+    poll_interval_seconds: float = Field(default=0.2, gt=0)
+    # purchased sessions are kept open for the payment only when they are not headless
+    chrome_arguments: list[str] = Field(default_factory=lambda: ["--disable-dev-shm-usage"])
+
+    @property
+    def is_headless(self) -> bool:
+        return any(argument.startswith("--headless") for argument in self.chrome_arguments)
+
+
+class AsyncWebDriverError(Exception):
+    def __init__(self, error: str, message: str) -> None:
+        super().__init__(f"{error}: {message}")
+        self.error = error
+
+
+class AsyncNoSuchElementError(AsyncWebDriverError): ...
+
+
+class AsyncNoAlertPresentError(AsyncWebDriverError): ...
+
+
+class AsyncWebDriverTimeoutError(Exception): ...
+
+
+ERRORS = {
+    "no such element": AsyncNoSuchElementError,
+    "stale element reference": AsyncNoSuchElementError,
+    "no such alert": AsyncNoAlertPresentError,
+}
+
+
+def as_w3c_locator(by: str, value: str) -> tuple[str, str]:
+    # W3C only knows css selector, link text, partial link text, tag name and xpath
+    match by:
+        case "id":
+            return "css selector", f'[id="{value}"]'
+        case "class name":
+            return "css selector", f".{value}"
+        case "name":
+            return "css selector", f'[name="{value}"]'
+        case _:
+            return by, value
+
+
+class AsyncWebDriverClient:
+    """
+    Connection pool shared by every session of one event loop, use it as an
+    async context manager so the pool is closed on the loop that opened it
+    """
+
+    def __init__(self, properties: AsyncWebDriverProperties) -> None:
+        self.properties = properties
+        self.base_url = properties.server_url.rstrip("/")
+        self.session_semaphore = asyncio.Semaphore(properties.max_sessions)
+        self.http_client = httpx.AsyncClient(
+            timeout=properties.request_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=properties.max_connections,
+                max_keepalive_connections=properties.max_keepalive_connections,
+                keepalive_expiry=properties.keepalive_expiry_seconds,
+            ),
+        )
+
+    async def __aenter__(self) -> "AsyncWebDriverClient":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.http_client.aclose()
+
+    async def new_session(self) -> "AsyncWebDriver":
+        await self.session_semaphore.acquire()
+        try:
+            value = await self.request(
+                "POST",
+                "/session",
+                {
+                    "capabilities": {
+                        "alwaysMatch": {
+                            "browserName": "chrome",
+                            "goog:chromeOptions": {"args": self.properties.chrome_arguments},
+                        }
+                    }
+                },
+            )
+        except Exception:
+            self.session_semaphore.release()
+            raise
+        logger.info(f"[ASYNC WEBDRIVER] Session created: {value['sessionId']}")
+        return AsyncWebDriver(self, value["sessionId"])
+
+    async def request(self, method: str, path: str, payload: Optional[dict] = None) -> Any:
+        response = await self.http_client.request(method, f"{self.base_url}{path}", json=payload)
+        try:
+            value = response.json().get("value")
+        except ValueError:
+            # not a WebDriver response, e.g. a proxy error page
+            response.raise_for_status()
+            raise
+        if isinstance(value, dict) and "error" in value:
+            error_cls = ERRORS.get(value["error"], AsyncWebDriverError)
+            raise error_cls(value["error"], value.get("message", ""))
+        response.raise_for_status()
+        return value
+
+
+class AsyncWebElement:
+    def __init__(self, driver: "AsyncWebDriver", element_id: str) -> None:
+        self.driver = driver
+        self.element_id = element_id
+
+    def _path(self, command: str) -> str:
+        return f"/element/{self.element_id}{command}"
+
+    async def click(self) -> None:
+        await self.driver.command("POST", self._path("/click"), {})
+
+    async def text(self) -> str:
+        return await self.driver.command("GET", self._path("/text"))
+
+    async def get_attribute(self, name: str) -> Optional[str]:
+        return await self.driver.command("GET", self._path(f"/attribute/{name}"))
+
+    async def is_displayed(self) -> bool:
+        return await self.driver.command("GET", self._path("/displayed"))
+
+    async def send_keys(self, text: str) -> None:
+        await self.driver.command("POST", self._path("/value"), {"text": text})
+
+    async def screenshot_as_png(self) -> bytes:
+        return base64.b64decode(await self.driver.command("GET", self._path("/screenshot")))
+
+    async def find_element(self, by: str, value: str) -> "AsyncWebElement":
+        using, locator = as_w3c_locator(by, value)
+        raw_element = await self.driver.command("POST", self._path("/element"), {"using": using, "value": locator})
+        return AsyncWebElement(self.driver, raw_element[ELEMENT_KEY])
+
+    async def find_elements(self, by: str, value: str) -> list["AsyncWebElement"]:
+        using, locator = as_w3c_locator(by, value)
+        raw_elements = await self.driver.command("POST", self._path("/elements"), {"using": using, "value": locator})
+        return [AsyncWebElement(self.driver, raw_element[ELEMENT_KEY]) for raw_element in raw_elements]
+
+
+class AsyncWebDriver:
+    """
+    One WebDriver session, methods mirror the selenium calls of the purchase flow
+    """
+
+    def __init__(self, client: AsyncWebDriverClient, session_id: str) -> None:
+        self.client = client
+        self.session_id = session_id
+        self.is_quit = False
+
+    async def command(self, method: str, path: str, payload: Optional[dict] = None) -> Any:
+        return await self.client.request(method, f"/session/{self.session_id}{path}", payload)
+
+    async def get(self, url: str) -> None:
+        await self.command("POST", "/url", {"url": url})
+
+    async def current_url(self) -> str:
+        return await self.command("GET", "/url")
+
+    async def refresh(self) -> None:
+        await self.command("POST", "/refresh", {})
+
+    async def execute_script(self, script: str, *args: Any) -> Any:
+        serialized_args = [
+            {ELEMENT_KEY: arg.element_id} if isinstance(arg, AsyncWebElement) else arg
+            for arg in args
+        ]
+        result = await self.command("POST", "/execute/sync", {"script": script, "args": serialized_args})
+        if isinstance(result, dict) and ELEMENT_KEY in result:
+            return AsyncWebElement(self, result[ELEMENT_KEY])
+        return result
+
+    async def find_element(self, by: str, value: str) -> AsyncWebElement:
+        using, locator = as_w3c_locator(by, value)
+        raw_element = await self.command("POST", "/element", {"using": using, "value": locator})
+        return AsyncWebElement(self, raw_element[ELEMENT_KEY])
+
+    async def find_elements(self, by: str, value: str) -> list[AsyncWebElement]:
+        using, locator = as_w3c_locator(by, value)
+        raw_elements = await self.command("POST", "/elements", {"using": using, "value": locator})
+        return [AsyncWebElement(self, raw_element[ELEMENT_KEY]) for raw_element in raw_elements]
+
+    async def is_element_exists_by(self, by: str, value: str) -> bool:
+        return len(await self.find_elements(by, value)) != 0
+
+    async def wait_until_element_is_visible(self, timeout_seconds: float, by: str, value: str) -> AsyncWebElement:
+        deadline = time.monotonic() + timeout_seconds
+        while True:
+            try:
+                element = await self.find_element(by, value)
+                if await element.is_displayed():
+                    return element
+            except AsyncNoSuchElementError:
+                pass
+            if time.monotonic() >= deadline:
+                raise AsyncWebDriverTimeoutError(f"{by}={value} not visible within {timeout_seconds} seconds")
+            await asyncio.sleep(self.client.properties.poll_interval_seconds)
+
+    async def select_by_visible_text(self, select_element: AsyncWebElement, text: str) -> None:
+        if not await self.execute_script(SELECT_BY_VISIBLE_TEXT_SCRIPT, select_element, text):
+            raise AsyncNoSuchElementError("no such element", f"No option with text: {text}")
+
+    async def scroll_to_element(self, element: AsyncWebElement) -> None:
+        await self.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
+
+    async def get_cookies(self) -> list[dict]:
+        return await self.command("GET", "/cookie")
+
+    async def add_cookie(self, cookie: dict) -> None:
+        await self.command("POST", "/cookie", {"cookie": cookie})
+
+    async def delete_cookie(self, name: str) -> None:
+        await self.command("DELETE", f"/cookie/{name}")
+
+    async def current_window_handle(self) -> str:
+        return await self.command("GET", "/window")
+
+    async def window_handles(self) -> list[str]:
+        return await self.command("GET", "/window/handles")
+
+    async def switch_to_window(self, handle: str) -> None:
+        await self.command("POST", "/window", {"handle": handle})
+
+    async def new_tab(self) -> str:
+        value = await self.command("POST", "/window/new", {"type": "tab"})
+        return value["handle"]
+
+    async def alert_text(self) -> Optional[str]:
+        try:
+            return await self.command("GET", "/alert/text")
+        except AsyncNoAlertPresentError:
+            return None
+
+    async def accept_alert(self) -> None:
+        await self.command("POST", "/alert/accept", {})
+
+    async def quit(self) -> None:
+        if self.is_quit:
+            return
+        self.is_quit = True
+        try:
+            await self.client.request("DELETE", f"/session/{self.session_id}")
+        except (httpx.HTTPError, AsyncWebDriverError) as error:
+            logger.error(f"[ASYNC WEBDRIVER] Failed to quit session: {self.session_id}: {error}")
+        finally:
+            self.client.session_semaphore.release()
@@ -0,0 +1,310 @@
+import base64
+from collections import deque
+import itertools
+import json
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+import httpx
+from loguru import logger
+from websockets.exceptions import WebSocketException
+from websockets.sync.client import ClientConnection, connect
+
+from src.commons.properties import CdpTransportProperties
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+"""
+Chrome DevTools Protocol transport for local sessions. The hot commands of a
+purchase go straight to the page over one persistent websocket per tab instead
+of Python -> chromedriver HTTP -> DevTools. Anything CDP cannot do, or any CDP
+failure, falls back to the classic WebDriver command.
+"""
+
+# x / y are viewport coordinates (Input events), page_left / page_top document ones (screenshot clips)
+ELEMENT_CENTER_SCRIPT = """
+    const element = document.querySelector(arguments[0]);
+    if (element === null) {
+        return null;
+    }
+    element.scrollIntoView({block: "center"});
+    const rect = element.getBoundingClientRect();
+    return {
+        x: rect.left + rect.width / 2,
+        y: rect.top + rect.height / 2,
+        width: rect.width,
+        height: rect.height,
+        page_left: rect.left + window.scrollX,
+        page_top: rect.top + window.scrollY,
+    };
+"""
+
+
+def as_webdriver_cookie(cdp_cookie: dict) -> dict:
+    cookie = {
+        key: cdp_cookie[key]
+        for key in ["name", "value", "domain", "path", "secure", "httpOnly", "sameSite"]
+        if key in cdp_cookie
+    }
+    if not cdp_cookie.get("session", True) and cdp_cookie.get("expires", -1) > 0:
+        cookie["expiry"] = int(cdp_cookie["expires"])
+    return cookie
+
+
+class CdpError(Exception):
+    """
+    Raised when a DevTools command fails or the websocket is gone
+    """
+
+
+class CdpSession:
+    """
+    One websocket to one page target, commands are serialized by a lock and
+    events read while waiting for a reply are kept for wait_for_event
+    """
+
+    def __init__(self, websocket_url: str, properties: CdpTransportProperties) -> None:
+        self.properties = properties
+        self.connection: ClientConnection = connect(
+            websocket_url,
+            max_size=properties.max_message_mb * 1024 * 1024,
+            open_timeout=properties.command_timeout_seconds,
+        )
+        self.message_ids = itertools.count(1)
+        self.events: deque[dict] = deque(maxlen=100)
+        self.enabled_domains: set[str] = set()
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def send(self, method: str, params: Optional[dict] = None) -> dict:
+        with self.lock:
+            message_id = next(self.message_ids)
+            try:
+                self.connection.send(json.dumps({"id": message_id, "method": method, "params": params or {}}))
+                while True:
+                    message = json.loads(self.connection.recv(timeout=self.properties.command_timeout_seconds))
+                    if message.get("id") == message_id:
+                        break
+                    if "method" in message:
+                        self.events.append(message)
+            except (WebSocketException, TimeoutError, OSError) as error:
+                raise CdpError(f"{method} failed: {error}") from error
+        if "error" in message:
+            raise CdpError(f"{method} failed: {message['error'].get('message')}")
+        return message.get("result", {})
+
+    def enable(self, domain: str) -> None:
+        if domain in self.enabled_domains:
+            return
+        self.send(f"{domain}.enable")
+        self.enabled_domains.add(domain)
+
+    def wait_for_event(self, method: str, timeout_seconds: float) -> dict:
+        deadline = time.monotonic() + timeout_seconds
+        with self.lock:
+            while True:
+                for event in list(self.events):
+                    if event["method"] == method:
+                        self.events.remove(event)
+                        return event
+                remaining_seconds = deadline - time.monotonic()
+                if remaining_seconds <= 0:
+                    raise CdpError(f"{method} not received within {timeout_seconds} seconds")
+                try:
+                    message = json.loads(self.connection.recv(timeout=remaining_seconds))
+                except TimeoutError:
+                    continue
+                except (WebSocketException, OSError) as error:
+                    raise CdpError(f"Waiting for {method} failed: {error}") from error
+                if "method" in message:
+                    self.events.append(message)
+
+
+class CdpTransport:
+    """
+    Hot WebDriver commands of one driver over CDP, the page websocket follows the
+    window handle the purchase switched to through switch_to_window. The first CDP
+    failure switches the transport to WebDriver for the rest of the session.
+    """
+
+    def __init__(self, driver: "WebDriver", properties: CdpTransportProperties) -> None:
+        self.driver = driver
+        self.properties = properties
+        self.sessions: dict[str, CdpSession] = {}
+        self.current_handle: Optional[str] = None
+        self.is_cdp_available = properties.is_enabled
+
+    def close(self) -> None:
+        for session in self.sessions.values():
+            try:
+                session.close()
+            except Exception as error:
+                logger.error(f"[CDP TRANSPORT] Failed to close session: {error}")
+        self.sessions.clear()
+
+    def switch_to_window(self, handle: str) -> None:
+        self.driver.switch_to.window(handle)
+        self.current_handle = handle
+
+    def sync_window(self) -> None:
+        # after something else switched windows on the driver (e.g. the tab prefetcher)
+        self.current_handle = self.driver.current_window_handle
+
+    def execute_script(self, script: str, *args: Any) -> Any:
+        """
+        Same contract as WebDriver.execute_script for JSON arguments and results,
+        an error thrown by the script raises JavascriptException on both paths
+        """
+        optional_session = self._get_session()
+        if optional_session is not None:
+            try:
+                return self._evaluate(optional_session, script, list(args))
+            except CdpError as error:
+                self._fall_back(error)
+        return self.driver.execute_script(script, *args)
+
+    def click(self, css_selector: str) -> None:
+        optional_session = self._get_session()
+        if optional_session is not None:
+            try:
+                center = self._evaluate(optional_session, ELEMENT_CENTER_SCRIPT, [css_selector])
+                # a missing element is left to WebDriver, which raises its usual NoSuchElementException
+                if center is not None:
+                    for event_type in ["mousePressed", "mouseReleased"]:
+                        optional_session.send(
+                            "Input.dispatchMouseEvent",
+                            {"type": event_type, "x": center["x"], "y": center["y"], "button": "left", "clickCount": 1},
+                        )
+                    return
+            except CdpError as error:
+                self._fall_back(error)
+        from selenium.webdriver.common.by import By
+
+        self.driver.find_element(By.CSS_SELECTOR, css_selector).click()
+
+    def get_cookies(self) -> list[dict]:
+        optional_session = self._get_session()
+        if optional_session is not None:
+            try:
+                return [
+                    as_webdriver_cookie(cookie)
+                    for cookie in optional_session.send("Network.getCookies").get("cookies", [])
+                ]
+            except CdpError as error:
+                self._fall_back(error)
+        return self.driver.get_cookies()
+
+    def add_cookie(self, cookie: dict) -> None:
+        optional_session = self._get_session()
+        if optional_session is not None:
+            try:
+                cdp_cookie = {key: value for key, value in cookie.items() if key != "expiry"}
+                if "expiry" in cookie:
+                    cdp_cookie["expires"] = cookie["expiry"]
+                if not optional_session.send("Network.setCookie", cdp_cookie).get("success", True):
+                    raise CdpError(f"Cookie {cookie.get('name')} was rejected")
+                return
+            except CdpError as error:
+                self._fall_back(error)
+        self.driver.add_cookie(cookie)
+
+    def screenshot_as_png(self, css_selector: str) -> bytes:
+        optional_session = self._get_session()
+        if optional_session is not None:
+            try:
+                box = self._evaluate(optional_session, ELEMENT_CENTER_SCRIPT, [css_selector])
+                if box is not None:
+                    result = optional_session.send(
+                        "Page.captureScreenshot",
+                        {
+                            "format": "png",
+                            "clip": {
+                                "x": box["page_left"],
+                                "y": box["page_top"],
+                                "width": box["width"],
+                                "height": box["height"],
+                                "scale": 1,
+                            },
+                        },
+                    )
+                    return base64.b64decode(result["data"])
+            except CdpError as error:
+                self._fall_back(error)
+        from selenium.webdriver.common.by import By
+
+        return self.driver.find_element(By.CSS_SELECTOR, css_selector).screenshot_as_png
+
+    def get(self, url: str) -> None:
+        """
+        Navigates and waits for the load event, like WebDriver.get with the normal page load strategy
+        """
+        optional_session = self._get_session()
+        if optional_session is not None:
+            try:
+                optional_session.enable("Page")
+                optional_session.events.clear()
+                optional_session.send("Page.navigate", {"url": url})
+                optional_session.wait_for_event("Page.loadEventFired", self.properties.load_timeout_seconds)
+                return
+            except CdpError as error:
+                self._fall_back(error)
+        self.driver.get(url)
+
+    def _evaluate(self, session: CdpSession, script: str, args: list[Any]) -> Any:
+        result = session.send(
+            "Runtime.evaluate",
+            {
+                "expression": f"(function() {{ {script} }}).apply(null, {json.dumps(args)})",
+                "returnByValue": True,
+                "awaitPromise": True,
+            },
+        )
+        if "exceptionDetails" in result:
+            # the page threw, the transport is fine and running the script again through WebDriver would repeat it
+            exception_details = result["exceptionDetails"]
+            description = exception_details.get("exception", {}).get("description") or exception_details.get("text")
+            from selenium.common.exceptions import JavascriptException
+
+            raise JavascriptException(f"javascript error: {description}")
+        return result.get("result", {}).get("value")
+
+    def _fall_back(self, error: CdpError) -> None:
+        logger.warning(f"[CDP TRANSPORT] {error}, falling back to WebDriver")
+        self.is_cdp_available = False
+        self.close()
+
+    def _get_session(self) -> Optional[CdpSession]:
+        if not self.is_cdp_available:
+            return None
+        if self.current_handle is None:
+            self.sync_window()
+        handle = self.current_handle
+        if handle is None:
+            return None
+        if handle in self.sessions:
+            return self.sessions[handle]
+        try:
+            self.sessions[handle] = CdpSession(self._find_websocket_url(handle), self.properties)
+        except (CdpError, httpx.HTTPError, WebSocketException, OSError) as error:
+            self._fall_back(CdpError(f"Connecting to target {handle} failed: {error}"))
+            return None
+        return self.sessions[handle]
+
+    def _find_websocket_url(self, handle: str) -> str:
+        chrome_options = self.driver.capabilities.get("goog:chromeOptions", {})
+        debugger_address = chrome_options.get("debuggerAddress")
+        if debugger_address is None:
+            raise CdpError("Driver exposes no debuggerAddress")
+        targets = httpx.get(
+            f"http://{debugger_address}/json/list", timeout=self.properties.command_timeout_seconds
+        ).json()
+        # chromedriver's window handles are the DevTools target ids, older versions prefix them
+        target_id = handle.removeprefix("CDwindow-")
+        for target in targets:
+            if target.get("id") == target_id and "webSocketDebuggerUrl" in target:
+                return target["webSocketDebuggerUrl"]
+        raise CdpError(f"No DevTools target for window {handle}")
@@ -0,0 +1,95 @@
+import os
+import shutil
+import signal
+from typing import Iterable, Optional
+
+"""
+Process inspection for local Chrome drivers, backed by /proc.
+On systems without /proc (e.g. macOS) every helper degrades to "nothing known".
+"""
+
+PROC_DIR = "/proc"
+SHM_DIR = "/dev/shm"
+
+
+def _read_parent_pids() -> dict[int, int]:
+    parent_pids: dict[int, int] = {}
+    if not os.path.isdir(PROC_DIR):
+        return parent_pids
+    for entry in os.listdir(PROC_DIR):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"{PROC_DIR}/{entry}/stat") as file:
+                stat = file.read()
+        except OSError:
+            continue
+        # the command name may contain spaces, fields after it are fixed
+        fields = stat[stat.rfind(")") + 2 :].split()
+        parent_pids[int(entry)] = int(fields[1])
+    return parent_pids
+
+
+def list_process_tree(root_pids: Iterable[int]) -> list[int]:
+    parent_pids = _read_parent_pids()
+    children_by_parent: dict[int, list[int]] = {}
+    for pid, parent_pid in parent_pids.items():
+        children_by_parent.setdefault(parent_pid, []).append(pid)
+
+    tree: list[int] = []
+    pending = [pid for pid in root_pids if pid in parent_pids]
+    while len(pending) != 0:
+        pid = pending.pop()
+        if pid in tree:
+            continue
+        tree.append(pid)
+        pending.extend(children_by_parent.get(pid, []))
+    return tree
+
+
+def read_start_times(pids: Iterable[int]) -> dict[int, int]:
+    """
+    Start time (clock ticks since boot) of every live pid, a pid with another
+    start time later on has been reused by an unrelated process
+    """
+    start_times: dict[int, int] = {}
+    for pid in pids:
+        try:
+            with open(f"{PROC_DIR}/{pid}/stat") as file:
+                stat = file.read()
+        except OSError:
+            continue
+        fields = stat[stat.rfind(")") + 2 :].split()
+        start_times[pid] = int(fields[19])
+    return start_times
+
+
+def read_rss_bytes(pid: int) -> int:
+    try:
+        with open(f"{PROC_DIR}/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return 0
+    return 0
+
+
+def kill_processes(pids: Iterable[int]) -> int:
+    killed_count = 0
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            continue
+        killed_count += 1
+    return killed_count
+
+
+def shm_usage_ratio() -> Optional[float]:
+    if not os.path.isdir(SHM_DIR):
+        return None
+    usage = shutil.disk_usage(SHM_DIR)
+    if usage.total == 0:
+        return None
+    return usage.used / usage.total
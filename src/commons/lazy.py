@@ -0,0 +1,34 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+from loguru import logger
+
+from src.commons.startup_profiler import startup_profiler
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Thread-safe holder that builds a heavy object on first use instead of at boot
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]) -> None:
+        self.name = name
+        self.factory = factory
+        self.instance: Optional[T] = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_initialized(self) -> bool:
+        return self.instance is not None
+
+    def get(self) -> T:
+        if self.instance is not None:
+            return self.instance
+        with self.lock:
+            if self.instance is None:
+                logger.info(f"[LAZY INIT] Initializing {self.name}...")
+                with startup_profiler.span(self.name):
+                    self.instance = self.factory()
+        return self.instance
@@ -0,0 +1,52 @@
+from enum import Enum
+from typing import Optional
+
+from py_spring_core import Properties
+from pydantic import Field, model_validator
+from typing_extensions import Self
+
+# kept apart from the driver modules so check-config validates them without importing selenium
+
+
+class DriverMode(str, Enum):
+    Local = "local"
+    Remote = "remote"
+
+
+class SeleniumProperties(Properties):
+    __key__: str = "selenium"
+    remote_host: str
+    mode: DriverMode
+    chrome_binary_path: Optional[str] = Field(default=None)
+
+    @model_validator(mode="after")
+    def check_chrome_binary_path(self) -> Self:
+        if self.mode == DriverMode.Local and self.chrome_binary_path is None:
+            raise ValueError("chrome_binary_path is required when mode is local")
+        return self
+
+
+class DriverLifecycleProperties(Properties):
+    __key__: str = "driver_lifecycle"
+    watchdog_interval_seconds: float = Field(default=10, gt=0)
+    max_driver_age_seconds: float = Field(default=3600, gt=0)
+    # a released driver (e.g. a purchase waiting for payment) is kept open this long
+    retained_driver_seconds: float = Field(default=900, ge=0)
+    max_driver_rss_mb: float = Field(default=1500, gt=0)
+    # a driver in use is kept past max_driver_rss_mb, but recycled past this, which fails its owner's job
+    max_owned_driver_rss_mb: float = Field(default=3000, gt=0)
+    max_shm_usage_ratio: float = Field(default=0.9, gt=0, le=1)
+
+    @model_validator(mode="after")
+    def check_owned_driver_rss(self) -> Self:
+        if self.max_owned_driver_rss_mb < self.max_driver_rss_mb:
+            raise ValueError("max_owned_driver_rss_mb must not be below max_driver_rss_mb")
+        return self
+
+
+class CdpTransportProperties(Properties):
+    __key__: str = "cdp_transport"
+    is_enabled: bool = Field(default=False)
+    command_timeout_seconds: float = Field(default=10, gt=0)
+    load_timeout_seconds: float = Field(default=30, gt=0)
+    max_message_mb: int = Field(default=32, gt=0)
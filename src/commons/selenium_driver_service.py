@@ -1,96 +1,345 @@
-from enum import Enum
-import math
+import threading
 import time
-from typing import Optional
-from typing_extensions import Self
+from typing import TYPE_CHECKING, Any, Optional
 from loguru import logger
-from pydantic import BaseModel, Field, field_validator, model_validator
-import selenium
-import selenium.webdriver
-from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.chromium.options import ChromiumOptions
-from py_spring_core import Component, Properties
-
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import Select  # for dropdown menu selection
-from selenium.common.exceptions import (
-    NoSuchElementException as SeleniumNoSuchElementException,
-    NoAlertPresentException as SeleniumNoAlertPresentException,
-    UnexpectedAlertPresentException as SeleniumUnexpectedAlertPresentException,
+from pydantic import BaseModel, Field
+from py_spring_core import Component
+
+from src.commons import chrome_process
+from src.commons.cdp_transport import CdpTransport
+from src.commons.properties import (
+    CdpTransportProperties,
+    DriverLifecycleProperties,
+    DriverMode,
+    SeleniumProperties,
 )
-from undetected_chromedriver import Chrome as UndetectedChrome
+from src.commons.selenium_grid_monitor import SeleniumGridMonitor
+from src.commons.startup_profiler import startup_profiler
 
-from selenium.webdriver import ActionChains
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.alert import Alert
+# selenium is only imported where a driver is created, components injecting this service do not pay for it at boot
+if TYPE_CHECKING:
+    from selenium.webdriver import ChromeOptions
+    from selenium.webdriver.remote.webdriver import WebDriver
 
 
-class DriverMode(str, Enum):
-    Local = "local"
-    Remote = "remote"
+class DriverRecord(BaseModel):
+    driver_key: str
+    owner: Optional[str] = None
+    # a selenium WebDriver, Any keeps selenium out of the model definition
+    driver: Any
+    root_pids: list[int] = Field(default_factory=list)
+    created_at: float = Field(default_factory=time.monotonic)
+    released_at: Optional[float] = None
+    # limits already reported for an owned driver, so the watchdog warns once per reason
+    reported_limits: set[str] = Field(default_factory=set)
 
+    @property
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.created_at
 
-class SeleniumProperties(Properties):
-    __key__: str = "selenium"
-    remote_host: str
-    mode: DriverMode
-    chrome_binary_path: Optional[str] = Field(default=None)
+    @property
+    def is_owned(self) -> bool:
+        # a driver handed to an owner stays untouched by recycling until it is released
+        return self.owner is not None and self.released_at is None
 
-    @model_validator(mode="after")
-    def check_chrome_binary_path(self) -> Self:
-        if self.mode == DriverMode.Local and self.chrome_binary_path is None:
-            raise ValueError("chrome_binary_path is required when mode is local")
-        return self
+
+class DriverRead(BaseModel):
+    driver_key: str
+    owner: Optional[str]
+    age_seconds: float
+    is_released: bool
+    process_count: int
+    rss_mb: float
+
+
+class LeakCountersRead(BaseModel):
+    drivers_quit: int = 0
+    quit_failures: int = 0
+    orphan_processes_killed: int = 0
+    replaced_drivers: int = 0
+    recycled_for_age: int = 0
+    recycled_for_memory: int = 0
+    recycled_for_shm: int = 0
+    expired_after_release: int = 0
+
+
+class DriverLifecycleRead(BaseModel):
+    drivers: list[DriverRead]
+    leak_counters: LeakCountersRead
+    shm_usage_ratio: Optional[float]
 
 
 class SeleniumDriverService(Component):
+    """
+    Owns every webdriver of the process. Drivers are quit (not just closed) so the
+    session and Chrome process go away, and a watchdog thread recycles drivers
+    that outlive their owner, get too old or use too much memory
+    """
+
     properties: SeleniumProperties
+    lifecycle_properties: DriverLifecycleProperties
+    cdp_properties: CdpTransportProperties
+    grid_monitor: SeleniumGridMonitor
 
     def __init__(self) -> None:
         self.driver_pool: dict[str, WebDriver] = {}
+        self.driver_records: dict[str, DriverRecord] = {}
+        self.transports: dict[str, CdpTransport] = {}
+        self.leak_counters = LeakCountersRead()
+        # why the watchdog closed a driver that was still in use, read once by its owner
+        self.recycle_reasons: dict[str, str] = {}
+        self.lock = threading.RLock()
+        self.watchdog: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
 
     def destroy(self) -> None:
-        try:
-            logger.info("[WEBDRIVER CLOSE] Waitting 3 seconds to close webdriver")
-            time.sleep(3)
-        finally:
-            logger.info(f"[WEBDRIVER CLOSE] Close {len(self.driver_pool)} webdrivers")
-            for key, driver in self.driver_pool.items():
-                self._close_driver(driver, key)
-
-    def get_driver(self, driver_key: str) -> WebDriver:
+        self.stop_event.set()
+        logger.info(f"[WEBDRIVER CLOSE] Close {len(self.driver_pool)} webdrivers")
+        for key in list(self.driver_pool.keys()):
+            self.close_driver(key)
+
+    def get_driver(self, driver_key: str, owner: Optional[str] = None) -> "WebDriver":
+        self._ensure_watchdog_started()
+        if driver_key in self.driver_pool:
+            # never silently drop a live driver, that is how zombie Chrome processes pile up
+            logger.warning(f"[WEBDRIVER REPLACE] Driver: {driver_key} already exists, closing it first")
+            self._count("replaced_drivers")
+            self.close_driver(driver_key)
+
         match self.properties.mode:
             case DriverMode.Local:
                 driver = self._get_local_driver()
             case DriverMode.Remote:
                 driver = self._get_remote_driver()
 
-        self.driver_pool[driver_key] = driver
+        with self.lock:
+            self.recycle_reasons.pop(driver_key, None)
+            self.driver_pool[driver_key] = driver
+            self.driver_records[driver_key] = DriverRecord(
+                driver_key=driver_key,
+                owner=owner,
+                driver=driver,
+                root_pids=self._get_root_pids(driver),
+            )
         driver.maximize_window()
         return driver
 
-    def _close_driver(self, driver: WebDriver, driver_name: str) -> None:
+    def get_transport(self, driver_key: str) -> CdpTransport:
+        """
+        Command transport of a pooled driver, CDP direct for local drivers when
+        cdp_transport.is_enabled, plain WebDriver otherwise
+        """
+        with self.lock:
+            if driver_key in self.transports:
+                return self.transports[driver_key]
+            driver = self.driver_pool[driver_key]
+            properties = self.cdp_properties
+            if self.properties.mode != DriverMode.Local:
+                # the DevTools endpoint of a grid node is not reachable from here
+                properties = properties.model_copy(update={"is_enabled": False})
+            transport = CdpTransport(driver, properties)
+            self.transports[driver_key] = transport
+            return transport
+
+    def get_rss_bytes(self, driver_key: str) -> int:
+        """
+        Resident memory of the Chrome process tree of a pooled driver, 0 when its
+        processes are not local (remote mode) or the driver is gone
+        """
+        with self.lock:
+            record = self.driver_records.get(driver_key)
+        if record is None:
+            return 0
+        pids = chrome_process.list_process_tree(record.root_pids)
+        return sum(chrome_process.read_rss_bytes(pid) for pid in pids)
+
+    def count_owned_drivers(self, driver_key_prefix: str = "") -> int:
+        with self.lock:
+            return sum(
+                1
+                for record in self.driver_records.values()
+                if record.is_owned and record.driver_key.startswith(driver_key_prefix)
+            )
+
+    def pop_recycle_reason(self, driver_key: str) -> Optional[str]:
+        """
+        Why the watchdog closed the driver under its owner, None if it did not
+        """
+        with self.lock:
+            return self.recycle_reasons.pop(driver_key, None)
+
+    def release_driver(self, driver_key: str) -> None:
+        """
+        Marks a driver as no longer used by its owner, the watchdog closes it
+        after retained_driver_seconds
+        """
+        with self.lock:
+            record = self.driver_records.get(driver_key)
+            if record is not None and record.released_at is None:
+                record.released_at = time.monotonic()
+
+    def get_lifecycle_report(self) -> DriverLifecycleRead:
+        with self.lock:
+            records = list(self.driver_records.values())
+        drivers: list[DriverRead] = []
+        for record in records:
+            pids = chrome_process.list_process_tree(record.root_pids)
+            drivers.append(
+                DriverRead(
+                    driver_key=record.driver_key,
+                    owner=record.owner,
+                    age_seconds=record.age_seconds,
+                    is_released=record.released_at is not None,
+                    process_count=len(pids),
+                    rss_mb=sum(chrome_process.read_rss_bytes(pid) for pid in pids) / 1024 / 1024,
+                )
+            )
+        with self.lock:
+            leak_counters = self.leak_counters.model_copy()
+        return DriverLifecycleRead(
+            drivers=drivers,
+            leak_counters=leak_counters,
+            shm_usage_ratio=chrome_process.shm_usage_ratio(),
+        )
+
+    def _close_driver(self, driver: "WebDriver", driver_name: str, root_pids: Optional[list[int]] = None) -> None:
+        start_times = chrome_process.read_start_times(chrome_process.list_process_tree(root_pids or []))
         try:
-            logger.info(f"[WEBDRIVER CLOSE] Close webdriver: {driver}: {driver_name}")
-            driver.close()
+            logger.info(f"[WEBDRIVER CLOSE] Quit webdriver: {driver}: {driver_name}")
+            # quit ends the WebDriver session and the browser, close only closes the window
+            driver.quit()
+            self._count("drivers_quit")
         except Exception as error:
-            logger.error(f"[WEBDRIVER CLOSE] Close webdriver failed: {error}, skip")
+            self._count("quit_failures")
+            logger.error(f"[WEBDRIVER CLOSE] Quit webdriver failed: {error}, skip")
+        # re-read after quit, a pid whose start time changed now belongs to an unrelated process
+        orphan_pids = [
+            pid
+            for pid, start_time in chrome_process.read_start_times(start_times).items()
+            if start_times[pid] == start_time
+        ]
+        if len(orphan_pids) != 0:
+            killed_count = chrome_process.kill_processes(orphan_pids)
+            self._count("orphan_processes_killed", killed_count)
+            logger.warning(f"[WEBDRIVER CLOSE] Killed {killed_count} orphan processes of {driver_name}")
 
     def close_driver(self, driver_key: str) -> None:
-        if driver_key not in self.driver_pool:
+        with self.lock:
+            if driver_key not in self.driver_pool:
+                logger.warning(
+                    f"[DRIVER NOT FOUND] Driver not found in driver_pool: {driver_key}"
+                )
+                return
+            driver = self.driver_pool.pop(driver_key)
+            record = self.driver_records.pop(driver_key, None)
+            optional_transport = self.transports.pop(driver_key, None)
+        if optional_transport is not None:
+            optional_transport.close()
+        self._close_driver(driver, driver_key, record.root_pids if record is not None else None)
+        if self.properties.mode == DriverMode.Remote:
+            self.grid_monitor.notify_capacity_changed(driver.session_id)
+
+    def _get_root_pids(self, driver: "WebDriver") -> list[int]:
+        # chromedriver's pid, and Chrome's own pid when it is launched outside chromedriver (undetected_chromedriver)
+        if self.properties.mode != DriverMode.Local:
+            return []
+        root_pids: list[int] = []
+        service_process = getattr(getattr(driver, "service", None), "process", None)
+        if service_process is not None:
+            root_pids.append(service_process.pid)
+        browser_pid = getattr(driver, "browser_pid", None)
+        if isinstance(browser_pid, int):
+            root_pids.append(browser_pid)
+        return root_pids
+
+    def _ensure_watchdog_started(self) -> None:
+        with self.lock:
+            if self.watchdog is not None:
+                return
+            self.watchdog = threading.Thread(
+                target=self._watch, name="driver-watchdog", daemon=True
+            )
+            self.watchdog.start()
+
+    def _watch(self) -> None:
+        while not self.stop_event.wait(self.lifecycle_properties.watchdog_interval_seconds):
+            try:
+                self._check_drivers()
+            except Exception as error:
+                logger.error(f"[DRIVER WATCHDOG] Check failed: {error}")
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self.lock:
+            setattr(self.leak_counters, counter, getattr(self.leak_counters, counter) + amount)
+
+    def _check_drivers(self) -> None:
+        properties = self.lifecycle_properties
+        with self.lock:
+            records = list(self.driver_records.values())
+
+        # only drivers nobody is using are recycled, e.g. a purchase at checkout is never the one dropped
+        rss_by_key: dict[str, int] = {}
+        for record in records:
+            if record.released_at is not None and time.monotonic() - record.released_at > properties.retained_driver_seconds:
+                logger.warning(f"[DRIVER WATCHDOG] Driver: {record.driver_key} outlived its owner: {record.owner}")
+                self._count("expired_after_release")
+                self.close_driver(record.driver_key)
+                continue
+            if record.age_seconds > properties.max_driver_age_seconds:
+                if self._is_kept_for_owner(record, "age", f"is older than {properties.max_driver_age_seconds} seconds"):
+                    continue
+                logger.warning(f"[DRIVER WATCHDOG] Driver: {record.driver_key} is older than {properties.max_driver_age_seconds} seconds")
+                self._count("recycled_for_age")
+                self.close_driver(record.driver_key)
+                continue
+            pids = chrome_process.list_process_tree(record.root_pids)
+            rss_bytes = sum(chrome_process.read_rss_bytes(pid) for pid in pids)
+            if rss_bytes > properties.max_driver_rss_mb * 1024 * 1024:
+                reason = f"uses {rss_bytes / 1024 / 1024:.0f} MB"
+                is_over_owned_cap = rss_bytes > properties.max_owned_driver_rss_mb * 1024 * 1024
+                if not is_over_owned_cap and self._is_kept_for_owner(record, "memory", reason):
+                    continue
+                logger.warning(f"[DRIVER WATCHDOG] Driver: {record.driver_key} {reason}")
+                if record.is_owned:
+                    with self.lock:
+                        self.recycle_reasons[record.driver_key] = f"Driver recycled by the watchdog, it {reason}"
+                self._count("recycled_for_memory")
+                self.close_driver(record.driver_key)
+                continue
+            if not record.is_owned:
+                rss_by_key[record.driver_key] = rss_bytes
+
+        optional_shm_usage_ratio = chrome_process.shm_usage_ratio()
+        if optional_shm_usage_ratio is None or optional_shm_usage_ratio <= properties.max_shm_usage_ratio:
+            return
+        if len(rss_by_key) == 0:
             logger.warning(
-                f"[DRIVER NOT FOUND] Driver not found in driver_pool: {driver_key}"
+                f"[DRIVER WATCHDOG] /dev/shm usage {optional_shm_usage_ratio:.0%}, every driver is in use, nothing to recycle"
             )
             return
-        driver = self.driver_pool.pop(driver_key)
-        self._close_driver(driver, driver_key)
+        # shm is shared by every Chrome, give it back by dropping the heaviest idle driver
+        heaviest_driver_key = max(rss_by_key, key=lambda key: rss_by_key[key])
+        logger.warning(
+            f"[DRIVER WATCHDOG] /dev/shm usage {optional_shm_usage_ratio:.0%}, recycling driver: {heaviest_driver_key}"
+        )
+        self._count("recycled_for_shm")
+        self.close_driver(heaviest_driver_key)
+
+    def _is_kept_for_owner(self, record: DriverRecord, limit: str, reason: str) -> bool:
+        if not record.is_owned:
+            return False
+        if limit not in record.reported_limits:
+            record.reported_limits.add(limit)
+            logger.warning(
+                f"[DRIVER WATCHDOG] Driver: {record.driver_key} {reason}, kept until its owner: {record.owner} releases it"
+            )
+        return True
+
+    def _get_chrome_options(self) -> "ChromeOptions":
+        with startup_profiler.span("selenium import"):
+            from selenium.webdriver import ChromeOptions
 
-    def _get_chrome_options(self) -> selenium.webdriver.ChromeOptions:
-        options = selenium.webdriver.ChromeOptions()
+        options = ChromeOptions()
         # 防止 UnexpectedAlertPresentException 跳出直接阻斷,但有時可以打開看一下bug出在哪
         options.set_capability("unhandledPromptBehavior", "accept and notify")
         options.add_argument("--incognito")
@@ -100,18 +349,33 @@ class SeleniumDriverService(Component):
         options.binary_location = self.properties.chrome_binary_path
         return options
 
-    def _get_local_driver(self) -> WebDriver:
-        driver = UndetectedChrome(options=self._get_chrome_options())
+    def _get_local_driver(self) -> "WebDriver":
+        # undetected_chromedriver is heavy to import, only load it once a local driver is needed
+        with startup_profiler.span("UndetectedChrome import"):
+            from undetected_chromedriver import Chrome as UndetectedChrome
+
+        with startup_profiler.span("UndetectedChrome launch"):
+            driver = UndetectedChrome(options=self._get_chrome_options())
         return driver
 
-    def _get_remote_driver(self) -> WebDriver:
+    def _get_remote_driver(self) -> "WebDriver":
+        from selenium.webdriver.remote.webdriver import WebDriver
+
         options = self._get_chrome_options()
         logger.info(
             f"[REMOTE HOST CONNECTION] Connect to remote_host: {self.properties.remote_host}"
         )
-        driver = WebDriver(
-            command_executor=self.properties.remote_host,
-            options=options,
-            keep_alive=True,
-        )
+        # only ask the hub for a session once a healthy node has a free slot
+        with self.grid_monitor.admit() as admission:
+            start_time = time.perf_counter()
+            driver = WebDriver(
+                command_executor=self.properties.remote_host,
+                options=options,
+                keep_alive=True,
+            )
+            admission.session_id = driver.session_id
+        if driver.session_id is not None:
+            self.grid_monitor.record_session_created(
+                driver.session_id, time.perf_counter() - start_time
+            )
         return driver
@@ -0,0 +1,250 @@
+from collections import deque
+import contextlib
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+import httpx
+from loguru import logger
+from py_spring_core import Component, Properties
+from pydantic import BaseModel, Field, computed_field
+
+
+class SeleniumGridProperties(Properties):
+    __key__: str = "selenium_grid"
+    status_url: str = Field(default="http://localhost:4444/status")
+    poll_interval_seconds: float = Field(default=2, gt=0)
+    admission_timeout_seconds: float = Field(default=300, gt=0)
+    request_timeout_seconds: float = Field(default=2, gt=0)
+    is_probing_nodes: bool = Field(default=True)
+    latency_window_size: int = Field(default=100, gt=0)
+    # a created session holds its slot until /status shows it, or at most this long
+    pending_session_timeout_seconds: float = Field(default=30, gt=0)
+
+
+class GridCapacityTimeoutError(Exception):
+    """
+    Raised when no healthy grid slot frees up within the admission timeout
+    """
+
+
+class GridAdmission:
+    """
+    Slot handed out by SeleniumGridMonitor.admit, the caller sets the id of the
+    session it created so the slot stays reserved until the grid reports it
+    """
+
+    def __init__(self) -> None:
+        self.session_id: Optional[str] = None
+
+
+class GridNodeRead(BaseModel):
+    node_id: str
+    uri: str
+    availability: str
+    max_sessions: int
+    slot_count: int
+    session_ids: list[str]
+    status_latency_seconds: Optional[float] = None
+    session_creation_count: int = 0
+    session_creation_p50_seconds: Optional[float] = None
+
+    @computed_field
+    @property
+    def is_healthy(self) -> bool:
+        return self.availability.upper() == "UP"
+
+    @computed_field
+    @property
+    def free_slots(self) -> int:
+        return max(0, min(self.max_sessions, self.slot_count) - len(self.session_ids))
+
+
+class GridStatusRead(BaseModel):
+    is_ready: bool
+    in_flight_requests: int
+    pending_sessions: int
+    free_slots: int
+    nodes: list[GridNodeRead]
+
+
+def parse_grid_status(payload: dict[str, Any]) -> tuple[bool, list[GridNodeRead]]:
+    """
+    Parses the Selenium Grid 4 /status document into node views
+    """
+    value = payload.get("value", {})
+    nodes: list[GridNodeRead] = []
+    for node in value.get("nodes", []):
+        slots = node.get("slots", [])
+        session_ids = [
+            str(slot["session"].get("sessionId"))
+            for slot in slots
+            if slot.get("session") is not None
+        ]
+        nodes.append(
+            GridNodeRead(
+                node_id=str(node.get("id", "")),
+                uri=str(node.get("uri", "")),
+                availability=str(node.get("availability", "DOWN")),
+                max_sessions=int(node.get("maxSessions", len(slots))),
+                slot_count=len(slots),
+                session_ids=session_ids,
+            )
+        )
+    return bool(value.get("ready", False)), nodes
+
+
+class SeleniumGridMonitor(Component):
+    """
+    Keeps a live view of the grid's node slots from the hub /status endpoint,
+    new sessions are only requested once a healthy node has a free slot so a
+    job never sits invisibly in the hub's new session queue
+    """
+
+    properties: SeleniumGridProperties
+
+    def __init__(self) -> None:
+        self.is_ready = False
+        self.nodes: list[GridNodeRead] = []
+        self.node_status_latencies: dict[str, float] = {}
+        self.session_creation_latencies: dict[str, deque[float]] = {}
+        self.in_flight_requests = 0
+        # created session id -> time.monotonic() of creation, not in the /status snapshot yet
+        self.pending_sessions: dict[str, float] = {}
+        self.refreshed_at = 0.0
+        self.condition = threading.Condition()
+        self.client: Optional[httpx.Client] = None
+
+    def destroy(self) -> None:
+        if self.client is not None:
+            self.client.close()
+
+    def get_status(self) -> GridStatusRead:
+        self.refresh(is_forced=True, is_probing_nodes=self.properties.is_probing_nodes)
+        with self.condition:
+            return GridStatusRead(
+                is_ready=self.is_ready,
+                in_flight_requests=self.in_flight_requests,
+                pending_sessions=len(self.pending_sessions),
+                free_slots=self._free_slots(),
+                nodes=sorted(
+                    (self._with_latencies(node) for node in self.nodes),
+                    key=lambda node: node.status_latency_seconds or float("inf"),
+                ),
+            )
+
+    def refresh(self, is_forced: bool = False, is_probing_nodes: bool = False) -> None:
+        if not is_forced and time.monotonic() - self.refreshed_at < self.properties.poll_interval_seconds:
+            return
+        try:
+            response = self._get_client().get(self.properties.status_url)
+            response.raise_for_status()
+            is_ready, nodes = parse_grid_status(response.json())
+        except (httpx.HTTPError, ValueError) as error:
+            logger.error(f"[GRID STATUS] Failed to read {self.properties.status_url}: {error}")
+            is_ready, nodes = False, []
+        # probing every node is only worth it for reporting, admission polls the hub alone
+        node_status_latencies = self._probe_nodes(nodes) if is_probing_nodes else {}
+        with self.condition:
+            self.is_ready = is_ready
+            self.nodes = nodes
+            self.node_status_latencies.update(node_status_latencies)
+            self._reconcile_pending_sessions()
+            self.refreshed_at = time.monotonic()
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def admit(self) -> Iterator[GridAdmission]:
+        """
+        Holds a grid slot for the duration of a new session request, and past it
+        until the session shows up in /status when the caller sets its session_id
+        """
+        deadline = time.monotonic() + self.properties.admission_timeout_seconds
+        is_waiting_logged = False
+        while True:
+            self.refresh()
+            with self.condition:
+                if self._free_slots() > 0:
+                    self.in_flight_requests += 1
+                    break
+                remaining_seconds = deadline - time.monotonic()
+                if remaining_seconds <= 0:
+                    raise GridCapacityTimeoutError(
+                        f"No free grid slot within {self.properties.admission_timeout_seconds} seconds"
+                    )
+                if not is_waiting_logged:
+                    logger.warning("[GRID ADMISSION] Grid is full, waiting for a free slot...")
+                    is_waiting_logged = True
+                self.condition.wait(min(self.properties.poll_interval_seconds, remaining_seconds))
+        admission = GridAdmission()
+        try:
+            yield admission
+        finally:
+            with self.condition:
+                self.in_flight_requests -= 1
+                if admission.session_id is not None:
+                    self.pending_sessions[admission.session_id] = time.monotonic()
+                    self._reconcile_pending_sessions()
+                self.condition.notify_all()
+
+    def record_session_created(self, session_id: str, latency_seconds: float) -> None:
+        self.refresh(is_forced=True)
+        with self.condition:
+            for node in self.nodes:
+                if session_id not in node.session_ids:
+                    continue
+                if node.node_id not in self.session_creation_latencies:
+                    self.session_creation_latencies[node.node_id] = deque(
+                        maxlen=self.properties.latency_window_size
+                    )
+                self.session_creation_latencies[node.node_id].append(latency_seconds)
+                logger.info(
+                    f"[GRID SESSION] Session: {session_id} placed on node: {node.uri} in {latency_seconds:.2f} seconds"
+                )
+                return
+
+    def notify_capacity_changed(self, session_id: Optional[str] = None) -> None:
+        # a session was closed, the next admission should not trust the cached view
+        with self.condition:
+            if session_id is not None:
+                self.pending_sessions.pop(session_id, None)
+            self.refreshed_at = 0.0
+            self.condition.notify_all()
+
+    def _free_slots(self) -> int:
+        free_slots = sum(node.free_slots for node in self.nodes if node.is_healthy)
+        return free_slots - self.in_flight_requests - len(self.pending_sessions)
+
+    def _reconcile_pending_sessions(self) -> None:
+        # called with the condition held, a session the snapshot counts no longer needs its reservation
+        known_session_ids = {session_id for node in self.nodes for session_id in node.session_ids}
+        expired_at = time.monotonic() - self.properties.pending_session_timeout_seconds
+        for session_id, created_at in list(self.pending_sessions.items()):
+            if session_id in known_session_ids or created_at < expired_at:
+                self.pending_sessions.pop(session_id)
+
+    def _with_latencies(self, node: GridNodeRead) -> GridNodeRead:
+        latencies = sorted(self.session_creation_latencies.get(node.node_id, []))
+        return node.model_copy(
+            update={
+                "status_latency_seconds": self.node_status_latencies.get(node.node_id),
+                "session_creation_count": len(latencies),
+                "session_creation_p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+            }
+        )
+
+    def _probe_nodes(self, nodes: list[GridNodeRead]) -> dict[str, float]:
+        latencies: dict[str, float] = {}
+        for node in nodes:
+            start_time = time.perf_counter()
+            try:
+                self._get_client().get(f"{node.uri.rstrip('/')}/status").raise_for_status()
+            except httpx.HTTPError:
+                continue
+            latencies[node.node_id] = time.perf_counter() - start_time
+        return latencies
+
+    def _get_client(self) -> httpx.Client:
+        if self.client is None:
+            self.client = httpx.Client(timeout=self.properties.request_timeout_seconds)
+        return self.client
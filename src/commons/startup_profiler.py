@@ -0,0 +1,102 @@
+import builtins
+import contextlib
+import sys
+import threading
+import time
+from typing import Iterator
+
+from pydantic import BaseModel
+
+
+class ProfileEntry(BaseModel):
+    name: str
+    seconds: float
+
+
+class StartupProfiler:
+    """
+    Collects import time per package and init time per named span,
+    imports are measured as self time so nested imports are not counted twice
+    """
+
+    def __init__(self) -> None:
+        self.is_enabled = False
+        self.import_seconds: dict[str, float] = {}
+        self.span_seconds: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.original_import = builtins.__import__
+
+    def enable(self) -> None:
+        if self.is_enabled:
+            return
+        self.is_enabled = True
+        builtins.__import__ = self._profiled_import
+
+    def disable(self) -> None:
+        if not self.is_enabled:
+            return
+        self.is_enabled = False
+        builtins.__import__ = self.original_import
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.is_enabled:
+                with self.lock:
+                    self.span_seconds[name] = (
+                        self.span_seconds.get(name, 0.0) + time.perf_counter() - start_time
+                    )
+
+    def import_entries(self) -> list[ProfileEntry]:
+        return self._sorted_entries(self.import_seconds)
+
+    def span_entries(self) -> list[ProfileEntry]:
+        return self._sorted_entries(self.span_seconds)
+
+    def report(self, limit: int = 20) -> str:
+        lines = ["[STARTUP PROFILE] Import time (self) per package:"]
+        for entry in self.import_entries()[:limit]:
+            lines.append(f"  {entry.seconds * 1000:10.1f} ms  {entry.name}")
+        lines.append("[STARTUP PROFILE] Init time per component:")
+        for entry in self.span_entries():
+            lines.append(f"  {entry.seconds * 1000:10.1f} ms  {entry.name}")
+        return "\n".join(lines)
+
+    def _sorted_entries(self, seconds_map: dict[str, float]) -> list[ProfileEntry]:
+        with self.lock:
+            entries = [ProfileEntry(name=name, seconds=seconds) for name, seconds in seconds_map.items()]
+        return sorted(entries, key=lambda entry: entry.seconds, reverse=True)
+
+    def _package_name(self, module_name: str) -> str:
+        # our own modules are reported one by one, third party ones per top-level package
+        if module_name.startswith("src."):
+            return module_name
+        return module_name.split(".")[0]
+
+    def _profiled_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level != 0 or name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        stack: list[float] = getattr(self.local, "stack", None) or []
+        self.local.stack = stack
+        stack.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            children_seconds = stack.pop()
+            if len(stack) != 0:
+                stack[-1] += elapsed
+            package_name = self._package_name(name)
+            with self.lock:
+                self.import_seconds[package_name] = (
+                    self.import_seconds.get(package_name, 0.0) + elapsed - children_seconds
+                )
+
+
+startup_profiler = StartupProfiler()
@@ -3,20 +3,17 @@ import os
 from typing import Optional
 
 from loguru import logger
-from src.commons.selenium_driver_service import (
-    WebDriver,
-    expected_conditions,
-    WebDriverWait,
-    WebElement,
-    Select,
-    Alert,
-    By,
-)
-from src.commons.selenium_driver_service import (
-    SeleniumNoAlertPresentException,
-    SeleniumUnexpectedAlertPresentException,
-    SeleniumNoSuchElementException,
+from selenium.common.exceptions import (
+    NoAlertPresentException as SeleniumNoAlertPresentException,
+    NoSuchElementException as SeleniumNoSuchElementException,
+    UnexpectedAlertPresentException as SeleniumUnexpectedAlertPresentException,
 )
+from selenium.webdriver.common.alert import Alert
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import Select, WebDriverWait
 
 
 def is_element_exists_by(driver: WebDriver, by: str, searched_element: str) -> bool:
@@ -42,6 +39,14 @@ def select_by_visible_text(element: WebElement, text: str) -> None:
     Select(element).select_by_visible_text(text)
 
 
+def select_by_value(element: WebElement, value: str) -> None:
+    Select(element).select_by_value(value)
+
+
+def selected_value(element: WebElement) -> Optional[str]:
+    return Select(element).first_selected_option.get_attribute("value")
+
+
 def alert_present_with_error(
     driver: WebDriver, alert_text: str = ""
 ) -> Optional[Alert]:
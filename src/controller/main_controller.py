@@ -1,8 +1,128 @@
+import json
+from typing import Optional
+import uuid
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
 from py_spring_core import RestController
 
+from src.commons.selenium_driver_service import DriverLifecycleRead, SeleniumDriverService
+from src.commons.selenium_grid_monitor import GridStatusRead, SeleniumGridMonitor
+
+from src.service.purchase_job.commons import JobState, PurchaseJobRead, PurchaseJobRequest
+from src.service.purchase_job.purchase_job_manager import (
+    JobNotFoundError,
+    PurchaseJobManager,
+)
+from src.service.purchase_job.purchase_metrics import PurchaseMetrics, PurchaseMetricsRead
+from src.service.preflight.preflight_service import PreflightService, WarmUpStepRead
+from src.service.ticket_bot.commons import LoginCredential
+from src.service.ticket_bot.google_login_farm import GoogleLoginFarm, LoginResultRead
+from src.service.token_health.token_health_service import (
+    TokenHealthRead,
+    TokenHealthService,
+    TokenRecord,
+)
+
 
 class MainController(RestController):
+    job_manager: PurchaseJobManager
+    metrics: PurchaseMetrics
+    preflight_service: PreflightService
+    token_health_service: TokenHealthService
+    login_farm: GoogleLoginFarm
+    grid_monitor: SeleniumGridMonitor
+    driver_service: SeleniumDriverService
+
     def register_routes(self) -> None:
         @self.router.get("/")
         def get_root():
             return "Hello World"
+
+        @self.router.post("/jobs")
+        def submit_job(request: PurchaseJobRequest) -> PurchaseJobRead:
+            return self.job_manager.submit_job(request)
+
+        @self.router.get("/jobs")
+        def list_jobs(state: Optional[JobState] = None) -> list[PurchaseJobRead]:
+            return self.job_manager.list_jobs(state)
+
+        @self.router.get("/jobs/{job_id}")
+        def get_job(job_id: uuid.UUID) -> PurchaseJobRead:
+            try:
+                return self.job_manager.get_job(job_id)
+            except JobNotFoundError as error:
+                raise HTTPException(status_code=404, detail=str(error))
+
+        @self.router.get("/jobs/{job_id}/events")
+        def stream_job_events(job_id: uuid.UUID) -> StreamingResponse:
+            # server-sent events, one message per state or stage transition
+            try:
+                self.job_manager.get_job(job_id)
+            except JobNotFoundError as error:
+                raise HTTPException(status_code=404, detail=str(error))
+
+            def iter_messages():
+                try:
+                    for event in self.job_manager.iter_job_events(job_id):
+                        if event is None:
+                            yield ": keep-alive\n\n"
+                            continue
+                        yield f"event: {event.kind.value}\ndata: {event.model_dump_json()}\n\n"
+                except JobNotFoundError:
+                    # only finished jobs are evicted, end the stream as finished rather than aborting it
+                    yield f"event: evicted\ndata: {json.dumps({'job_id': str(job_id)})}\n\n"
+
+            return StreamingResponse(iter_messages(), media_type="text/event-stream")
+
+        @self.router.get("/metrics")
+        def get_metrics() -> PurchaseMetricsRead:
+            return self.metrics.as_read()
+
+        @self.router.post("/preflight")
+        def warm_up(launch_driver: bool = True) -> list[WarmUpStepRead]:
+            return self.preflight_service.warm_up(is_launching_driver=launch_driver)
+
+        @self.router.post("/tokens/check")
+        def check_tokens(emails: Optional[list[str]] = None) -> list[TokenHealthRead]:
+            return self.token_health_service.check_tokens(emails)
+
+        @self.router.get("/tokens/relogin-queue")
+        def get_relogin_queue() -> list[str]:
+            return self.token_health_service.get_relogin_queue()
+
+        @self.router.post("/tokens/relogin")
+        def process_relogin_queue(credentials: list[LoginCredential]) -> list[str]:
+            return self.token_health_service.process_relogin_queue(credentials)
+
+        @self.router.get("/tokens/export")
+        def export_tokens() -> list[TokenRecord]:
+            return self.token_health_service.export_tokens()
+
+        @self.router.post("/tokens/import")
+        def import_tokens(records: list[TokenRecord]) -> int:
+            return self.token_health_service.import_tokens(records)
+
+        @self.router.post("/logins")
+        def login_all(credentials: list[LoginCredential]) -> list[LoginResultRead]:
+            return self.login_farm.login_all(credentials)
+
+        @self.router.get("/logins/manual-queue")
+        def get_manual_login_queue() -> list[str]:
+            return self.login_farm.get_manual_queue()
+
+        @self.router.get("/grid")
+        def get_grid_status() -> GridStatusRead:
+            return self.grid_monitor.get_status()
+
+        @self.router.get("/drivers")
+        def get_driver_lifecycle() -> DriverLifecycleRead:
+            return self.driver_service.get_lifecycle_report()
+
+        @self.router.delete("/jobs/{job_id}")
+        def cancel_job(job_id: uuid.UUID) -> PurchaseJobRead:
+            try:
+                return self.job_manager.cancel_job(job_id)
+            except JobNotFoundError as error:
+                raise HTTPException(status_code=404, detail=str(error))
@@ -1,12 +1,33 @@
 from py_spring_core import Properties
 import datetime
+from enum import Enum
+import json
+from typing import Optional
 import uuid
-from pydantic import BaseModel, computed_field
+from pydantic import BaseModel, Field, computed_field
 
 
 class TixcraftApiSource(Properties):
     __key__: str = "tixcraft_api"
     google_login_url: str
+    # any page that needs a logged in member, tixcraft redirects to login for a revoked SID
+    token_probe_url: str = Field(default="https://tixcraft.com/order")
+
+
+class DatabasePoolProperties(Properties):
+    """
+    Connection pool of the py_spring_model engine, which is otherwise built with
+    SQLAlchemy's defaults (5 connections + 10 overflow).
+    Kept in its own section: the py_spring_model section is owned by py_spring_model's
+    own properties, which do not expose pool options.
+    """
+
+    __key__: str = "database_pool"
+    pool_size: int = Field(default=20, gt=0)
+    max_overflow: int = Field(default=20, ge=0)
+    pool_timeout_seconds: float = Field(default=10, gt=0)
+    pool_recycle_seconds: int = Field(default=1800, gt=0)
+    is_pre_ping: bool = Field(default=True)
 
 
 class LoginTokenRead(BaseModel):
@@ -14,8 +35,42 @@ class LoginTokenRead(BaseModel):
     token: str
     email: str
     expired_at: datetime.datetime
+    is_valid: bool = True
+    validated_at: Optional[datetime.datetime] = None
 
     @computed_field
     @property
     def is_expired(self) -> bool:
         return self.expired_at < datetime.datetime.now()
+
+    @computed_field
+    @property
+    def is_usable(self) -> bool:
+        return self.is_valid and not self.is_expired
+
+    @property
+    def sid_value(self) -> str:
+        # tokens are stored as the serialized SID cookie, older rows may hold the raw value
+        try:
+            cookie = json.loads(self.token)
+        except json.JSONDecodeError:
+            return self.token
+        if isinstance(cookie, dict) and "value" in cookie:
+            return str(cookie["value"])
+        return self.token
+
+
+class LayoutPageType(str, Enum):
+    AREA_LIST = "area_list"
+    TICKET_FORM = "ticket_form"
+    PAYMENT_METHOD = "payment_method"
+    DELIVERY_METHOD = "delivery_method"
+
+
+class LayoutCacheRead(BaseModel):
+    id: uuid.UUID
+    event_key: str
+    page_type: LayoutPageType
+    # lookup key (seat key word, payment key words, ...) -> resolved locator or value
+    locators: dict[str, str]
+    updated_at: datetime.datetime
@@ -0,0 +1,57 @@
+from loguru import logger
+from py_spring_core import Component
+from py_spring_model import PySpringModel
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+
+from src.repository.common import DatabasePoolProperties
+from src.repository.models import LoginToken
+
+
+class DatabasePool(Component):
+    """
+    Rebuilds the py_spring_model engine with the database_pool sizing, so mass
+    token lookups and refreshes from many workers do not queue behind 5 connections.
+    Runs as the component is constructed, before the server (if any) starts, and
+    disposes the engine py_spring_model built so its connections are not left open.
+    """
+
+    properties: DatabasePoolProperties
+
+    def post_construct(self) -> None:
+        self.configure()
+
+    def configure(self) -> None:
+        current_engine = PySpringModel.get_engine()
+        engine_options: dict = {
+            "pool_pre_ping": self.properties.is_pre_ping,
+            "pool_recycle": self.properties.pool_recycle_seconds,
+        }
+        # in-memory SQLite keeps one connection per thread, sizing does not apply there
+        if isinstance(current_engine.pool, QueuePool):
+            engine_options |= {
+                "pool_size": self.properties.pool_size,
+                "max_overflow": self.properties.max_overflow,
+                "pool_timeout": self.properties.pool_timeout_seconds,
+            }
+        engine = create_engine(current_engine.url, echo=current_engine.echo, **engine_options)
+        PySpringModel.set_engine(engine)
+        # py_spring_model already opened (and may have pooled) connections on its own engine
+        current_engine.dispose()
+        logger.info(f"[DATABASE POOL] Replaced the default engine, pool configured: {engine.pool.status()}")
+        self._ensure_token_indexes()
+
+    def _ensure_token_indexes(self) -> None:
+        # create_all skips tables that already exist, add the email index to older databases
+        engine = PySpringModel.get_engine()
+        if not inspect(engine).has_table(LoginToken.__tablename__):
+            return
+        for index in LoginToken.__table__.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except SQLAlchemyError as error:
+                logger.error(
+                    f"[DATABASE POOL] Failed to create index {index.name}, remove duplicated emails from login_token first, "
+                    f"tokens are saved one by one until then: {error}"
+                )
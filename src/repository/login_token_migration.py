@@ -0,0 +1,39 @@
+from loguru import logger
+from py_spring_core import Component
+from py_spring_model import PySpringModel
+from sqlalchemy import inspect, text
+
+from src.repository.models import LoginToken
+
+# columns added to login_token after its first release, create_all never alters an existing table
+LOGIN_TOKEN_ADDED_COLUMNS = {
+    "is_valid": "BOOLEAN NOT NULL DEFAULT TRUE",
+    "validated_at": "TIMESTAMP",
+}
+
+
+class LoginTokenMigration(Component):
+    """
+    Adds the token validity columns to a login_token table created by an older
+    release, every token query selects them
+    """
+
+    def post_construct(self) -> None:
+        self.ensure_token_columns()
+
+    def ensure_token_columns(self) -> None:
+        engine = PySpringModel.get_engine()
+        inspector = inspect(engine)
+        if not inspector.has_table(LoginToken.__tablename__):
+            return
+        existing_columns = {column["name"] for column in inspector.get_columns(LoginToken.__tablename__)}
+        # SQLite has no ADD COLUMN IF NOT EXISTS, the inspection above keeps it idempotent there
+        if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+        with engine.begin() as connection:
+            for column, definition in LOGIN_TOKEN_ADDED_COLUMNS.items():
+                if column in existing_columns:
+                    continue
+                logger.info(f"[TOKEN MIGRATION] Adding column {column} to {LoginToken.__tablename__}")
+                connection.execute(
+                    text(f"ALTER TABLE {LoginToken.__tablename__} ADD COLUMN {if_not_exists}{column} {definition}")
+                )
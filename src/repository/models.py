@@ -1,21 +1,50 @@
 import datetime
+import json
+from typing import Optional
 import uuid
 from py_spring_model import PySpringModel
 from sqlmodel import Field
 
-from src.repository.common import LoginTokenRead
+from src.repository.common import LayoutCacheRead, LayoutPageType, LoginTokenRead
 
 
 class LoginToken(PySpringModel, table=True):
     __tablename__: str = "login_token"
     id: uuid.UUID = Field(primary_key=True, default_factory=uuid.uuid4)
     token: str
-    email: str
+    # upserts conflict on email, one token per account
+    email: str = Field(unique=True, index=True)
     expired_at: datetime.datetime = Field(
         default_factory=lambda: datetime.datetime.now() + datetime.timedelta(hours=6)
     )
+    is_valid: bool = Field(default=True)
+    validated_at: Optional[datetime.datetime] = Field(default=None)
 
     def as_read(self) -> LoginTokenRead:
         return LoginTokenRead(
-            id=self.id, token=self.token, email=self.email, expired_at=self.expired_at
+            id=self.id,
+            token=self.token,
+            email=self.email,
+            expired_at=self.expired_at,
+            is_valid=self.is_valid,
+            validated_at=self.validated_at,
+        )
+
+
+class LayoutCache(PySpringModel, table=True):
+    __tablename__: str = "layout_cache"
+    id: uuid.UUID = Field(primary_key=True, default_factory=uuid.uuid4)
+    event_key: str = Field(index=True)
+    page_type: str
+    # JSON object of lookup key -> locator
+    locators: str = Field(default="{}")
+    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+
+    def as_read(self) -> LayoutCacheRead:
+        return LayoutCacheRead(
+            id=self.id,
+            event_key=self.event_key,
+            page_type=LayoutPageType(self.page_type),
+            locators=json.loads(self.locators),
+            updated_at=self.updated_at,
         )
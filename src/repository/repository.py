@@ -1,9 +1,40 @@
-from typing import Optional
+import datetime
+import functools
+import json
+from typing import Iterable, Optional
 from uuid import UUID
-from py_spring_model import CrudRepository
+from py_spring_model import CrudRepository, PySpringModel
+from sqlalchemy import Engine, bindparam, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import col, select
 
-from src.repository.common import LoginTokenRead
-from src.repository.models import LoginToken
+from src.repository.common import LayoutCacheRead, LayoutPageType, LoginTokenRead
+from src.repository.models import LayoutCache, LoginToken
+
+
+# rows per statement, stays below the bind parameter limits of SQLite (32766) and Postgres (65535)
+MAX_BATCH_SIZE = 1000
+
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+@functools.lru_cache
+def has_unique_email_index(engine: Engine) -> bool:
+    # ON CONFLICT (email) needs it, databases older than the index may not have it yet
+    inspector = inspect(engine)
+    table_name = LoginToken.__tablename__
+    return any(
+        index["unique"] and index["column_names"] == ["email"]
+        for index in inspector.get_indexes(table_name)
+    ) or any(
+        constraint["column_names"] == ["email"]
+        for constraint in inspector.get_unique_constraints(table_name)
+    )
+
+
+def batched(items: list, batch_size: int = MAX_BATCH_SIZE) -> Iterable[list]:
+    for start in range(0, len(items), batch_size):
+        yield items[start : start + batch_size]
 
 
 class LoginTokenRepository(CrudRepository[UUID, LoginToken]):
@@ -13,5 +44,103 @@ class LoginTokenRepository(CrudRepository[UUID, LoginToken]):
             return
         return optional_token.as_read()
 
+    def get_tokens_by_emails(self, emails: Iterable[str]) -> dict[str, LoginTokenRead]:
+        """
+        Tokens of many accounts with one IN query per MAX_BATCH_SIZE emails,
+        emails without a token are missing from the result
+        """
+        unique_emails = list(dict.fromkeys(emails))
+        tokens: dict[str, LoginTokenRead] = {}
+        with PySpringModel.create_session() as session:
+            for batch in batched(unique_emails):
+                statement = select(LoginToken).where(col(LoginToken.email).in_(batch))
+                for token in session.exec(statement):
+                    tokens[token.email] = token.as_read()
+        return tokens
+
+    def get_all_tokens(self) -> list[LoginTokenRead]:
+        return [token.as_read() for token in self.find_all()]
+
     def save_token(self, token: LoginToken) -> LoginTokenRead:
-        return self.upsert(token, {"email": token.email}).as_read()
+        return self.save_tokens([token])[0]
+
+    def save_tokens(self, tokens: Iterable[LoginToken]) -> list[LoginTokenRead]:
+        """
+        Upserts on the email index with one INSERT ... ON CONFLICT per MAX_BATCH_SIZE
+        tokens, the last token of an email wins and an existing row keeps its id
+        """
+        token_by_email = {token.email: token for token in tokens}
+        if len(token_by_email) == 0:
+            return []
+        engine = PySpringModel.get_engine()
+        insert = UPSERT_DIALECTS.get(engine.dialect.name)
+        if insert is None or not has_unique_email_index(engine):
+            # no portable ON CONFLICT or nothing to conflict on, one upsert per token
+            return [self.upsert(token, {"email": token.email}).as_read() for token in token_by_email.values()]
+
+        saved_tokens: list[LoginTokenRead] = []
+        with PySpringModel.create_session() as session:
+            for batch in batched(list(token_by_email.values())):
+                statement = insert(LoginToken).values([token.model_dump() for token in batch])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[LoginToken.email],
+                    set_={
+                        column: statement.excluded[column]
+                        for column in ["token", "expired_at", "is_valid", "validated_at"]
+                    },
+                ).returning(LoginToken)
+                rows = session.scalars(statement, execution_options={"populate_existing": True})
+                saved_tokens.extend(token.as_read() for token in rows)
+            session.commit()
+        return saved_tokens
+
+    def mark_token_validity(self, token_read: LoginTokenRead, is_valid: bool) -> None:
+        self.mark_tokens_validity([(token_read, is_valid)])
+
+    def mark_tokens_validity(self, validities: Iterable[tuple[LoginTokenRead, bool]]) -> None:
+        """
+        Flags checked tokens with one executemany UPDATE per MAX_BATCH_SIZE tokens.
+        Only is_valid and validated_at are written, and only while the row still
+        holds the checked token, a login in the meantime keeps its fresh SID unflagged.
+        """
+        validated_at = datetime.datetime.now()
+        parameters = [
+            {"checked_email": token_read.email, "checked_token": token_read.token, "marked_is_valid": is_valid}
+            for token_read, is_valid in validities
+        ]
+        if len(parameters) == 0:
+            return
+        table = LoginToken.__table__
+        statement = (
+            table.update()
+            .where(table.c.email == bindparam("checked_email"), table.c.token == bindparam("checked_token"))
+            .values(is_valid=bindparam("marked_is_valid"), validated_at=validated_at)
+        )
+        with PySpringModel.get_engine().begin() as connection:
+            for batch in batched(parameters):
+                connection.execute(statement, batch)
+
+
+class LayoutCacheRepository(CrudRepository[UUID, LayoutCache]):
+    def get_layout(
+        self, event_key: str, page_type: LayoutPageType
+    ) -> Optional[LayoutCacheRead]:
+        _, optional_layout = self._find_by_query(
+            {"event_key": event_key, "page_type": page_type.value}
+        )
+        if optional_layout is None:
+            return
+        return optional_layout.as_read()
+
+    def save_layout(
+        self, event_key: str, page_type: LayoutPageType, locators: dict[str, str]
+    ) -> LayoutCacheRead:
+        layout = LayoutCache(
+            event_key=event_key,
+            page_type=page_type.value,
+            locators=json.dumps(locators, ensure_ascii=False),
+            updated_at=datetime.datetime.now(),
+        )
+        return self.upsert(
+            layout, {"event_key": event_key, "page_type": page_type.value}
+        ).as_read()
@@ -0,0 +1,64 @@
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+from py_spring_core import Component
+from pydantic import BaseModel
+
+from src.commons.selenium_driver_service import SeleniumDriverService
+from src.commons.startup_profiler import startup_profiler
+from src.repository.repository import LoginTokenRepository
+from src.service.ticket_bot.verification_code_decipher import VerificationCodeDecipher
+
+
+class WarmUpStepRead(BaseModel):
+    name: str
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def is_succeeded(self) -> bool:
+        return self.error is None
+
+
+class PreflightService(Component):
+    """
+    Loads every lazily built dependency up front, run it before a sale so
+    the first purchase does not pay for the OCR model, DB connection or Chrome launch
+    """
+
+    PREFLIGHT_DRIVER_KEY = "preflight"
+
+    code_decipher: VerificationCodeDecipher
+    token_repo: LoginTokenRepository
+    driver_service: SeleniumDriverService
+
+    def warm_up(self, is_launching_driver: bool = True) -> list[WarmUpStepRead]:
+        steps: list[tuple[str, Callable[[], None]]] = [
+            ("ocr_engine", self.code_decipher.warm_up),
+            ("database", self._warm_up_database),
+        ]
+        if is_launching_driver:
+            steps.append(("webdriver", self._warm_up_driver))
+        return [self._run_step(name, step) for name, step in steps]
+
+    def _run_step(self, name: str, step: Callable[[], None]) -> WarmUpStepRead:
+        logger.info(f"[PREFLIGHT] Warming up {name}...")
+        start_time = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            with startup_profiler.span(f"preflight:{name}"):
+                step()
+        except Exception as step_error:
+            error = str(step_error)
+            logger.error(f"[PREFLIGHT] Warm up {name} failed: {step_error}")
+        return WarmUpStepRead(name=name, seconds=time.perf_counter() - start_time, error=error)
+
+    def _warm_up_database(self) -> None:
+        # any query opens the pool connection, the email itself does not matter
+        self.token_repo.get_token_by_email("")
+
+    def _warm_up_driver(self) -> None:
+        # first launch patches chromedriver and fills the OS cache for Chrome
+        self.driver_service.get_driver(self.PREFLIGHT_DRIVER_KEY, owner=self.PREFLIGHT_DRIVER_KEY)
+        self.driver_service.close_driver(self.PREFLIGHT_DRIVER_KEY)
@@ -0,0 +1,109 @@
+import datetime
+from enum import Enum
+from typing import Optional
+import uuid
+
+from pydantic import BaseModel, Field, computed_field
+
+from src.service.ticket_bot.commons import LoginCredential
+from src.service.ticket_bot.purchase_control import PurchaseStage
+from src.service.ticket_bot.tixcraft_ticket_assistant import Event
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_JOB_STATES = {JobState.SUCCEEDED, JobState.FAILED, JobState.CANCELLED}
+
+JOB_DRIVER_KEY_PREFIX = "tixcraft-"
+
+
+class JobEventKind(str, Enum):
+    STATE_CHANGED = "state_changed"
+    STAGE_STARTED = "stage_started"
+    STAGE_FINISHED = "stage_finished"
+    WAITING_ROOM = "waiting_room"
+
+
+class JobEvent(BaseModel):
+    sequence: int
+    job_id: uuid.UUID
+    kind: JobEventKind
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    state: Optional[JobState] = None
+    stage: Optional[PurchaseStage] = None
+    elapsed_seconds: Optional[float] = None
+    is_succeeded: Optional[bool] = None
+    budget_seconds: Optional[float] = None
+    is_budget_exceeded: Optional[bool] = None
+    queue_position: Optional[int] = None
+    estimated_wait_seconds: Optional[int] = None
+
+
+class PurchaseJobRequest(BaseModel):
+    credential: LoginCredential
+    event: Event
+    priority: int = Field(default=0, description="Jobs with a higher priority are started first")
+    start_at: Optional[datetime.datetime] = Field(
+        default=None, description="Job is held back until this time, immediately queued if omitted"
+    )
+
+    def dedup_key(self) -> str:
+        # the same account asking twice for the same event is one job
+        return f"{self.credential.email}:{self.event.model_dump_json()}"
+
+
+class PurchaseJobRead(BaseModel):
+    """
+    Public view of a job, the credential is reduced to its email
+    """
+
+    id: uuid.UUID
+    email: str
+    event_key_word: str
+    state: JobState
+    priority: int
+    start_at: Optional[datetime.datetime] = None
+    submitted_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+
+
+class PurchaseJob(BaseModel):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
+    request: PurchaseJobRequest
+    state: JobState = JobState.QUEUED
+    submitted_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+
+    @computed_field
+    @property
+    def driver_key(self) -> str:
+        return f"{JOB_DRIVER_KEY_PREFIX}{self.id}"
+
+    @computed_field
+    @property
+    def is_finished(self) -> bool:
+        return self.state in FINISHED_JOB_STATES
+
+    def as_read(self) -> PurchaseJobRead:
+        return PurchaseJobRead(
+            id=self.id,
+            email=self.request.credential.email,
+            event_key_word=self.request.event.event_key_word,
+            state=self.state,
+            priority=self.request.priority,
+            start_at=self.request.start_at,
+            submitted_at=self.submitted_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            error=self.error,
+        )
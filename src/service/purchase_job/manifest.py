@@ -0,0 +1,68 @@
+import csv
+import json
+from typing import Iterator, Optional
+
+from pydantic import BaseModel, ValidationError
+
+from src.service.purchase_job.commons import PurchaseJobRequest
+
+"""
+A manifest lists one purchase per record, either as JSONL:
+{"credential": {"email": "...", "password": "..."}, "event": {..., "fallback_targets": [{"event_datetime": "...", "seat_key_word": "...", "number_of_tickets": 2}]}, "priority": 1, "start_at": "2024-12-07T12:00:00"}
+
+or as CSV with flat columns, key word columns are comma-separated (fallback targets are JSONL only):
+email,password,event_key_word,event_datetime,seat_key_word,number_of_tickets,delivery_key_words,payment_key_words,exclude_key_words,priority,start_at
+"""
+
+EVENT_LIST_COLUMNS = ["delivery_key_words", "payment_key_words", "exclude_key_words"]
+EVENT_COLUMNS = ["event_key_word", "event_datetime", "seat_key_word", "number_of_tickets", *EVENT_LIST_COLUMNS]
+
+
+class ManifestLine(BaseModel):
+    line_number: int
+    request: Optional[PurchaseJobRequest] = None
+    error: Optional[str] = None
+
+
+def split_key_words(raw_key_words: str) -> list[str]:
+    return [key_word.strip() for key_word in raw_key_words.split(",") if key_word.strip() != ""]
+
+
+def _csv_row_as_record(row: dict[str, str]) -> dict:
+    event = {column: row.get(column) or "" for column in EVENT_COLUMNS}
+    for column in EVENT_LIST_COLUMNS:
+        event[column] = split_key_words(event[column])
+    record: dict = {
+        "credential": {"email": row.get("email"), "password": row.get("password")},
+        "event": event,
+    }
+    if row.get("priority"):
+        record["priority"] = row["priority"]
+    if row.get("start_at"):
+        record["start_at"] = row["start_at"]
+    return record
+
+
+def _iter_raw_records(manifest_path: str) -> Iterator[dict | str]:
+    # records are streamed one by one so huge manifests never sit in memory
+    with open(manifest_path, newline="") as file:
+        if manifest_path.endswith(".csv"):
+            for row in csv.DictReader(file):
+                yield _csv_row_as_record(row)
+            return
+        for line in file:
+            yield line
+
+
+def iter_manifest(manifest_path: str) -> Iterator[ManifestLine]:
+    for line_number, raw_record in enumerate(_iter_raw_records(manifest_path), start=1):
+        try:
+            if isinstance(raw_record, str):
+                if raw_record.strip() == "":
+                    continue
+                raw_record = json.loads(raw_record)
+            request = PurchaseJobRequest.model_validate(raw_record)
+        except (json.JSONDecodeError, ValidationError) as error:
+            yield ManifestLine(line_number=line_number, error=str(error))
+            continue
+        yield ManifestLine(line_number=line_number, request=request)
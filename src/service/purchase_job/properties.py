@@ -0,0 +1,17 @@
+from py_spring_core import Properties
+from pydantic import Field
+
+
+class PurchaseJobProperties(Properties):
+    __key__: str = "purchase_job"
+    max_workers: int = Field(default=5, gt=0)
+    max_retained_jobs: int = Field(default=1000, gt=0)
+    max_events_per_job: int = Field(default=200, gt=0)
+
+
+class PurchaseMetricsProperties(Properties):
+    __key__: str = "purchase_metrics"
+    latency_window_size: int = Field(default=500, gt=0)
+    poll_window_seconds: float = Field(default=60, gt=0)
+    max_polls_per_event: int = Field(default=1000, gt=0)
+    max_tracked_events: int = Field(default=100, gt=0)
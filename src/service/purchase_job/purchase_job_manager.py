@@ -0,0 +1,381 @@
+from collections import deque
+import datetime
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+import uuid
+
+from loguru import logger
+from py_spring_core import Component
+
+from src.commons.selenium_driver_service import SeleniumDriverService
+from src.service.purchase_job.commons import (
+    JobEvent,
+    JobEventKind,
+    JobState,
+    PurchaseJob,
+    PurchaseJobRead,
+    PurchaseJobRequest,
+)
+from src.service.purchase_job.properties import PurchaseJobProperties
+from src.service.purchase_job.purchase_metrics import PurchaseMetrics
+from src.service.ticket_bot.purchase_control import (
+    PurchaseControl,
+    PurchaseListener,
+    PurchaseStage,
+    StageRecord,
+)
+from src.service.ticket_bot.tixcraft_ticket_assistant import TixcraftTicketAssistant
+from src.service.ticket_bot.waiting_room import WaitingRoomStatus
+
+
+class JobNotFoundError(Exception): ...
+
+
+class JobEventRecorder(PurchaseListener):
+    def __init__(self, manager: "PurchaseJobManager", job_id: uuid.UUID) -> None:
+        self.manager = manager
+        self.job_id = job_id
+
+    def on_stage_started(self, control: PurchaseControl, stage: PurchaseStage) -> None:
+        self.manager._publish_event(self.job_id, JobEventKind.STAGE_STARTED, stage=stage)
+
+    def on_stage_finished(self, control: PurchaseControl, record: StageRecord) -> None:
+        self.manager._publish_event(
+            self.job_id,
+            JobEventKind.STAGE_FINISHED,
+            stage=record.stage,
+            elapsed_seconds=record.elapsed_seconds,
+            is_succeeded=record.is_succeeded,
+            budget_seconds=record.budget_seconds,
+            is_budget_exceeded=record.is_budget_exceeded,
+        )
+
+    def on_waiting_room(self, control: PurchaseControl, status: WaitingRoomStatus) -> None:
+        self.manager._publish_event(
+            self.job_id,
+            JobEventKind.WAITING_ROOM,
+            queue_position=status.position,
+            estimated_wait_seconds=status.estimated_wait_seconds,
+            elapsed_seconds=status.waited_seconds,
+        )
+
+
+class PurchaseJobManager(Component):
+    """
+    Keeps purchases running inside one warm process, jobs are fed through an
+    in-memory priority queue and picked up by a fixed number of worker threads.
+    Jobs with a start time are held by a scheduler thread until they are due,
+    and jobs of the same account never run at the same time.
+    """
+
+    properties: PurchaseJobProperties
+    ticket_assistant: TixcraftTicketAssistant
+    driver_service: SeleniumDriverService
+    metrics: PurchaseMetrics
+
+    def __init__(self) -> None:
+        self.jobs: dict[uuid.UUID, PurchaseJob] = {}
+        self.controls: dict[uuid.UUID, PurchaseControl] = {}
+        self.job_events: dict[uuid.UUID, deque[JobEvent]] = {}
+        # dedup key of every unfinished job, so a submit does not scan the retained jobs
+        self.unfinished_job_ids_by_key: dict[str, uuid.UUID] = {}
+        # (negated priority, sequence, job id), a None job id stops the worker
+        self.job_queue: queue.PriorityQueue[tuple[float, int, Optional[uuid.UUID]]] = queue.PriorityQueue()
+        # (start timestamp, sequence, job id) of jobs that are not due yet
+        self.scheduled_jobs: list[tuple[float, int, uuid.UUID]] = []
+        self.running_emails: set[str] = set()
+        self.waiting_jobs_by_email: dict[str, deque[uuid.UUID]] = {}
+        self.workers: list[threading.Thread] = []
+        self.scheduler: Optional[threading.Thread] = None
+        self.is_stopped = False
+        self.lock = threading.Lock()
+        self.event_condition = threading.Condition(self.lock)
+        self.schedule_condition = threading.Condition(self.lock)
+        self.event_sequence = itertools.count()
+        self.queue_sequence = itertools.count()
+
+    def destroy(self) -> None:
+        logger.info(f"[JOB MANAGER] Stopping {len(self.workers)} workers")
+        for job in self.list_jobs():
+            if job.state not in (JobState.QUEUED, JobState.RUNNING):
+                continue
+            self.cancel_job(job.id)
+        with self.schedule_condition:
+            self.is_stopped = True
+            self.schedule_condition.notify_all()
+        for _ in self.workers:
+            self.job_queue.put((math.inf, next(self.queue_sequence), None))
+
+    def start_workers(self, max_workers: Optional[int] = None) -> None:
+        """
+        Starts the worker pool, max_workers overrides the configured pool size
+        as long as the pool is not running yet
+        """
+        with self.lock:
+            if len(self.workers) != 0:
+                return
+            worker_count = max_workers or self.properties.max_workers
+            for index in range(worker_count):
+                worker = threading.Thread(
+                    target=self._work, name=f"purchase-worker-{index}", daemon=True
+                )
+                worker.start()
+                self.workers.append(worker)
+            self.scheduler = threading.Thread(
+                target=self._schedule, name="purchase-scheduler", daemon=True
+            )
+            self.scheduler.start()
+            self.metrics.record_worker_count(worker_count)
+        logger.info(f"[JOB MANAGER] Started {worker_count} workers")
+
+    def submit_job(self, request: PurchaseJobRequest) -> PurchaseJobRead:
+        self.start_workers()
+        with self.lock:
+            dedup_key = request.dedup_key()
+            optional_duplicate = self._find_unfinished_job(dedup_key)
+            if optional_duplicate is not None:
+                logger.warning(
+                    f"[JOB DEDUPLICATED] Job: {optional_duplicate.id} already covers email: {request.credential.email}, event: {request.event.event_key_word}"
+                )
+                return optional_duplicate.as_read()
+            job = PurchaseJob(request=request)
+            control = PurchaseControl(driver_key=job.driver_key, owner=str(job.id))
+            control.add_listener(self.metrics)
+            control.add_listener(JobEventRecorder(self, job.id))
+            self.jobs[job.id] = job
+            self.unfinished_job_ids_by_key[dedup_key] = job.id
+            self.controls[job.id] = control
+            self.job_events[job.id] = deque(maxlen=self.properties.max_events_per_job)
+            self._evict_finished_jobs()
+            self.metrics.record_job_transition(None, job.state)
+            self._append_event(job.id, JobEventKind.STATE_CHANGED, state=job.state)
+            if request.start_at is not None and request.start_at.timestamp() > time.time():
+                heapq.heappush(
+                    self.scheduled_jobs,
+                    (request.start_at.timestamp(), next(self.queue_sequence), job.id),
+                )
+                self.schedule_condition.notify_all()
+            else:
+                self._enqueue(job)
+        logger.info(
+            f"[JOB SUBMITTED] Job: {job.id} for email: {request.credential.email}, event: {request.event.event_key_word}"
+        )
+        return job.as_read()
+
+    def wait_for_jobs(self, job_ids: Iterable[uuid.UUID]) -> list[PurchaseJobRead]:
+        """
+        Blocks until every given job is finished, evicted jobs count as finished
+        """
+        job_ids = list(job_ids)
+        pending_job_ids = set(job_ids)
+        with self.event_condition:
+            while True:
+                pending_job_ids = {
+                    job_id
+                    for job_id in pending_job_ids
+                    if job_id in self.jobs and not self.jobs[job_id].is_finished
+                }
+                if len(pending_job_ids) == 0:
+                    break
+                self.event_condition.wait(1)
+            return [self.jobs[job_id].as_read() for job_id in job_ids if job_id in self.jobs]
+
+    def get_job(self, job_id: uuid.UUID) -> PurchaseJobRead:
+        with self.lock:
+            if job_id not in self.jobs:
+                raise JobNotFoundError(f"Job: {job_id} not found")
+            return self.jobs[job_id].as_read()
+
+    def list_jobs(self, state: Optional[JobState] = None) -> list[PurchaseJobRead]:
+        with self.lock:
+            return [
+                job.as_read()
+                for job in self.jobs.values()
+                if state is None or job.state == state
+            ]
+
+    def iter_job_events(
+        self, job_id: uuid.UUID, heartbeat_seconds: float = 15
+    ) -> Iterator[Optional[JobEvent]]:
+        """
+        Yields the events of a job as they happen until the job is finished,
+        None is yielded when nothing happened within heartbeat_seconds
+        """
+        last_sequence = -1
+        while True:
+            with self.event_condition:
+                if job_id not in self.jobs:
+                    raise JobNotFoundError(f"Job: {job_id} not found")
+                events = self._events_after(job_id, last_sequence)
+                if len(events) == 0:
+                    if self.jobs[job_id].is_finished:
+                        return
+                    self.event_condition.wait(heartbeat_seconds)
+                    events = self._events_after(job_id, last_sequence)
+            if len(events) == 0:
+                yield None
+            for event in events:
+                last_sequence = event.sequence
+                yield event
+
+    def cancel_job(self, job_id: uuid.UUID) -> PurchaseJobRead:
+        with self.lock:
+            if job_id not in self.jobs:
+                raise JobNotFoundError(f"Job: {job_id} not found")
+            job = self.jobs[job_id]
+            if job.is_finished:
+                return job.as_read()
+            self.controls[job_id].cancel()
+            is_running = job.state == JobState.RUNNING
+            if not is_running:
+                self._finish_job(job, JobState.CANCELLED)
+        if is_running:
+            # closing the driver interrupts any blocking wait inside the purchase
+            self.driver_service.close_driver(job.driver_key)
+        logger.warning(f"[JOB CANCELLED] Job: {job_id} is cancelled")
+        return self.get_job(job_id)
+
+    def _enqueue(self, job: PurchaseJob) -> None:
+        self.job_queue.put((-job.request.priority, next(self.queue_sequence), job.id))
+
+    def _find_unfinished_job(self, dedup_key: str) -> Optional[PurchaseJob]:
+        # caller must hold self.lock
+        job_id = self.unfinished_job_ids_by_key.get(dedup_key)
+        if job_id is None:
+            return None
+        return self.jobs.get(job_id)
+
+    def _schedule(self) -> None:
+        with self.schedule_condition:
+            while not self.is_stopped:
+                if len(self.scheduled_jobs) == 0:
+                    self.schedule_condition.wait()
+                    continue
+                start_timestamp, _, job_id = self.scheduled_jobs[0]
+                delay = start_timestamp - time.time()
+                if delay > 0:
+                    self.schedule_condition.wait(delay)
+                    continue
+                heapq.heappop(self.scheduled_jobs)
+                job = self.jobs.get(job_id)
+                if job is not None and job.state == JobState.QUEUED:
+                    logger.info(f"[JOB DUE] Job: {job_id} reached its start time")
+                    self._enqueue(job)
+
+    def _release_email(self, email: str) -> None:
+        # hand the account over to the next job waiting for it
+        self.running_emails.discard(email)
+        waiting_job_ids = self.waiting_jobs_by_email.get(email)
+        while waiting_job_ids:
+            job = self.jobs.get(waiting_job_ids.popleft())
+            if job is not None and job.state == JobState.QUEUED:
+                self._enqueue(job)
+                break
+        if waiting_job_ids is not None and len(waiting_job_ids) == 0:
+            self.waiting_jobs_by_email.pop(email)
+
+    def _work(self) -> None:
+        while True:
+            _, _, job_id = self.job_queue.get()
+            if job_id is None:
+                return
+            try:
+                self._run_job(job_id)
+            except Exception as error:
+                logger.error(f"[JOB FAILED] Job: {job_id} crashed: {error}")
+            finally:
+                self.job_queue.task_done()
+
+    def _run_job(self, job_id: uuid.UUID) -> None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != JobState.QUEUED:
+                return
+            email = job.request.credential.email
+            if email in self.running_emails:
+                logger.info(f"[JOB DEFERRED] Job: {job_id} waits for another job of email: {email}")
+                self.waiting_jobs_by_email.setdefault(email, deque()).append(job_id)
+                return
+            self.running_emails.add(email)
+            self._change_state(job, JobState.RUNNING)
+            job.started_at = datetime.datetime.now()
+            control = self.controls[job_id]
+
+        logger.info(f"[JOB STARTED] Job: {job_id}")
+        error: Optional[str] = None
+        try:
+            is_purchased = self.ticket_assistant.purchase_ticket(
+                job.request.credential, job.request.event, control
+            )
+        except Exception as unexpected_error:
+            is_purchased = False
+            error = str(unexpected_error)
+        optional_recycle_reason = self.driver_service.pop_recycle_reason(job.driver_key)
+
+        with self.lock:
+            if control.is_cancelled:
+                state = JobState.CANCELLED
+            elif is_purchased:
+                state = JobState.SUCCEEDED
+            else:
+                state = JobState.FAILED
+                error = optional_recycle_reason or error or "Purchase is not completed, see logs for details"
+            self._finish_job(job, state, error)
+            self._release_email(email)
+        if job.driver_key in self.driver_service.driver_pool:
+            if state == JobState.SUCCEEDED or (state == JobState.FAILED and control.is_submitted):
+                # the browser holding the order stays open for a while so the payment can be completed
+                if state == JobState.FAILED:
+                    logger.warning(f"[JOB FAILED] Job: {job_id} failed after submitting its order, keeping its browser")
+                self.driver_service.release_driver(job.driver_key)
+            else:
+                self.driver_service.close_driver(job.driver_key)
+        logger.info(f"[JOB FINISHED] Job: {job_id} finished with state: {state.value}")
+
+    def _events_after(self, job_id: uuid.UUID, sequence: int) -> list[JobEvent]:
+        return [event for event in self.job_events.get(job_id, []) if event.sequence > sequence]
+
+    def _publish_event(self, job_id: uuid.UUID, kind: JobEventKind, **kwargs) -> None:
+        with self.event_condition:
+            self._append_event(job_id, kind, **kwargs)
+
+    def _append_event(self, job_id: uuid.UUID, kind: JobEventKind, **kwargs) -> None:
+        # caller must hold self.lock
+        if job_id not in self.job_events:
+            return
+        self.job_events[job_id].append(
+            JobEvent(sequence=next(self.event_sequence), job_id=job_id, kind=kind, **kwargs)
+        )
+        self.event_condition.notify_all()
+
+    def _change_state(self, job: PurchaseJob, state: JobState) -> None:
+        # caller must hold self.lock
+        self.metrics.record_job_transition(job.state, state)
+        job.state = state
+        self._append_event(job.id, JobEventKind.STATE_CHANGED, state=state)
+
+    def _finish_job(
+        self, job: PurchaseJob, state: JobState, error: Optional[str] = None
+    ) -> None:
+        self._change_state(job, state)
+        job.error = error
+        job.finished_at = datetime.datetime.now()
+        self.controls.pop(job.id, None)
+        dedup_key = job.request.dedup_key()
+        if self.unfinished_job_ids_by_key.get(dedup_key) == job.id:
+            self.unfinished_job_ids_by_key.pop(dedup_key)
+
+    def _evict_finished_jobs(self) -> None:
+        # keep memory flat for long running daemons, oldest finished jobs go first
+        overflow = len(self.jobs) - self.properties.max_retained_jobs
+        if overflow <= 0:
+            return
+        finished_job_ids = [job.id for job in self.jobs.values() if job.is_finished]
+        for job_id in finished_job_ids[:overflow]:
+            self.jobs.pop(job_id)
+            self.job_events.pop(job_id, None)
@@ -0,0 +1,172 @@
+from collections import OrderedDict, deque
+import math
+import threading
+import time
+from typing import Optional
+
+from py_spring_core import Component
+from pydantic import BaseModel
+
+from src.commons.selenium_driver_service import SeleniumDriverService
+from src.service.purchase_job.commons import JOB_DRIVER_KEY_PREFIX, JobState
+from src.service.purchase_job.properties import PurchaseMetricsProperties
+from src.service.ticket_bot.purchase_control import (
+    CaptchaOutcome,
+    PurchaseControl,
+    PurchaseListener,
+    PurchaseStage,
+    StageRecord,
+)
+
+
+class StageLatencyRead(BaseModel):
+    samples: int
+    p50_seconds: float
+    p95_seconds: float
+
+
+class StageBudgetUsageRead(BaseModel):
+    budget_seconds: float
+    samples: int
+    p50_usage_ratio: float
+    p95_usage_ratio: float
+    exceeded_count: int
+
+
+class PurchaseMetricsRead(BaseModel):
+    jobs_per_state: dict[JobState, int]
+    captcha_outcomes: dict[CaptchaOutcome, int]
+    captcha_success_rate: float
+    polls_per_second_by_event: dict[str, float]
+    driver_pool_size: int
+    driver_pool_utilization: float
+    stage_latencies: dict[PurchaseStage, StageLatencyRead]
+    stage_budget_usages: dict[PurchaseStage, StageBudgetUsageRead]
+
+
+def percentile(samples: list[float], ratio: float) -> float:
+    if len(samples) == 0:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(ratio * len(ordered)) - 1)
+    return ordered[index]
+
+
+class PurchaseMetrics(Component, PurchaseListener):
+    """
+    Aggregated purchase metrics, every structure is bounded by configuration
+    so memory stays constant no matter how many jobs went through the daemon
+    """
+
+    properties: PurchaseMetricsProperties
+    driver_service: SeleniumDriverService
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.jobs_per_state: dict[JobState, int] = {state: 0 for state in JobState}
+        self.captcha_outcomes: dict[CaptchaOutcome, int] = {
+            outcome: 0 for outcome in CaptchaOutcome
+        }
+        self.stage_latencies: dict[PurchaseStage, deque[float]] = {}
+        # elapsed / budget of the latest runs, > 1 means the budget was exceeded
+        self.stage_budget_usages: dict[PurchaseStage, deque[float]] = {}
+        self.stage_budgets: dict[PurchaseStage, float] = {}
+        self.stage_budget_exceeded_counts: dict[PurchaseStage, int] = {}
+        self.event_polls: OrderedDict[str, deque[float]] = OrderedDict()
+        # size of the running worker pool, which run-manifest --max-workers may override
+        self.worker_count = 0
+
+    def record_worker_count(self, worker_count: int) -> None:
+        with self.lock:
+            self.worker_count = worker_count
+
+    def record_job_transition(self, previous_state: Optional[JobState], state: JobState) -> None:
+        with self.lock:
+            if previous_state is not None:
+                self.jobs_per_state[previous_state] -= 1
+            self.jobs_per_state[state] += 1
+
+    def on_stage_finished(self, control: PurchaseControl, record: StageRecord) -> None:
+        with self.lock:
+            if record.stage not in self.stage_latencies:
+                self.stage_latencies[record.stage] = deque(
+                    maxlen=self.properties.latency_window_size
+                )
+            self.stage_latencies[record.stage].append(record.elapsed_seconds)
+            if record.budget_seconds is None:
+                return
+            if record.stage not in self.stage_budget_usages:
+                self.stage_budget_usages[record.stage] = deque(
+                    maxlen=self.properties.latency_window_size
+                )
+            self.stage_budget_usages[record.stage].append(record.elapsed_seconds / record.budget_seconds)
+            self.stage_budgets[record.stage] = record.budget_seconds
+            if record.is_budget_exceeded:
+                self.stage_budget_exceeded_counts[record.stage] = (
+                    self.stage_budget_exceeded_counts.get(record.stage, 0) + 1
+                )
+
+    def on_captcha(self, control: PurchaseControl, outcome: CaptchaOutcome) -> None:
+        with self.lock:
+            self.captcha_outcomes[outcome] += 1
+
+    def on_availability_poll(self, control: PurchaseControl, event_key_word: str) -> None:
+        with self.lock:
+            if event_key_word not in self.event_polls:
+                self.event_polls[event_key_word] = deque(
+                    maxlen=self.properties.max_polls_per_event
+                )
+            self.event_polls.move_to_end(event_key_word)
+            self.event_polls[event_key_word].append(time.monotonic())
+            while len(self.event_polls) > self.properties.max_tracked_events:
+                self.event_polls.popitem(last=False)
+
+    def as_read(self) -> PurchaseMetricsRead:
+        now = time.monotonic()
+        window = self.properties.poll_window_seconds
+        with self.lock:
+            total_captcha = sum(self.captcha_outcomes.values())
+            polls_per_second_by_event = {
+                event_key_word: sum(1 for polled_at in polls if now - polled_at <= window)
+                / window
+                for event_key_word, polls in self.event_polls.items()
+            }
+            stage_latencies = {
+                stage: StageLatencyRead(
+                    samples=len(latencies),
+                    p50_seconds=percentile(list(latencies), 0.5),
+                    p95_seconds=percentile(list(latencies), 0.95),
+                )
+                for stage, latencies in self.stage_latencies.items()
+            }
+            stage_budget_usages = {
+                stage: StageBudgetUsageRead(
+                    budget_seconds=self.stage_budgets[stage],
+                    samples=len(usages),
+                    p50_usage_ratio=percentile(list(usages), 0.5),
+                    p95_usage_ratio=percentile(list(usages), 0.95),
+                    exceeded_count=self.stage_budget_exceeded_counts.get(stage, 0),
+                )
+                for stage, usages in self.stage_budget_usages.items()
+            }
+            jobs_per_state = dict(self.jobs_per_state)
+            captcha_outcomes = dict(self.captcha_outcomes)
+            worker_count = self.worker_count
+
+        driver_pool_size = len(self.driver_service.driver_pool)
+        # released, login and preflight drivers also sit in the pool, only job drivers in use count
+        busy_driver_count = self.driver_service.count_owned_drivers(JOB_DRIVER_KEY_PREFIX)
+        return PurchaseMetricsRead(
+            jobs_per_state=jobs_per_state,
+            captcha_outcomes=captcha_outcomes,
+            captcha_success_rate=(
+                captcha_outcomes[CaptchaOutcome.ACCEPTED] / total_captcha
+                if total_captcha != 0
+                else 0.0
+            ),
+            polls_per_second_by_event=polls_per_second_by_event,
+            driver_pool_size=driver_pool_size,
+            driver_pool_utilization=busy_driver_count / worker_count if worker_count != 0 else 0.0,
+            stage_latencies=stage_latencies,
+            stage_budget_usages=stage_budget_usages,
+        )
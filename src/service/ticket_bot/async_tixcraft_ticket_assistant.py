@@ -0,0 +1,411 @@
+import asyncio
+import time
+from typing import ContextManager, Iterable, Optional
+
+from loguru import logger
+from py_spring_core import Component
+from pydantic import BaseModel
+from selenium.webdriver.common.by import By
+
+from src.commons.async_webdriver import (
+    AsyncNoSuchElementError,
+    AsyncWebDriver,
+    AsyncWebDriverClient,
+    AsyncWebDriverProperties,
+)
+from src.repository.repository import LoginTokenRepository
+from src.service.purchase_job.commons import PurchaseJobRequest
+from src.service.ticket_bot.commons import LoginCredential
+from src.service.ticket_bot.purchase_control import (
+    CaptchaOutcome,
+    PurchaseCancelledError,
+    PurchaseControl,
+    PurchaseDeadlineExceededError,
+    PurchaseStage,
+    RETRYABLE_STAGES,
+    StageBudgetExceededError,
+    StageBudgetProperties,
+)
+from src.service.ticket_bot.tixcraft_ticket_assistant import (
+    GAME_LIST_SCRIPT,
+    Event,
+    EventContext,
+    PurchaseTarget,
+    TargetCandidate,
+    TixcraftTicketAssistant,
+    VerificationCode,
+    is_seat_status_available,
+    parse_event_contexts,
+    rank_targets,
+)
+from src.service.ticket_bot.verification_code_decipher import VerificationCodeDecipher
+from src.service.ticket_bot.word_similarity_calculator import WordSimilarityCalculator
+
+ACTIVITY_ANCHORS_SCRIPT = """
+    const container = document.getElementById("all");
+    if (container === null) {
+        return [];
+    }
+    return Array.from(container.querySelectorAll("a")).map((anchor) => ({
+        text: anchor.innerText.trim(),
+        href: anchor.href,
+    }));
+"""
+
+AREA_LIST_SCRIPT = """
+    return Array.from(document.querySelectorAll(".area-list a")).map((anchor) => {
+        const font = anchor.querySelector("font");
+        return { text: anchor.innerText.trim(), status: font === null ? "" : font.innerText.trim() };
+    });
+"""
+
+
+class AsyncPurchaseResult(BaseModel):
+    email: str
+    event_key_word: str
+    is_purchased: bool = False
+    # open grid session the order is waiting for payment on
+    payment_session_id: Optional[str] = None
+
+
+class AsyncTixcraftTicketAssistant(Component):
+    """
+    Coroutine version of the TixcraftTicketAssistant purchase flow, on top of the
+    async WebDriver client. A single event loop drives every session, so waiting
+    on the driver or the grid costs a suspended coroutine instead of an idle thread.
+    """
+
+    properties: AsyncWebDriverProperties
+    budget_properties: StageBudgetProperties
+    token_repo: LoginTokenRepository
+    code_decipher: VerificationCodeDecipher
+
+    def purchase_all(self, requests: Iterable[PurchaseJobRequest]) -> list[AsyncPurchaseResult]:
+        """
+        Runs manifest requests with the job manager's semantics: duplicates are
+        dropped, higher priorities start first, start_at holds a request back and
+        the requests of one email run one after another on its token
+        """
+        unique_requests: dict[str, PurchaseJobRequest] = {}
+        for request in requests:
+            if request.dedup_key() in unique_requests:
+                logger.warning(f"[ASYNC PURCHASE] Duplicated request of email: {request.credential.email} skipped")
+                continue
+            unique_requests[request.dedup_key()] = request
+        # stable sort, equal priorities keep their manifest order
+        ordered_requests = sorted(unique_requests.values(), key=lambda request: -request.priority)
+        return asyncio.run(self._purchase_all(ordered_requests))
+
+    async def _purchase_all(self, requests: list[PurchaseJobRequest]) -> list[AsyncPurchaseResult]:
+        # asyncio.Lock wakes its waiters in order, so each email runs its requests by priority
+        email_locks: dict[str, asyncio.Lock] = {}
+        async with AsyncWebDriverClient(self.properties) as client:
+            return await asyncio.gather(
+                *(
+                    self._purchase_request(client, request, email_locks.setdefault(request.credential.email, asyncio.Lock()))
+                    for request in requests
+                )
+            )
+
+    async def _purchase_request(
+        self, client: AsyncWebDriverClient, request: PurchaseJobRequest, email_lock: asyncio.Lock
+    ) -> AsyncPurchaseResult:
+        if request.start_at is not None:
+            await asyncio.sleep(max(0.0, request.start_at.timestamp() - time.time()))
+        async with email_lock:
+            return await self.purchase_ticket(client, request.credential, request.event)
+
+    async def purchase_ticket(
+        self,
+        client: AsyncWebDriverClient,
+        credential: LoginCredential,
+        event: Event,
+        control: Optional[PurchaseControl] = None,
+    ) -> AsyncPurchaseResult:
+        if control is None:
+            control = PurchaseControl(driver_key=f"async-{credential.email}", owner=credential.email)
+        logger.info(f"[ASYNC PURCHASE] Start purchasing ticket for event: {event.event_key_word}")
+        driver: Optional[AsyncWebDriver] = None
+        result = AsyncPurchaseResult(email=credential.email, event_key_word=event.event_key_word)
+        try:
+            # the repository is synchronous, keep the loop free while it queries
+            token_read = await asyncio.to_thread(self.token_repo.get_token_by_email, credential.email)
+            if token_read is None or not token_read.is_usable:
+                logger.error(f"[ASYNC PURCHASE] No usable token for email: {credential.email}")
+                return result
+            driver = await client.new_session()
+            with self._stage(control, PurchaseStage.ACTIVITY_PAGE):
+                await driver.get(TixcraftTicketAssistant.EVENT_URL)
+                await self._accept_cookie_policy(driver)
+                await self._load_token(driver, token_read.sid_value)
+            with self._stage(control, PurchaseStage.EVENT_PAGE):
+                event_page_handles = await self._go_to_event_pages(driver, event, control)
+            if len(event_page_handles) == 0:
+                logger.error("[ASYNC PURCHASE] Event not found, skipping current purchase")
+                return result
+            with self._stage(control, PurchaseStage.AVAILABILITY_POLLING):
+                candidates = await self._poll_until_available(driver, event, control, event_page_handles)
+            if len(candidates) == 0:
+                logger.error("[ASYNC PURCHASE] No target matches the available events")
+                return result
+
+            start_time = time.time()
+            control.start_deadline(event.deadline_seconds or self.budget_properties.purchase_deadline_seconds)
+            max_attempts = self.budget_properties.max_target_retries + 1
+            for candidate in candidates:
+                for attempt in range(1, max_attempts + 1):
+                    try:
+                        is_purchased = await self._purchase_target(
+                            driver, event, candidate, control, is_reloading=attempt > 1
+                        )
+                    except StageBudgetExceededError as error:
+                        if error.stage not in RETRYABLE_STAGES:
+                            raise
+                        logger.warning(f"[STAGE BUDGET] {error}, attempt {attempt}/{max_attempts}")
+                        continue
+                    if is_purchased:
+                        logger.success(
+                            f"[ASYNC PURCHASE] Ticket is purchased, session: {driver.session_id}, time spent: {time.time() - start_time:.2f} seconds"
+                        )
+                        result.is_purchased = True
+                        return result
+                    break
+                logger.warning(f"[ASYNC PURCHASE] Target: {candidate.target.as_view()} failed, falling through")
+            return result
+        except PurchaseCancelledError:
+            logger.warning(f"[ASYNC PURCHASE] Purchase on driver {control.driver_key} is cancelled")
+            return result
+        except (PurchaseDeadlineExceededError, StageBudgetExceededError) as error:
+            logger.error(f"[ASYNC PURCHASE] {error}")
+            return result
+        except Exception as error:
+            logger.error(f"[ASYNC PURCHASE] Purchase on driver {control.driver_key} failed: {error}")
+            return result
+        finally:
+            if driver is not None:
+                await self._keep_for_payment_or_quit(driver, result, control)
+
+    async def _keep_for_payment_or_quit(
+        self, driver: AsyncWebDriver, result: AsyncPurchaseResult, control: PurchaseControl
+    ) -> None:
+        # a submitted form holds the seats even if a later stage failed, the order can still be completed
+        if not result.is_purchased and not control.is_submitted:
+            await driver.quit()
+            return
+        if self.properties.is_headless:
+            # nobody can pay on a headless browser, do not leave it orphaned on the grid
+            logger.error(
+                f"[ASYNC PURCHASE] Order of email: {result.email} needs payment but session {driver.session_id} is headless, quitting it"
+            )
+            await driver.quit()
+            return
+        # the session outlives the client pool on the grid, pay on it and close it from the grid console
+        result.payment_session_id = driver.session_id
+        logger.success(f"[ASYNC PURCHASE] Pay for the order of email: {result.email} on session: {driver.session_id}")
+
+    def _stage(self, control: PurchaseControl, stage: PurchaseStage) -> ContextManager[None]:
+        return control.stage(stage, self.budget_properties.budget_for(stage))
+
+    async def _sleep(self, control: PurchaseControl, seconds: float) -> None:
+        control.raise_if_cancelled()
+        await asyncio.sleep(seconds)
+        control.raise_if_cancelled()
+
+    async def _accept_cookie_policy(self, driver: AsyncWebDriver) -> None:
+        try:
+            accept_button = await driver.find_element(By.ID, "onetrust-accept-btn-handler")
+            await accept_button.click()
+            logger.info("[COOKIE POLICY ACCEPTANCE] Accepting cookie policy...")
+        except AsyncNoSuchElementError:
+            return
+
+    async def _load_token(self, driver: AsyncWebDriver, sid_value: str) -> None:
+        for cookie in await driver.get_cookies():
+            if cookie["name"] != "SID":
+                continue
+            cookie["value"] = sid_value
+            await driver.delete_cookie(cookie["name"])
+            await driver.add_cookie(cookie)
+        await driver.refresh()
+
+    async def _go_to_event_pages(
+        self, driver: AsyncWebDriver, event: Event, control: PurchaseControl
+    ) -> dict[str, str]:
+        anchors = await driver.execute_script(ACTIVITY_ANCHORS_SCRIPT)
+        event_urls: dict[str, str] = {}
+        for key_word in event.all_event_key_words():
+            matched_urls = [
+                anchor["href"]
+                for anchor in anchors
+                if key_word in anchor["text"]
+                and not any(excluded in anchor["text"] for excluded in event.exclude_key_words)
+            ]
+            if len(matched_urls) != 0:
+                # same pick as the sync flow, the last matching anchor
+                event_urls[key_word] = matched_urls[-1]
+        if event.event_key_word not in event_urls:
+            return {}
+
+        primary_handle = await driver.current_window_handle()
+        event_page_handles = {event.event_key_word: primary_handle}
+        for key_word, url in event_urls.items():
+            if key_word == event.event_key_word:
+                continue
+            handle = await driver.new_tab()
+            await driver.switch_to_window(handle)
+            await driver.get(url)
+            event_page_handles[key_word] = handle
+        await driver.switch_to_window(primary_handle)
+        await driver.get(event_urls[event.event_key_word])
+        await driver.wait_until_element_is_visible(control.timeout_seconds(10), By.CLASS_NAME, "buy")
+        return event_page_handles
+
+    async def _poll_until_available(
+        self,
+        driver: AsyncWebDriver,
+        event: Event,
+        control: PurchaseControl,
+        event_page_handles: dict[str, str],
+    ) -> list[TargetCandidate]:
+        while True:
+            control.raise_if_cancelled()
+            snapshots: dict[str, list[EventContext]] = {}
+            for key_word, handle in event_page_handles.items():
+                await driver.switch_to_window(handle)
+                snapshots[key_word] = await self._poll_event_page(driver, key_word, control)
+            if any(ctx.is_available for contexts in snapshots.values() for ctx in contexts):
+                logger.success("[ASYNC PURCHASE] Ticket is available")
+                return rank_targets(event, snapshots, event_page_handles)
+
+    async def _poll_event_page(
+        self, driver: AsyncWebDriver, event_key_word: str, control: PurchaseControl
+    ) -> list[EventContext]:
+        try:
+            purchase_button = await driver.find_element(By.CLASS_NAME, "buy")
+        except AsyncNoSuchElementError:
+            logger.warning(f"[ASYNC PURCHASE] Purchase button not found for event: {event_key_word}")
+            await self._sleep(control, 1)
+            return []
+        button_text = await purchase_button.text()
+        if not any(_id in button_text for _id in TixcraftTicketAssistant.PURCHASE_BUTTON_TEXT_IDS):
+            raise ValueError(f"Button text is not in {TixcraftTicketAssistant.PURCHASE_BUTTON_TEXT_IDS}")
+        await driver.scroll_to_element(purchase_button)
+        await purchase_button.click()
+        await self._sleep(control, 1)
+        await purchase_button.click()
+        control.notify_availability_poll(event_key_word)
+        await self._sleep(control, 1.5)
+        optional_rows = await driver.execute_script(GAME_LIST_SCRIPT)
+        return parse_event_contexts(optional_rows or [])
+
+    async def _purchase_target(
+        self,
+        driver: AsyncWebDriver,
+        event: Event,
+        candidate: TargetCandidate,
+        control: PurchaseControl,
+        is_reloading: bool = False,
+    ) -> bool:
+        await driver.switch_to_window(candidate.window_handle)
+        with self._stage(control, PurchaseStage.SEAT_SELECTION):
+            is_seat_selected = await self._select_seat(
+                driver, candidate.event_context, candidate.target, control, is_reloading
+            )
+        if not is_seat_selected:
+            return False
+        with self._stage(control, PurchaseStage.PURCHASE_FORM):
+            await self._fill_purchase_form(driver, candidate.target.number_of_tickets, control)
+        with self._stage(control, PurchaseStage.PAYMENT_METHOD):
+            await driver.wait_until_element_is_visible(control.timeout_seconds(300), By.ID, "paymentBox")
+            await self._click_label(driver, "#paymentBox label", event.payment_key_words)
+        with self._stage(control, PurchaseStage.DELIVERY_METHOD):
+            await driver.wait_until_element_is_visible(control.timeout_seconds(10), By.CLASS_NAME, "pay-column")
+            await self._click_label(driver, "#shipmentList label", event.delivery_key_words)
+        with self._stage(control, PurchaseStage.CHECKOUT):
+            checkout_button = await driver.wait_until_element_is_visible(
+                control.timeout_seconds(10), By.ID, "submitButton"
+            )
+            await driver.scroll_to_element(checkout_button)
+            await checkout_button.click()
+        return True
+
+    async def _select_seat(
+        self,
+        driver: AsyncWebDriver,
+        event_context: EventContext,
+        target: PurchaseTarget,
+        control: PurchaseControl,
+        is_reloading: bool = False,
+    ) -> bool:
+        if is_reloading or await driver.current_url() != event_context.url:
+            await driver.get(event_context.url)
+        if TixcraftTicketAssistant.TICKET_ENTRY_BASE_URL in await driver.current_url():
+            return True
+        await driver.wait_until_element_is_visible(control.timeout_seconds(30), By.CLASS_NAME, "area-list")
+        seats = await driver.execute_script(AREA_LIST_SCRIPT)
+        available_seat_names = {
+            index: seat["text"]
+            for index, seat in enumerate(seats)
+            if is_seat_status_available(seat["status"])
+        }
+        calculator = WordSimilarityCalculator(target.seat_key_word, list(available_seat_names.values()))
+        if len(calculator.similarity_map) == 0:
+            logger.error("[ASYNC PURCHASE] No available seat left")
+            return False
+        candidate_word = calculator.highest_similarity()
+        if calculator.similarity_map[candidate_word] == 0:
+            logger.error(f"[ASYNC PURCHASE] No available seat matches: {target.seat_key_word}")
+            return False
+        seat_index = next(index for index, name in available_seat_names.items() if name == candidate_word)
+        seat_element = (await driver.find_elements(By.CSS_SELECTOR, ".area-list a"))[seat_index]
+        await driver.scroll_to_element(seat_element)
+        await seat_element.click()
+        logger.success(f"[ASYNC PURCHASE] Seat: {candidate_word} is selected")
+        await driver.wait_until_element_is_visible(
+            control.timeout_seconds(10), By.ID, "TicketForm_verifyCode-image"
+        )
+        return True
+
+    async def _fill_purchase_form(
+        self, driver: AsyncWebDriver, number_of_tickets: int, control: PurchaseControl
+    ) -> None:
+        while True:
+            select_element = await driver.find_element(By.CLASS_NAME, "mobile-select")
+            max_tickets = int((await select_element.text()).strip().split("\n")[-1])
+            await driver.select_by_visible_text(select_element, str(min(number_of_tickets, max_tickets)))
+            await (await driver.find_element(By.ID, "TicketForm_agree")).click()
+            await self._pass_verification_code(driver, control)
+            await (await driver.find_element(By.CLASS_NAME, "btn-green")).click()
+            await self._sleep(control, 0.5)
+            optional_alert_text = await driver.alert_text()
+            if optional_alert_text is None or TixcraftTicketAssistant.INCORRECT_CODE_ALERT not in optional_alert_text:
+                control.notify_captcha(CaptchaOutcome.ACCEPTED)
+                return
+            logger.error("[ASYNC PURCHASE] Verification code is incorrect, retry...")
+            control.notify_captcha(CaptchaOutcome.REJECTED)
+            await driver.accept_alert()
+
+    async def _pass_verification_code(self, driver: AsyncWebDriver, control: PurchaseControl) -> None:
+        while True:
+            control.raise_if_cancelled()
+            image_element = await driver.find_element(By.ID, "TicketForm_verifyCode-image")
+            image_binary = await image_element.screenshot_as_png()
+            # OCR is CPU bound, run it off the loop so other sessions keep moving
+            code = await asyncio.to_thread(self.code_decipher.detect_verification_code, image_binary)
+            if VerificationCode(code=code).is_valid:
+                await (await driver.find_element(By.ID, "TicketForm_verifyCode")).send_keys(code)
+                return
+            logger.error(f"[VERIFICATION CODE] Code is invalid: {code}")
+            control.notify_captcha(CaptchaOutcome.UNREADABLE)
+            await image_element.click()
+            await self._sleep(control, 0.5)
+
+    async def _click_label(self, driver: AsyncWebDriver, selector: str, key_words: list[str]) -> None:
+        labels = await driver.find_elements(By.CSS_SELECTOR, selector)
+        label_texts = [await label.text() for label in labels]
+        for keyword in key_words:
+            for label, label_text in zip(labels, label_texts):
+                if keyword in label_text:
+                    await label.click()
+                    logger.info(f"[ASYNC PURCHASE] Selecting: {keyword}")
+                    return
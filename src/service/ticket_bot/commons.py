@@ -1,6 +1,7 @@
 from enum import Enum
 
-from pydantic import BaseModel
+from py_spring_core import Properties
+from pydantic import BaseModel, Field
 
 class LoginCredential(BaseModel):
     """
@@ -13,3 +14,42 @@ class LoginCredential(BaseModel):
 class DriverKey(str, Enum):
     GOOGLE = "google"
     TIXCRAFT = "tixcraft"
+
+
+class GoogleLoginProperties(Properties):
+    __key__: str = "google_login"
+    step_timeout_seconds: float = Field(default=30, gt=0)
+    redirect_timeout_seconds: float = Field(default=60, gt=0)
+    recaptcha_timeout_seconds: float = Field(default=600, gt=0)
+    max_parallel_logins: int = Field(default=4, gt=0)
+    max_manual_recaptcha_logins: int = Field(default=2, gt=0)
+
+
+class TabPrefetchProperties(Properties):
+    __key__: str = "tab_prefetch"
+    is_enabled: bool = Field(default=False)
+    max_tabs: int = Field(default=4, ge=0)
+    # resident memory of the driver's Chrome processes, no more tabs are opened past it
+    max_rss_mb: float = Field(default=1024, gt=0)
+    refresh_interval_seconds: float = Field(default=30, gt=0)
+
+
+class WaitingRoomProperties(Properties):
+    __key__: str = "waiting_room"
+    is_enabled: bool = Field(default=True)
+    # only the queue's own host or DOM, loading text and "queue" in a path also show up on ordinary pages
+    host_markers: list[str] = Field(default_factory=lambda: ["queue-it.net"])
+    element_selectors: list[str] = Field(
+        default_factory=lambda: ["#MainPart_lbQueueNumber", "#queue-position", ".waiting-room"]
+    )
+    position_selectors: list[str] = Field(default_factory=lambda: ["#MainPart_lbQueueNumber", "#queue-position"])
+    wait_selectors: list[str] = Field(default_factory=lambda: ["#MainPart_lbWhichIsIn", "#queue-wait"])
+    check_interval_seconds: float = Field(default=5, gt=0)
+    # progress is logged and published to the job events at most this often
+    report_interval_seconds: float = Field(default=30, gt=0)
+    max_wait_seconds: float = Field(default=3600, gt=0)
+
+
+class SelectorCacheProperties(Properties):
+    __key__: str = "selector_cache"
+    is_enabled: bool = Field(default=True)
@@ -0,0 +1,102 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+import threading
+from typing import Iterable, Optional
+
+from loguru import logger
+from py_spring_core import Component
+from pydantic import BaseModel
+
+from src.service.ticket_bot.commons import GoogleLoginProperties, LoginCredential
+from src.service.ticket_bot.google_login_handler import GoogleLoginHandler, RecaptchaRequiredError
+
+
+class LoginStatus(str, Enum):
+    LOGGED_IN = "logged_in"
+    MANUAL_RECAPTCHA = "manual_recaptcha"
+    FAILED = "failed"
+
+
+class LoginResultRead(BaseModel):
+    email: str
+    status: LoginStatus
+    error: Optional[str] = None
+
+
+class GoogleLoginFarm(Component):
+    """
+    Logs many accounts in at once, each on its own pooled driver. Accounts that
+    hit reCAPTCHA are set aside on a separate queue, so a human can solve them
+    without holding up the rest of the batch.
+    """
+
+    properties: GoogleLoginProperties
+    login_handler: GoogleLoginHandler
+
+    def __init__(self) -> None:
+        self.manual_logins: dict[str, Future] = {}
+        self.manual_executor: Optional[ThreadPoolExecutor] = None
+        self.lock = threading.Lock()
+
+    def destroy(self) -> None:
+        if self.manual_executor is not None:
+            self.manual_executor.shutdown(wait=False, cancel_futures=True)
+
+    def login_all(self, credentials: Iterable[LoginCredential]) -> list[LoginResultRead]:
+        pending_credentials = [
+            credential
+            for credential in credentials
+            if credential.email not in self.get_manual_queue()
+        ]
+        logger.info(
+            f"[LOGIN FARM] Logging in {len(pending_credentials)} accounts with {self.properties.max_parallel_logins} drivers"
+        )
+        with ThreadPoolExecutor(
+            max_workers=self.properties.max_parallel_logins,
+            thread_name_prefix="login-farm",
+        ) as executor:
+            return list(executor.map(self._login, pending_credentials))
+
+    def get_manual_queue(self) -> list[str]:
+        with self.lock:
+            return [email for email, future in self.manual_logins.items() if not future.done()]
+
+    def _driver_key(self, credential: LoginCredential) -> str:
+        return f"google-{credential.email}"
+
+    def _login(self, credential: LoginCredential) -> LoginResultRead:
+        try:
+            self.login_handler.login(
+                credential,
+                driver_key=self._driver_key(credential),
+                is_recaptcha_deferred=True,
+            )
+        except RecaptchaRequiredError as error:
+            self._set_aside(credential, error.driver_key)
+            return LoginResultRead(email=credential.email, status=LoginStatus.MANUAL_RECAPTCHA)
+        except Exception as error:
+            logger.error(f"[LOGIN FARM] Login failed for email: {credential.email}: {error}")
+            return LoginResultRead(email=credential.email, status=LoginStatus.FAILED, error=str(error))
+        return LoginResultRead(email=credential.email, status=LoginStatus.LOGGED_IN)
+
+    def _set_aside(self, credential: LoginCredential, driver_key: str) -> None:
+        with self.lock:
+            if self.manual_executor is None:
+                self.manual_executor = ThreadPoolExecutor(
+                    max_workers=self.properties.max_manual_recaptcha_logins,
+                    thread_name_prefix="login-farm-manual",
+                )
+            logger.warning(f"[LOGIN FARM] Email: {credential.email} waits for manual reCAPTCHA")
+            self.manual_logins[credential.email] = self.manual_executor.submit(
+                self._resume, credential, driver_key
+            )
+
+    def _resume(self, credential: LoginCredential, driver_key: str) -> None:
+        try:
+            self.login_handler.resume_login(credential, driver_key)
+            logger.success(f"[LOGIN FARM] Email: {credential.email} logged in after manual reCAPTCHA")
+        except Exception as error:
+            logger.error(f"[LOGIN FARM] Manual login failed for email: {credential.email}: {error}")
+        finally:
+            with self.lock:
+                self.manual_logins.pop(credential.email, None)
@@ -1,28 +1,25 @@
 from enum import Enum
 import json
 from re import T
-import time
 from typing import ClassVar
 from loguru import logger
 from py_spring_core import Component
 from pydantic import BaseModel
 import selenium
 import selenium.webdriver
-
-from src.commons.selenium_driver_service import (
-    SeleniumDriverService,
-    WebDriver,
-    By,
-    Keys,
-    WebDriverWait,
-    expected_conditions,
-    ActionChains,
-    WebElement,
-)
+from selenium.webdriver import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+from src.commons.selenium_driver_service import SeleniumDriverService
 from src.repository.common import LoginTokenRead, TixcraftApiSource
 from src.repository.models import LoginToken
 from src.repository.repository import LoginTokenRepository
-from src.service.ticket_bot.commons import DriverKey, LoginCredential
+from src.service.ticket_bot.commons import DriverKey, GoogleLoginProperties, LoginCredential
 
 RawToken = str
 
@@ -30,37 +27,95 @@ RawToken = str
 
 
 
+class RecaptchaRequiredError(Exception):
+    """
+    Raised when a login runs into reCAPTCHA and solving it is deferred,
+    the driver is kept open so a human can solve it before resume_login
+    """
+
+    def __init__(self, email: str, driver_key: str) -> None:
+        super().__init__(f"reCAPTCHA required for email: {email}")
+        self.email = email
+        self.driver_key = driver_key
+
+
 class GoogleLoginHandler(Component):
     SESSION_ID: ClassVar[str] = "SID"
+    TIXCRAFT_URL: ClassVar[str] = "https://tixcraft.com"
+    RECAPTCHA_URL: ClassVar[str] = "https://accounts.google.com/v3/signin/challenge/recaptcha"
+    properties: GoogleLoginProperties
     driver_service: SeleniumDriverService
     tixcraft_api_source: TixcraftApiSource
     token_repo: LoginTokenRepository
 
-    def login(self, credential: LoginCredential) -> LoginTokenRead:
+    def login(
+        self,
+        credential: LoginCredential,
+        driver_key: str = DriverKey.GOOGLE,
+        is_recaptcha_deferred: bool = False,
+    ) -> LoginTokenRead:
         token = self.token_repo.get_token_by_email(credential.email)
         logger.info(f"[TOKEN REGRIVED] Email: {credential.email} with token: {token}")
-        if token is None or token.is_expired:
+        if token is None or not token.is_usable:
             if token is None:
                 logger.warning(
                     f"[TOKEN NOT FOUND] Token not found for email: {credential.email}"
                 )
+            elif not token.is_valid:
+                logger.warning(
+                    f"[TOKEN INVALID] Token for email: {credential.email} is rejected by tixcraft"
+                )
             else:
                 logger.warning(
                     f"[TOKEN EXPIRED] Token for email: {credential.email} is expired"
                 )
-            driver = self.driver_service.get_driver(DriverKey.GOOGLE)
-            raw_token = self._login_with_driver(driver=driver, credential=credential)
-            token = LoginToken(token=raw_token, email=credential.email)
-            logger.success(
-                f"[TOKEN CREATED] Token created for email: {credential.email}"
-            )
-            self.driver_service.close_driver(DriverKey.GOOGLE)
-            logger.info("[DRIVER CLOSED] Google driver closed")
-            new_token = self.token_repo.save_token(token)
-            return new_token
+            driver = self.driver_service.get_driver(driver_key, owner=credential.email)
+            try:
+                raw_token = self._login_with_driver(
+                    driver=driver,
+                    credential=credential,
+                    driver_key=driver_key,
+                    is_recaptcha_deferred=is_recaptcha_deferred,
+                )
+            except RecaptchaRequiredError:
+                # keep the driver open, someone has to solve the reCAPTCHA on it
+                raise
+            except Exception:
+                self.driver_service.close_driver(driver_key)
+                raise
+            return self._save_login(credential, driver_key, raw_token)
         logger.success(f"[TOKEN REUSED] Token reused for email: {credential.email}")
         return token
 
+    def resume_login(self, credential: LoginCredential, driver_key: str) -> LoginTokenRead:
+        """
+        Continues a login stopped by RecaptchaRequiredError once reCAPTCHA is solved
+        """
+        driver = self.driver_service.driver_pool.get(driver_key)
+        if driver is None:
+            raise ValueError(f"Driver: {driver_key} of the deferred login is not found")
+        try:
+            # a set-aside login may only get a worker after the challenge is already solved
+            if self._is_under_reCaptcha(driver):
+                self._handle_reCaptcha(driver)
+            self._enter_password(driver, credential)
+            raw_token = self._wait_for_session_id(driver)
+        except Exception:
+            self.driver_service.close_driver(driver_key)
+            raise
+        return self._save_login(credential, driver_key, raw_token)
+
+    def _save_login(
+        self, credential: LoginCredential, driver_key: str, raw_token: RawToken
+    ) -> LoginTokenRead:
+        token = LoginToken(token=raw_token, email=credential.email)
+        logger.success(
+            f"[TOKEN CREATED] Token created for email: {credential.email}"
+        )
+        self.driver_service.close_driver(driver_key)
+        logger.info(f"[DRIVER CLOSED] Google driver closed: {driver_key}")
+        return self.token_repo.save_token(token)
+
     def _get_session_id_from_cookies(self, driver: WebDriver) -> str:
         sid_cookie = driver.get_cookie(self.SESSION_ID)
         if sid_cookie is None:
@@ -68,29 +123,41 @@ class GoogleLoginHandler(Component):
         return json.dumps(sid_cookie)
 
     def _login_with_driver(
-        self, driver: WebDriver, credential: LoginCredential
+        self,
+        driver: WebDriver,
+        credential: LoginCredential,
+        driver_key: str = DriverKey.GOOGLE,
+        is_recaptcha_deferred: bool = False,
     ) -> RawToken:
         driver.get(self.tixcraft_api_source.google_login_url)
-        self._enter_credentials(driver, credential)
+        self._enter_email(driver, credential)
 
-        token = self._get_session_id_from_cookies(driver)
-        return token
+        # in case reCaptcha may happen
+        if self._is_under_reCaptcha(driver):
+            if is_recaptcha_deferred:
+                logger.warning(
+                    f"[RECAPTCHA] reCaptcha detected for email: {credential.email}, setting it aside"
+                )
+                raise RecaptchaRequiredError(credential.email, driver_key)
+            logger.warning(
+                f"[RECAPTCHA] reCaptcha detected, waiting for user to solve..."
+            )
+            self._handle_reCaptcha(driver)
+
+        self._enter_password(driver, credential)
+        return self._wait_for_session_id(driver)
 
     def _is_under_reCaptcha(self, driver: WebDriver) -> bool:
-        return (
-            "https://accounts.google.com/v3/signin/challenge/recaptcha"
-            in driver.current_url
-        )
+        return self.RECAPTCHA_URL in driver.current_url
 
     def _handle_reCaptcha(self, driver: WebDriver) -> None:
         logger.info(f"[RECAPTCHA] Handling reCaptcha")
         self._click_not_a_bot_button(driver)
-        while True:
-            logger.info(f"[RECAPTCHA] Waiting for user to solve...")
-            time.sleep(3)
-            if not self._is_under_reCaptcha(driver):
-                logger.success(f"[RECAPTCHA] reCaptcha solved...")
-                break
+        logger.info(f"[RECAPTCHA] Waiting for user to solve...")
+        WebDriverWait(
+            driver, self.properties.recaptcha_timeout_seconds, poll_frequency=1
+        ).until_not(lambda _driver: self._is_under_reCaptcha(_driver))
+        logger.success(f"[RECAPTCHA] reCaptcha solved...")
 
     def _find_iframe(self, driver: WebDriver) -> WebElement:
         captcha_iframe = WebDriverWait(driver, 10).until(
@@ -125,35 +192,36 @@ class GoogleLoginHandler(Component):
         )
         driver.execute_script("arguments[0].click()", captcha_box)
 
-    def _handle_redirect(self, driver: WebDriver) -> None:
-        tixcraft_url = "https://tixcraft.com"
-        while tixcraft_url not in driver.current_url:
-            logger.info(f"[REDIRECT] Waiting for redirect...")
-            time.sleep(3)
-        logger.success(
-            f"[REDIRECT] Redirected to {tixcraft_url}, waiting for page to load..."
+    def _enter_email(self, driver: WebDriver, credential: LoginCredential) -> None:
+        account_element = WebDriverWait(driver, self.properties.step_timeout_seconds).until(
+            expected_conditions.element_to_be_clickable((By.ID, "identifierId"))
         )
-        time.sleep(10)
-
-    def _enter_credentials(
-        self, driver: WebDriver, credential: LoginCredential
-    ) -> None:
-        account_element = driver.find_element(By.ID, "identifierId")
         account_element.send_keys(credential.email)
         account_element.send_keys(Keys.RETURN)
-        time.sleep(5)
-
-        # in case reCaptcha may happen
-        if self._is_under_reCaptcha(driver):
-            logger.warning(
-                f"[RECAPTCHA] reCaptcha detected, waiting for user to solve..."
+        # identifier is accepted once the password field shows up, unless reCaptcha comes first
+        WebDriverWait(driver, self.properties.step_timeout_seconds).until(
+            expected_conditions.any_of(
+                expected_conditions.visibility_of_element_located((By.NAME, "Passwd")),
+                expected_conditions.url_contains(self.RECAPTCHA_URL),
             )
-            self._handle_reCaptcha(driver)
-            time.sleep(3)
+        )
 
-        password_element = driver.find_element(By.NAME, "Passwd")
+    def _enter_password(self, driver: WebDriver, credential: LoginCredential) -> None:
+        password_element = WebDriverWait(driver, self.properties.step_timeout_seconds).until(
+            expected_conditions.element_to_be_clickable((By.NAME, "Passwd"))
+        )
         password_element.send_keys(credential.password)
         password_element.send_keys(Keys.RETURN)
-        time.sleep(5)
 
-        self._handle_redirect(driver)
+    def _wait_for_session_id(self, driver: WebDriver) -> RawToken:
+        logger.info(f"[REDIRECT] Waiting for redirect...")
+        WebDriverWait(driver, self.properties.redirect_timeout_seconds).until(
+            expected_conditions.url_contains(self.TIXCRAFT_URL)
+        )
+        logger.success(
+            f"[REDIRECT] Redirected to {self.TIXCRAFT_URL}, waiting for session cookie..."
+        )
+        WebDriverWait(driver, self.properties.step_timeout_seconds).until(
+            lambda _driver: _driver.get_cookie(self.SESSION_ID) is not None
+        )
+        return self._get_session_id_from_cookies(driver)
@@ -0,0 +1,257 @@
+import contextlib
+import datetime
+from enum import Enum
+import threading
+import time
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from py_spring_core import Properties
+from pydantic import BaseModel, Field, PositiveFloat
+
+from src.service.ticket_bot.commons import DriverKey
+
+if TYPE_CHECKING:
+    from src.service.ticket_bot.waiting_room import WaitingRoomStatus
+
+
+class PurchaseCancelledError(Exception):
+    """
+    Raised inside a running purchase once its control has been cancelled
+    """
+
+
+class PurchaseDeadlineExceededError(Exception):
+    """
+    Raised once the end-to-end deadline of a purchase has passed, nothing is retried
+    """
+
+
+class StageBudgetExceededError(Exception):
+    """
+    Raised when a stage ran out of its budget, the purchase may retry or move on
+    if the stage is one of RETRYABLE_STAGES
+    """
+
+    def __init__(self, stage: "PurchaseStage", budget_seconds: float) -> None:
+        super().__init__(f"Stage {stage.value} exceeded its budget of {budget_seconds} seconds")
+        self.stage = stage
+        self.budget_seconds = budget_seconds
+
+
+class PurchaseStage(str, Enum):
+    ACTIVITY_PAGE = "activity_page"
+    EVENT_PAGE = "event_page"
+    AVAILABILITY_POLLING = "availability_polling"
+    SEAT_SELECTION = "seat_selection"
+    PURCHASE_FORM = "purchase_form"
+    PAYMENT_METHOD = "payment_method"
+    DELIVERY_METHOD = "delivery_method"
+    CHECKOUT = "checkout"
+
+
+# the seats are not held yet, an overrun here may reload the event page and retry or fall through
+RETRYABLE_STAGES = frozenset({PurchaseStage.SEAT_SELECTION, PurchaseStage.PURCHASE_FORM})
+# the submitted form holds the seats, neither the deadline nor their budget stops these, the budget is only reported
+POST_SUBMIT_STAGES = frozenset({PurchaseStage.PAYMENT_METHOD, PurchaseStage.DELIVERY_METHOD, PurchaseStage.CHECKOUT})
+
+
+class CaptchaOutcome(str, Enum):
+    ACCEPTED = "accepted"
+    REJECTED = "rejected"
+    UNREADABLE = "unreadable"
+
+
+class StageBudgetProperties(Properties):
+    __key__: str = "stage_budget"
+    # counted from the moment tickets are available, an Event may override it
+    purchase_deadline_seconds: float = Field(default=600, gt=0)
+    max_target_retries: int = Field(default=1, ge=0)
+    # stages without a budget are only bound by the purchase deadline
+    stage_budget_seconds: dict[PurchaseStage, PositiveFloat] = Field(
+        default_factory=lambda: {
+            PurchaseStage.ACTIVITY_PAGE: 30,
+            PurchaseStage.EVENT_PAGE: 20,
+            PurchaseStage.SEAT_SELECTION: 30,
+            PurchaseStage.PURCHASE_FORM: 60,
+            PurchaseStage.PAYMENT_METHOD: 300,
+            PurchaseStage.DELIVERY_METHOD: 10,
+            PurchaseStage.CHECKOUT: 10,
+        }
+    )
+
+    def budget_for(self, stage: PurchaseStage) -> Optional[float]:
+        return self.stage_budget_seconds.get(stage)
+
+
+class StageRecord(BaseModel):
+    stage: PurchaseStage
+    started_at: datetime.datetime
+    elapsed_seconds: float
+    is_succeeded: bool
+    budget_seconds: Optional[float] = None
+    is_budget_exceeded: bool = False
+
+
+class PurchaseListener:
+    """
+    Receives progress signals of a purchase, override the hooks of interest
+    """
+
+    def on_stage_started(self, control: "PurchaseControl", stage: PurchaseStage) -> None: ...
+
+    def on_stage_finished(self, control: "PurchaseControl", record: StageRecord) -> None: ...
+
+    def on_captcha(self, control: "PurchaseControl", outcome: CaptchaOutcome) -> None: ...
+
+    def on_availability_poll(self, control: "PurchaseControl", event_key_word: str) -> None: ...
+
+    def on_waiting_room(self, control: "PurchaseControl", status: "WaitingRoomStatus") -> None: ...
+
+
+class PurchaseControl:
+    """
+    Handle shared between a running purchase and whoever scheduled it,
+    the purchase checks it between steps so it can be stopped cooperatively
+    and reports its progress to the attached listeners. It also carries the
+    purchase deadline and the budget of the running stage, waits take their
+    timeout from it and an exhausted budget stops the purchase at its next check.
+    Once a post-submit stage started the deadline is no longer enforced, the
+    seats are held and the order has to be completed rather than abandoned.
+    """
+
+    def __init__(
+        self, driver_key: str = DriverKey.TIXCRAFT, owner: Optional[str] = None
+    ) -> None:
+        self.driver_key = driver_key
+        self.owner = owner
+        self.cancel_event = threading.Event()
+        self.listeners: list[PurchaseListener] = []
+        # time.monotonic() based, None when unbounded
+        self.deadline: Optional[float] = None
+        self.stage_deadline: Optional[float] = None
+        self.current_stage: Optional[PurchaseStage] = None
+        self.stage_budget_seconds: Optional[float] = None
+        self.is_submitted = False
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def add_listener(self, listener: PurchaseListener) -> None:
+        self.listeners.append(listener)
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def start_deadline(self, seconds: float) -> None:
+        self.deadline = time.monotonic() + seconds
+
+    def remaining_seconds(self) -> Optional[float]:
+        purchase_deadline = None if self.is_submitted else self.deadline
+        deadlines = [deadline for deadline in [purchase_deadline, self.stage_deadline] if deadline is not None]
+        if len(deadlines) == 0:
+            return None
+        return min(deadlines) - time.monotonic()
+
+    def timeout_seconds(self, fallback_seconds: float) -> float:
+        """
+        Timeout for a wait inside the running stage, cut to what is left of its budget
+        """
+        remaining_seconds = self.remaining_seconds()
+        if remaining_seconds is None:
+            return fallback_seconds
+        return max(0.0, min(fallback_seconds, remaining_seconds))
+
+    def raise_if_cancelled(self) -> None:
+        if self.is_cancelled:
+            raise PurchaseCancelledError(f"Purchase on driver {self.driver_key} is cancelled")
+        self._raise_if_out_of_budget()
+
+    def _raise_if_out_of_budget(self) -> None:
+        now = time.monotonic()
+        if self.deadline is not None and not self.is_submitted and now >= self.deadline:
+            raise PurchaseDeadlineExceededError(f"Purchase on driver {self.driver_key} missed its deadline")
+        if (
+            self.stage_deadline is not None
+            and now >= self.stage_deadline
+            and self.current_stage is not None
+            and self.stage_budget_seconds is not None
+        ):
+            raise StageBudgetExceededError(self.current_stage, self.stage_budget_seconds)
+
+    @contextlib.contextmanager
+    def paused_budget(self) -> Iterator[None]:
+        # time spent in here (e.g. a waiting room) is not charged to the stage or the deadline
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            paused_seconds = time.monotonic() - start_time
+            if self.deadline is not None:
+                self.deadline += paused_seconds
+            if self.stage_deadline is not None:
+                self.stage_deadline += paused_seconds
+
+    def sleep(self, seconds: float) -> None:
+        # sleep that wakes up as soon as the purchase is cancelled
+        if self.cancel_event.wait(seconds):
+            self.raise_if_cancelled()
+
+    @contextlib.contextmanager
+    def stage(self, stage: PurchaseStage, budget_seconds: Optional[float] = None) -> Iterator[None]:
+        self.raise_if_cancelled()
+        for listener in self.listeners:
+            listener.on_stage_started(self, stage)
+        started_at = datetime.datetime.now()
+        start_time = time.perf_counter()
+        if stage in POST_SUBMIT_STAGES:
+            self.is_submitted = True
+        is_budget_enforced = budget_seconds is not None and not self.is_submitted
+        self.current_stage = stage
+        self.stage_budget_seconds = budget_seconds if is_budget_enforced else None
+        self.stage_deadline = time.monotonic() + budget_seconds if is_budget_enforced else None
+        is_succeeded = False
+        is_budget_exceeded = False
+        try:
+            yield
+            is_succeeded = True
+        except (PurchaseCancelledError, PurchaseDeadlineExceededError, StageBudgetExceededError) as error:
+            is_budget_exceeded = not isinstance(error, PurchaseCancelledError)
+            raise
+        except Exception as error:
+            # a wait that timed out on the budget surfaces as a budget error so it can be retried
+            remaining_seconds = self.remaining_seconds()
+            if self.is_cancelled or remaining_seconds is None or remaining_seconds > 0:
+                raise
+            is_budget_exceeded = True
+            self._raise_if_out_of_budget()
+            raise
+        finally:
+            elapsed_seconds = time.perf_counter() - start_time
+            if not is_budget_enforced and budget_seconds is not None:
+                is_budget_exceeded = elapsed_seconds > budget_seconds
+            record = StageRecord(
+                stage=stage,
+                started_at=started_at,
+                elapsed_seconds=elapsed_seconds,
+                is_succeeded=is_succeeded,
+                budget_seconds=budget_seconds,
+                is_budget_exceeded=is_budget_exceeded,
+            )
+            self.current_stage = None
+            self.stage_budget_seconds = None
+            self.stage_deadline = None
+            for listener in self.listeners:
+                listener.on_stage_finished(self, record)
+
+    def notify_captcha(self, outcome: CaptchaOutcome) -> None:
+        for listener in self.listeners:
+            listener.on_captcha(self, outcome)
+
+    def notify_availability_poll(self, event_key_word: str) -> None:
+        for listener in self.listeners:
+            listener.on_availability_poll(self, event_key_word)
+
+    def notify_waiting_room(self, status: "WaitingRoomStatus") -> None:
+        for listener in self.listeners:
+            listener.on_waiting_room(self, status)
@@ -0,0 +1,168 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from typing import Iterable, Optional
+
+from loguru import logger
+from py_spring_core import Component
+from selenium.common.exceptions import NoSuchElementException as SeleniumNoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from src.repository.common import LayoutPageType
+from src.repository.repository import LayoutCacheRepository
+from src.service.ticket_bot.commons import SelectorCacheProperties
+
+"""
+Locators are stored as "<strategy>:<value>", e.g. "id:TicketForm_ticketPrice_01",
+"name:TicketForm[ticketPrice][01]" or 'css:a[href="/ticket/ticket/24_xxx/123"]'
+"""
+
+LOCATOR_STRATEGIES = {"id": By.ID, "name": By.NAME, "css": By.CSS_SELECTOR}
+
+
+def css_string(value: str) -> str:
+    # quoted CSS string, only the quote and the backslash need escaping
+    escaped_value = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped_value}"'
+
+
+def locator_of(element: WebElement) -> Optional[str]:
+    element_id = element.get_dom_attribute("id")
+    if element_id:
+        return f"id:{element_id}"
+    # the literal attribute, get_attribute resolves it to an absolute URL an a[href=...] selector never matches
+    href = element.get_dom_attribute("href")
+    if href and not href.endswith("#"):
+        return f"css:a[href={css_string(href)}]"
+    name = element.get_dom_attribute("name")
+    if name:
+        return f"name:{name}"
+    return None
+
+
+class SelectorCache(Component):
+    """
+    Remembers the locators a full page discovery resolved, per event page and
+    page type, so later attempts on the same event go straight to the element.
+    Reads are served from memory, the layout_cache table keeps them across runs
+    and is read ahead (preload) and written on a background thread, off the
+    purchase's critical path.
+    """
+
+    properties: SelectorCacheProperties
+    layout_repo: LayoutCacheRepository
+
+    def __init__(self) -> None:
+        self.layouts: dict[tuple[str, LayoutPageType], dict[str, str]] = {}
+        self.lock = threading.Lock()
+        # one worker keeps the saves of a layout in order and runs the preloads
+        self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="selector-cache-worker")
+        # preloads not finished yet, by event key
+        self.pending_loads: dict[str, Future] = {}
+
+    def destroy(self) -> None:
+        self.worker.shutdown(wait=True)
+
+    def preload(self, event_keys: Iterable[str]) -> None:
+        """
+        Reads the layouts of event_keys on the worker and returns right away,
+        a lookup of a key still loading waits for that read instead of issuing its own
+        """
+        if not self.properties.is_enabled:
+            return
+        with self.lock:
+            for event_key in event_keys:
+                if event_key in self.pending_loads or all(
+                    (event_key, page_type) in self.layouts for page_type in LayoutPageType
+                ):
+                    continue
+                self.pending_loads[event_key] = self.worker.submit(self._load_layouts, event_key)
+
+    def get(self, event_key: str, page_type: LayoutPageType, key: str) -> Optional[str]:
+        if not self.properties.is_enabled:
+            return None
+        return self._get_layout(event_key, page_type).get(key)
+
+    def remember(self, event_key: str, page_type: LayoutPageType, key: str, value: Optional[str]) -> None:
+        if not self.properties.is_enabled or value is None:
+            return
+        layout = self._get_layout(event_key, page_type)
+        if layout.get(key) == value:
+            return
+        with self.lock:
+            layout[key] = value
+            locators = dict(layout)
+        self._save_layout(event_key, page_type, locators)
+
+    def forget(self, event_key: str, page_type: LayoutPageType, key: str) -> None:
+        layout = self._get_layout(event_key, page_type)
+        with self.lock:
+            if layout.pop(key, None) is None:
+                return
+            locators = dict(layout)
+        logger.warning(f"[SELECTOR CACHE] Dropping stale {page_type.value} locator: {key} of {event_key}")
+        self._save_layout(event_key, page_type, locators)
+
+    def find_element(
+        self, driver: WebDriver, event_key: str, page_type: LayoutPageType, key: str
+    ) -> Optional[WebElement]:
+        """
+        Looks the cached locator up with a single find_element call, None sends
+        the caller back to full discovery
+        """
+        optional_locator = self.get(event_key, page_type, key)
+        if optional_locator is None:
+            return None
+        strategy, _, value = optional_locator.partition(":")
+        if strategy not in LOCATOR_STRATEGIES:
+            self.forget(event_key, page_type, key)
+            return None
+        try:
+            element = driver.find_element(LOCATOR_STRATEGIES[strategy], value)
+        except SeleniumNoSuchElementException:
+            self.forget(event_key, page_type, key)
+            return None
+        logger.info(f"[SELECTOR CACHE] Hit {page_type.value} locator: {optional_locator}")
+        return element
+
+    def _load_layouts(self, event_key: str) -> None:
+        try:
+            for page_type in LayoutPageType:
+                self._read_layout(event_key, page_type)
+        finally:
+            with self.lock:
+                self.pending_loads.pop(event_key, None)
+
+    def _get_layout(self, event_key: str, page_type: LayoutPageType) -> dict[str, str]:
+        with self.lock:
+            if (event_key, page_type) in self.layouts:
+                return self.layouts[(event_key, page_type)]
+            optional_pending_load = self.pending_loads.get(event_key)
+        if optional_pending_load is not None:
+            optional_pending_load.result()
+        return self._read_layout(event_key, page_type)
+
+    def _read_layout(self, event_key: str, page_type: LayoutPageType) -> dict[str, str]:
+        with self.lock:
+            if (event_key, page_type) in self.layouts:
+                return self.layouts[(event_key, page_type)]
+        locators: dict[str, str] = {}
+        try:
+            optional_layout = self.layout_repo.get_layout(event_key, page_type)
+            if optional_layout is not None:
+                locators = optional_layout.locators
+        except Exception as error:
+            # the cache is an optimization, a database hiccup must not stop a purchase
+            logger.error(f"[SELECTOR CACHE] Failed to load layout of {event_key}: {error}")
+        with self.lock:
+            return self.layouts.setdefault((event_key, page_type), locators)
+
+    def _save_layout(self, event_key: str, page_type: LayoutPageType, locators: dict[str, str]) -> None:
+        self.worker.submit(self._write_layout, event_key, page_type, locators)
+
+    def _write_layout(self, event_key: str, page_type: LayoutPageType, locators: dict[str, str]) -> None:
+        try:
+            self.layout_repo.save_layout(event_key, page_type, locators)
+        except Exception as error:
+            logger.error(f"[SELECTOR CACHE] Failed to save layout of {event_key}: {error}")
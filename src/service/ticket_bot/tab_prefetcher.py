@@ -0,0 +1,135 @@
+import time
+from typing import Callable, Iterable, Optional
+
+from loguru import logger
+from pydantic import BaseModel, Field
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from src.commons import web_driver_utils
+from src.service.ticket_bot.commons import TabPrefetchProperties
+
+
+class PrefetchedTab(BaseModel):
+    url: str
+    handle: str
+    loaded_at: float = Field(default_factory=time.monotonic)
+
+
+class TabPrefetcher:
+    """
+    Keeps candidate pages loaded in background tabs of the purchasing session.
+    Tabs are opened with window.open so loading never blocks the polling loop,
+    and the purchase switches to a warm tab instead of navigating from scratch.
+    Memory is capped on the resident size of the whole Chrome process tree, as
+    read by read_rss_bytes, which is 0 (uncapped) for drivers on a remote grid.
+    Every tab it opens is closed by close, the driver outlives the purchase.
+    """
+
+    READY_ELEMENT_CLASS = "area-list"
+
+    def __init__(
+        self, driver: WebDriver, properties: TabPrefetchProperties, read_rss_bytes: Callable[[], int]
+    ) -> None:
+        self.driver = driver
+        self.properties = properties
+        self.read_rss_bytes = read_rss_bytes
+        self.main_handle = driver.current_window_handle
+        self.tabs: dict[str, PrefetchedTab] = {}
+        # the prefetched tab the purchase is currently on, no longer kept warm
+        self.active_handle: Optional[str] = None
+
+    def prefetch(self, urls: Iterable[str]) -> None:
+        for url in urls:
+            if url == "" or url in self.tabs:
+                continue
+            if len(self.tabs) >= self.properties.max_tabs:
+                return
+            rss_mb = self.read_rss_bytes() / 1024 / 1024
+            if rss_mb >= self.properties.max_rss_mb:
+                logger.warning(f"[TAB PREFETCH] Memory cap reached: {rss_mb:.0f} MB, skip {url}")
+                return
+            self._open_tab(url)
+
+    def refresh_stale_tabs(self) -> None:
+        stale_tabs = [
+            tab
+            for tab in self.tabs.values()
+            if time.monotonic() - tab.loaded_at > self.properties.refresh_interval_seconds
+        ]
+        if len(stale_tabs) == 0:
+            return
+        try:
+            for tab in stale_tabs:
+                self.driver.switch_to.window(tab.handle)
+                # reload without waiting for the load event, the tab warms up in the background
+                self.driver.execute_script("window.location.reload();")
+                tab.loaded_at = time.monotonic()
+        finally:
+            self.driver.switch_to.window(self.main_handle)
+
+    def activate(self, url: str) -> bool:
+        """
+        Switches the session to the prefetched tab of url, returns False if there is none
+        """
+        optional_tab = self.tabs.pop(url, None)
+        if optional_tab is None:
+            return False
+        logger.info(f"[TAB PREFETCH] Switching to prefetched tab: {url}")
+        if self.active_handle is not None:
+            # the previous target fell through, its tab is not needed anymore
+            self._close_handle(self.active_handle)
+        self.active_handle = optional_tab.handle
+        self.driver.switch_to.window(optional_tab.handle)
+        if not web_driver_utils.is_element_exists_by(self.driver, By.CLASS_NAME, self.READY_ELEMENT_CLASS):
+            # loaded before tickets opened, the page is warm but its content is outdated
+            self.driver.refresh()
+        return True
+
+    def close(self, is_keeping_current: bool = False) -> None:
+        """
+        Closes every tab opened by the prefetcher and switches back to the main tab,
+        or stays on the current tab when is_keeping_current (e.g. a purchase paying there)
+        """
+        handles = [tab.handle for tab in self.tabs.values()]
+        if self.active_handle is not None:
+            handles.append(self.active_handle)
+        self.tabs.clear()
+        self.active_handle = None
+        if len(handles) == 0:
+            return
+        try:
+            current_handle = self.driver.current_window_handle
+        except WebDriverException as error:
+            logger.warning(f"[TAB PREFETCH] Driver is gone, skip closing {len(handles)} tabs: {error}")
+            return
+        kept_handle = current_handle if is_keeping_current else self.main_handle
+        for handle in handles:
+            if handle != kept_handle:
+                self._close_handle(handle)
+        try:
+            self.driver.switch_to.window(kept_handle)
+            logger.info(f"[TAB PREFETCH] Closed prefetched tabs, remaining tabs: {len(self.driver.window_handles)}")
+        except WebDriverException as error:
+            logger.warning(f"[TAB PREFETCH] Failed to switch back to tab {kept_handle}: {error}")
+
+    def _close_handle(self, handle: str) -> None:
+        try:
+            self.driver.switch_to.window(handle)
+            self.driver.close()
+        except WebDriverException as error:
+            # already closed by the page itself or the session, nothing left to free
+            logger.warning(f"[TAB PREFETCH] Failed to close tab {handle}: {error}")
+
+    def _open_tab(self, url: str) -> None:
+        known_handles = set(self.driver.window_handles)
+        self.driver.execute_script("window.open(arguments[0], '_blank');", url)
+        new_handles = [handle for handle in self.driver.window_handles if handle not in known_handles]
+        if len(new_handles) == 0:
+            logger.error(f"[TAB PREFETCH] Failed to open tab: {url}")
+            return
+        self.tabs[url] = PrefetchedTab(url=url, handle=new_handles[0])
+        logger.info(f"[TAB PREFETCH] Prefetching {url} in tab {len(self.tabs)}/{self.properties.max_tabs}")
+        # window.open may move the focus on some drivers, keep polling on the main tab
+        self.driver.switch_to.window(self.main_handle)
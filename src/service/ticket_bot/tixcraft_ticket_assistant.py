@@ -1,29 +1,41 @@
+import functools
 import json
 import threading
 import time
-from typing import ClassVar, Optional
+from typing import ClassVar, ContextManager, Optional
 from loguru import logger
 from py_spring_core import Component
 from pydantic import BaseModel, ConfigDict, Field, computed_field
+from selenium.common.exceptions import NoSuchElementException as SeleniumNoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
 
 from src.commons.utils import timer
 from src.commons import web_driver_utils
-from src.commons.selenium_driver_service import (
-    SeleniumDriverService,
-    WebDriver,
-    By,
-    WebElement,
-)
-from src.commons.selenium_driver_service import (
-    SeleniumNoSuchElementException,
-)
+from src.commons.cdp_transport import CdpTransport
+from src.commons.selenium_driver_service import SeleniumDriverService
 from src.service.ticket_bot.google_login_handler import (
     GoogleLoginHandler,
 )
+from src.repository.common import LayoutPageType
 from src.repository.repository import LoginTokenRepository
-from src.service.ticket_bot.commons import DriverKey, LoginCredential
+from src.service.ticket_bot.commons import DriverKey, LoginCredential, TabPrefetchProperties
+from src.service.ticket_bot.purchase_control import (
+    CaptchaOutcome,
+    PurchaseCancelledError,
+    PurchaseControl,
+    PurchaseDeadlineExceededError,
+    PurchaseStage,
+    RETRYABLE_STAGES,
+    StageBudgetExceededError,
+    StageBudgetProperties,
+)
+from src.service.ticket_bot.selector_cache import SelectorCache, locator_of
+from src.service.ticket_bot.tab_prefetcher import TabPrefetcher
 from src.service.ticket_bot.word_similarity_calculator import WordSimilarityCalculator
 from src.service.ticket_bot.verification_code_decipher import VerificationCodeDecipher
+from src.service.ticket_bot.waiting_room import WaitingRoomGuard
 
 
 """
@@ -31,6 +43,17 @@ Cookie Signature:
 {"domain": "tixcraft.com", "httpOnly": true, "name": "SID", "path": "/", "sameSite": "None", "secure": true, "value": "xxx"}
 """
 
+class PurchaseTarget(BaseModel):
+    event_datetime: str
+    seat_key_word: str
+    number_of_tickets: int
+    # falls back to the event_key_word of the Event when omitted
+    event_key_word: Optional[str] = None
+
+    def as_view(self) -> str:
+        return f"{self.event_key_word} {self.event_datetime} {self.seat_key_word} x{self.number_of_tickets}"
+
+
 class Event(BaseModel):
     event_key_word: str
     seat_key_word: str
@@ -40,6 +63,32 @@ class Event(BaseModel):
 
     event_datetime: str
     exclude_key_words: list[str] = Field(default_factory=list)
+    # area-list pages known ahead of the sale, prefetched in background tabs when enabled
+    prefetch_urls: list[str] = Field(default_factory=list)
+    # tried in order once the first choice (the fields above) is not available
+    fallback_targets: list[PurchaseTarget] = Field(default_factory=list)
+    # overrides stage_budget.purchase_deadline_seconds
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+
+    def all_targets(self) -> list[PurchaseTarget]:
+        first_choice = PurchaseTarget(
+            event_datetime=self.event_datetime,
+            seat_key_word=self.seat_key_word,
+            number_of_tickets=self.number_of_tickets,
+            event_key_word=self.event_key_word,
+        )
+        return [first_choice] + [
+            target.model_copy(update={"event_key_word": target.event_key_word or self.event_key_word})
+            for target in self.fallback_targets
+        ]
+
+    def all_event_key_words(self) -> list[str]:
+        # first choice first, duplicates removed
+        key_words: list[str] = []
+        for target in self.all_targets():
+            if target.event_key_word is not None and target.event_key_word not in key_words:
+                key_words.append(target.event_key_word)
+        return key_words
 
     def as_view(self) -> str:
         return (
@@ -49,7 +98,8 @@ class Event(BaseModel):
             f"Delivery Methods: {', '.join(self.delivery_key_words)}\n"
             f"Payment Methods: {', '.join(self.payment_key_words)}\n"
             f"Event Date and Time: {self.event_datetime}\n"
-            f"Exclude Keywords: {', '.join(self.exclude_key_words)}"
+            f"Exclude Keywords: {', '.join(self.exclude_key_words)}\n"
+            f"Fallback Targets: {', '.join(target.as_view() for target in self.fallback_targets)}"
         )
 
 
@@ -70,6 +120,12 @@ class EventContext(BaseModel):
         return self.status in available_identifiers and self.url != ""
 
 
+class TargetCandidate(BaseModel):
+    target: PurchaseTarget
+    event_context: EventContext
+    window_handle: str
+
+
 class VerificationCode(BaseModel):
     code: str
 
@@ -84,6 +140,15 @@ class VerificationCode(BaseModel):
         return True
 
 
+# an open area reads e.g. "剩餘 10", "熱賣中" or "Available", only these mark it closed
+SOLD_OUT_SEAT_IDENTIFIERS = ["已售完", "sold out"]
+
+
+def is_seat_status_available(status: str) -> bool:
+    lowercase_status = status.lower()
+    return not any(_id in lowercase_status for _id in SOLD_OUT_SEAT_IDENTIFIERS)
+
+
 class SeatContext(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -94,23 +159,86 @@ class SeatContext(BaseModel):
     @computed_field
     @property
     def is_available(self) -> bool:
-        available_identifiers = ["available", "remaining", "熱賣中"]
-        lowercase_status = self.status.lower()
-        for _id in available_identifiers:
-            if _id in lowercase_status:
-                return True
-        return False
+        return is_seat_status_available(self.status)
+
+
+GAME_LIST_SCRIPT = """
+    const container = document.getElementById("gameList");
+    if (container === null) {
+        return null;
+    }
+    return Array.from(container.querySelectorAll("tr")).slice(1).map((row) => {
+        const button = row.querySelector("button");
+        return {
+            cells: Array.from(row.querySelectorAll("td")).map((cell) => cell.innerText.trim()),
+            url: button === null ? "" : (button.getAttribute("data-href") || ""),
+        };
+    });
+"""
+
+
+def parse_event_contexts(rows: list[dict]) -> list[EventContext]:
+    """
+    Turns the rows returned by GAME_LIST_SCRIPT into event contexts
+    """
+    contexts = []
+    for row in rows:
+        if len(row["cells"]) != 4:
+            continue
+        evne_datetime, event_name, destination, status = row["cells"]
+        event_context = EventContext(
+            event_datetime=evne_datetime,
+            event_name=event_name,
+            destination=destination,
+            status=status,
+            url=row["url"],
+        )
+        contexts.append(event_context)
+    return contexts
+
+
+def rank_targets(
+    event: Event,
+    snapshots: dict[str, list[EventContext]],
+    event_page_handles: dict[str, str],
+) -> list[TargetCandidate]:
+    """
+    Scores every target against the snapshot in one pass, keeping the
+    target order so the best available one comes first
+    """
+    candidates: list[TargetCandidate] = []
+    for target in event.all_targets():
+        key_word = target.event_key_word or event.event_key_word
+        for ctx in snapshots.get(key_word, []):
+            if not ctx.is_available:
+                continue
+            if target.event_datetime in ctx.event_datetime:
+                logger.info(f"[PURCHASE TICKET] Event: {ctx.event_name} is available for target: {target.as_view()}")
+                candidates.append(
+                    TargetCandidate(
+                        target=target,
+                        event_context=ctx,
+                        window_handle=event_page_handles[key_word],
+                    )
+                )
+                break
+    return candidates
 
 
 class TixcraftTicketAssistant(Component):
     EVENT_URL: ClassVar[str] = "https://tixcraft.com/activity"
     TICKET_ENTRY_BASE_URL: ClassVar[str] = "https://tixcraft.com/ticket/ticket"
     PURCHASE_BUTTON_TEXT_IDS: ClassVar[list[str]] = ["Buy Tickets", "立即購票"]
+    INCORRECT_CODE_ALERT: ClassVar[str] = "The verification code that you entered is incorrect. Please try again."
 
     driver_service: SeleniumDriverService
     token_repo: LoginTokenRepository
     google_login_handler: GoogleLoginHandler
     code_decipher: VerificationCodeDecipher
+    prefetch_properties: TabPrefetchProperties
+    waiting_room_guard: WaitingRoomGuard
+    budget_properties: StageBudgetProperties
+    selector_cache: SelectorCache
 
     def __create_cookie(self, token: str) -> dict[str, str | bool]:
         return {
@@ -128,10 +256,20 @@ class TixcraftTicketAssistant(Component):
         
 
     @timer
-    def purchase_ticket(self, credential: LoginCredential, event: Event) -> None:
+    def purchase_ticket(
+        self,
+        credential: LoginCredential,
+        event: Event,
+        control: Optional[PurchaseControl] = None,
+    ) -> bool:
+        if control is None:
+            control = PurchaseControl()
         logger.info(
             f"[PURCHASE TICKET] Start purchasing ticket for event:\n {event.as_view()}"
         )
+        driver: Optional[WebDriver] = None
+        optional_prefetcher: Optional[TabPrefetcher] = None
+        is_purchased = False
         try:
             logger.info(
                 f"[PURCHASE TICKET] Start purchasing ticket for event: {event.event_key_word}"
@@ -142,85 +280,209 @@ class TixcraftTicketAssistant(Component):
                 logger.error(
                     f"[PURCHASE TICKET] Token not found for email: {credential.email}"
                 )
-                return
+                return False
+            if not token_read.is_valid:
+                logger.error(
+                    f"[PURCHASE TICKET] Token for email: {credential.email} is marked invalid, re-login is required"
+                )
+                return False
 
-            driver = self.driver_service.get_driver(DriverKey.TIXCRAFT)
-            self._go_to_activities_page(driver)
-            tixcraft_cookie = self.__create_cookie(token_read.token)
-            self._load_token(driver, tixcraft_cookie)
-            is_found_entry_page = self._go_to_ticket_purchasing_enty_page(driver, event)
-            if not is_found_entry_page:
+            control.raise_if_cancelled()
+            driver = self.driver_service.get_driver(control.driver_key, owner=control.owner or credential.email)
+            with self._stage(control, PurchaseStage.ACTIVITY_PAGE):
+                self._go_to_activities_page(driver)
+                tixcraft_cookie = self.__create_cookie(token_read.sid_value)
+                self._load_token(driver, tixcraft_cookie, self.driver_service.get_transport(control.driver_key))
+            with self._stage(control, PurchaseStage.EVENT_PAGE):
+                event_page_handles = self._go_to_ticket_purchasing_enty_page(driver, event, control)
+            if len(event_page_handles) == 0:
                 logger.error("[PURCHASE TICKET] Event not found, skipping current purchase")
-                return
-            optional_event_context = (self._keep_click_buttton_purchase_ticket_until_ticket_is_available(event=event, driver=driver) )
-            if optional_event_context is None:
-                logger.error("[PURCHASE TICKET] Event not found")
-                return
-            logger.success(
-                f"[PURCHASE TICKET] Event: {optional_event_context.event_name} is available"
+                return False
+            optional_prefetcher = (
+                TabPrefetcher(
+                    driver,
+                    self.prefetch_properties,
+                    functools.partial(self.driver_service.get_rss_bytes, control.driver_key),
+                )
+                if self.prefetch_properties.is_enabled
+                else None
             )
+            with self._stage(control, PurchaseStage.AVAILABILITY_POLLING):
+                candidates = self._keep_click_buttton_purchase_ticket_until_ticket_is_available(
+                    event=event,
+                    driver=driver,
+                    control=control,
+                    event_page_handles=event_page_handles,
+                    prefetcher=optional_prefetcher,
+                )
+            if len(candidates) == 0:
+                logger.error("[PURCHASE TICKET] No target matches the available events")
+                return False
+            if optional_prefetcher is not None:
+                # area URLs only exist once the sale opens, warm the fallbacks while the first target is tried
+                optional_prefetcher.prefetch(candidate.event_context.url for candidate in candidates[1:])
             start_time = time.time()
-            self._select_seat(driver, optional_event_context, event)
-            self._fill_purchase_form(driver, event)
-            self._select_target_payment_method(driver, event)
-            self._select_target_delivery_method(driver, event)
-            self._click_checkout_button(driver)
-            end_time = time.time()
-            logger.success(f"[PURCHASE TICKET] Ticket is purchased, time spent: {end_time - start_time:.2f} seconds")
+            control.start_deadline(event.deadline_seconds or self.budget_properties.purchase_deadline_seconds)
+            max_attempts = self.budget_properties.max_target_retries + 1
+            for candidate in candidates:
+                logger.success(
+                    f"[PURCHASE TICKET] Trying target: {candidate.target.as_view()} on event: {candidate.event_context.event_name}"
+                )
+                for attempt in range(1, max_attempts + 1):
+                    try:
+                        is_purchased = self._purchase_target(
+                            driver, event, candidate, control, optional_prefetcher, is_reloading=attempt > 1
+                        )
+                    except StageBudgetExceededError as error:
+                        if error.stage not in RETRYABLE_STAGES:
+                            raise
+                        # retry right away on the same target from a freshly loaded event page
+                        logger.warning(f"[STAGE BUDGET] {error}, attempt {attempt}/{max_attempts}")
+                        continue
+                    if is_purchased:
+                        end_time = time.time()
+                        logger.success(f"[PURCHASE TICKET] Ticket is purchased, time spent: {end_time - start_time:.2f} seconds")
+                        return True
+                    break
+                logger.warning(f"[PURCHASE TICKET] Target: {candidate.target.as_view()} failed, falling through")
+            logger.error("[PURCHASE TICKET] Every available target is sold out or out of budget")
+            return False
+        except PurchaseCancelledError:
+            logger.warning(f"[PURCHASE TICKET] Purchase on driver {control.driver_key} is cancelled")
+            return False
+        except (PurchaseDeadlineExceededError, StageBudgetExceededError) as error:
+            logger.error(f"[PURCHASE TICKET] {error}")
+            return False
         except Exception as error:
-            web_driver_utils.capture_driver_state(driver, error)
+            if control.is_cancelled:
+                logger.warning(f"[PURCHASE TICKET] Purchase on driver {control.driver_key} is cancelled: {error}")
+                return False
+            if driver is not None:
+                web_driver_utils.capture_driver_state(driver, error)
+            else:
+                logger.error(f"[ERROR] {error}")
+            return False
+        finally:
+            if optional_prefetcher is not None:
+                # the driver is kept for payment or reused by the next job, do not leave its tabs open
+                optional_prefetcher.close(is_keeping_current=is_purchased or control.is_submitted)
+
+    def _stage(self, control: PurchaseControl, stage: PurchaseStage) -> ContextManager[None]:
+        return control.stage(stage, self.budget_properties.budget_for(stage))
+
+    def _purchase_target(
+        self,
+        driver: WebDriver,
+        event: Event,
+        candidate: TargetCandidate,
+        control: PurchaseControl,
+        prefetcher: Optional[TabPrefetcher] = None,
+        is_reloading: bool = False,
+    ) -> bool:
+        """
+        Runs seat selection through checkout for one target, returns False when its seats are sold out
+        """
+        transport = self.driver_service.get_transport(control.driver_key)
+        if transport.current_handle != candidate.window_handle:
+            transport.switch_to_window(candidate.window_handle)
+        with self._stage(control, PurchaseStage.SEAT_SELECTION):
+            is_seat_selected = self._select_seat(
+                driver, candidate.event_context, candidate.target, control, prefetcher, is_reloading
+            )
+        if not is_seat_selected:
+            return False
+        # layouts are learned per event page, shared by every target on it
+        layout_key = candidate.event_context.url
+        with self._stage(control, PurchaseStage.PURCHASE_FORM):
+            self._fill_purchase_form(driver, candidate.target.number_of_tickets, control, layout_key)
+        with self._stage(control, PurchaseStage.PAYMENT_METHOD):
+            self._select_target_payment_method(driver, event, control, layout_key)
+        with self._stage(control, PurchaseStage.DELIVERY_METHOD):
+            self._select_target_delivery_method(driver, event, control, layout_key)
+        with self._stage(control, PurchaseStage.CHECKOUT):
+            self._click_checkout_button(driver, control)
+        return True
 
-    def _select_ticket_quantity(self, driver: WebDriver, number_of_ticket: int) -> None:
+    def _select_ticket_quantity(self, driver: WebDriver, number_of_ticket: int, layout_key: str) -> None:
         logger.info(f"[PURCHASE TICKET] Selecting ticket quantity: {number_of_ticket}")
+        quantity_key = f"quantity:{number_of_ticket}"
+        optional_select_element = self.selector_cache.find_element(
+            driver, layout_key, LayoutPageType.TICKET_FORM, "quantity_select"
+        )
+        optional_value = self.selector_cache.get(layout_key, LayoutPageType.TICKET_FORM, quantity_key)
+        if optional_select_element is not None and optional_value is not None:
+            try:
+                web_driver_utils.select_by_value(optional_select_element, optional_value)
+                return
+            except SeleniumNoSuchElementException:
+                self.selector_cache.forget(layout_key, LayoutPageType.TICKET_FORM, quantity_key)
+
         select_element = driver.find_element(By.CLASS_NAME, "mobile-select")
         max_tickets = int(
             select_element.text.strip().split("\n")[-1]
         )  # ["1", "2", "3"] -> "3"
+        selected_text = str(number_of_ticket)
         if number_of_ticket > max_tickets:
             logger.warning(
                 f"[PURCHASE TICKET] Number of ticket is greater than max tickets: {number_of_ticket} > {max_tickets}, select max tickets"
             )
-            web_driver_utils.select_by_visible_text(select_element, str(max_tickets))
-            return
-        web_driver_utils.select_by_visible_text(select_element, str(number_of_ticket))
+            selected_text = str(max_tickets)
+        web_driver_utils.select_by_visible_text(select_element, selected_text)
+        self.selector_cache.remember(
+            layout_key, LayoutPageType.TICKET_FORM, "quantity_select", locator_of(select_element)
+        )
+        self.selector_cache.remember(
+            layout_key,
+            LayoutPageType.TICKET_FORM,
+            quantity_key,
+            web_driver_utils.selected_value(select_element),
+        )
 
     def _click_agree_cehckbox(self, driver: WebDriver) -> None:
         checkbox = driver.find_element(By.ID, "TicketForm_agree")
         checkbox.click()
 
-    def _fill_purchase_form(self, driver: WebDriver, event: Event) -> None:
-        potential_alert_erro = (
-            """The verification code that you entered is incorrect. Please try again."""
-        )
-        self._select_ticket_quantity(driver, event.number_of_tickets)
+    def _fill_purchase_form(
+        self, driver: WebDriver, number_of_tickets: int, control: PurchaseControl, layout_key: str
+    ) -> None:
+        self._select_ticket_quantity(driver, number_of_tickets, layout_key)
         self._click_agree_cehckbox(driver)
-        self._retry_passing_verification_codes(driver)
-        self._submit_purchase_form(driver)
+        self._retry_passing_verification_codes(driver, control)
+        self._submit_purchase_form(self.driver_service.get_transport(control.driver_key), control)
         optional_alert = web_driver_utils.alert_present_with_error(
-            driver, potential_alert_erro
+            driver, self.INCORRECT_CODE_ALERT
         )
         if optional_alert is not None:
             logger.error("[PURCHASE TICKET] Verification code is incorrect, retry...")
+            control.notify_captcha(CaptchaOutcome.REJECTED)
             optional_alert.accept()
             logger.info("[PURCHASE TICKET] Accepting alert...")
-            self._fill_purchase_form(driver, event)
+            control.raise_if_cancelled()
+            self._fill_purchase_form(driver, number_of_tickets, control, layout_key)
+            return
+        control.notify_captcha(CaptchaOutcome.ACCEPTED)
 
-    def _submit_purchase_form(self, driver: WebDriver) -> None:
+    def _submit_purchase_form(self, transport: CdpTransport, control: PurchaseControl) -> None:
         logger.info("[PURCHASE TICKET] Submitting purchase form")
-        submit_button = driver.find_element(By.CLASS_NAME, "btn-green")
-        submit_button.click()
-        time.sleep(0.5)
+        transport.click(".btn-green")
+        control.sleep(0.5)
 
-    def _retry_passing_verification_codes(self, driver: WebDriver) -> bool:
+    def _retry_passing_verification_codes(
+        self, driver: WebDriver, control: PurchaseControl
+    ) -> bool:
         while True:
-            image_binary = self._screen_shot_verification_code(driver)
+            control.raise_if_cancelled()
+            image_binary = self._screen_shot_verification_code(
+                self.driver_service.get_transport(control.driver_key)
+            )
             code = self.code_decipher.detect_verification_code(image_binary)
             logger.info(f"[VERIFICATION CODE] Detected code: {code}")
             verification_code = VerificationCode(code=code)
             if not verification_code.is_valid:
                 logger.error("[VERIFICATION CODE] Code is invalid")
+                control.notify_captcha(CaptchaOutcome.UNREADABLE)
                 self._get_verification_code_element(driver).click()
-                time.sleep(0.5)
+                control.sleep(0.5)
                 continue
             self._enter_verification_code(driver, code)
             break
@@ -233,20 +495,86 @@ class TixcraftTicketAssistant(Component):
         code_element = driver.find_element(By.ID, "TicketForm_verifyCode")
         code_element.send_keys(code)
 
-    def _screen_shot_verification_code(self, driver: WebDriver) -> bytes:
-        image_binary = self._get_verification_code_element(driver).screenshot_as_png
+    def _screen_shot_verification_code(self, transport: CdpTransport) -> bytes:
+        image_binary = transport.screenshot_as_png("#TicketForm_verifyCode-image")
         return image_binary
     def _select_seat(
-        self, driver: WebDriver, event_context: EventContext, event: Event
-    ) -> Optional[SeatContext]:
-        driver.get(event_context.url)
+        self,
+        driver: WebDriver,
+        event_context: EventContext,
+        target: PurchaseTarget,
+        control: PurchaseControl,
+        prefetcher: Optional[TabPrefetcher] = None,
+        is_reloading: bool = False,
+    ) -> bool:
+        """
+        Returns False when no available seat area matches the target, the page is
+        left as is so the next target on the same event can reuse it
+        """
+        transport = self.driver_service.get_transport(control.driver_key)
+        if not is_reloading and driver.current_url == event_context.url:
+            logger.info(f"[PURCHASE TICKET] Already on event page: {event_context.event_name}")
+        elif not is_reloading and prefetcher is not None and prefetcher.activate(event_context.url):
+            transport.sync_window()
+        else:
+            transport.get(event_context.url)
         logger.info(f"[PURCHASE TICKET] Go to event page: {event_context.event_name}")
+        self.waiting_room_guard.hold(driver, control)
         if self.TICKET_ENTRY_BASE_URL in driver.current_url:
             logger.info(
                 "[PURCHASE TICKET] Already in ticket entry page, skipping seat selection..."
             )
-            return
-        web_driver_utils.wait_until_element_is_visible(driver, 30, By.CLASS_NAME, "area-list")
+            return True
+        web_driver_utils.wait_until_element_is_visible(driver, control.timeout_seconds(30), By.CLASS_NAME, "area-list")
+        optional_seat_context = self._find_cached_seat(driver, event_context, target)
+        if optional_seat_context is None:
+            optional_seat_context = self._discover_seat(driver, target)
+        if optional_seat_context is None:
+            return False
+        self.selector_cache.remember(
+            event_context.url,
+            LayoutPageType.AREA_LIST,
+            target.seat_key_word,
+            locator_of(optional_seat_context.element),
+        )
+        logger.success(
+            f"[PURCHASE TICKET] Seat: {optional_seat_context.seat_name} is available"
+        )
+        web_driver_utils.browser_scroll_to_element(
+            driver, optional_seat_context.element
+        )
+        time.sleep(1)
+        optional_seat_context.element.click()
+        logger.success(
+            f"[PURCHASE TICKET] Seat: {optional_seat_context.seat_name} is selected, waiting for redirect to another page"
+        )
+        self.waiting_room_guard.hold(driver, control)
+        web_driver_utils.wait_until_element_is_visible(
+            driver, control.timeout_seconds(10), By.ID, "TicketForm_verifyCode-image"
+        )
+        return True
+
+    def _find_cached_seat(
+        self, driver: WebDriver, event_context: EventContext, target: PurchaseTarget
+    ) -> Optional[SeatContext]:
+        optional_element = self.selector_cache.find_element(
+            driver, event_context.url, LayoutPageType.AREA_LIST, target.seat_key_word
+        )
+        if optional_element is None:
+            return None
+        try:
+            status = optional_element.find_element(By.TAG_NAME, "font").text
+        except SeleniumNoSuchElementException:
+            self.selector_cache.forget(event_context.url, LayoutPageType.AREA_LIST, target.seat_key_word)
+            return None
+        context = SeatContext(seat_name=optional_element.text, status=status, element=optional_element)
+        if not context.is_available:
+            # sold out, another area may still match the key word
+            logger.warning(f"[PURCHASE TICKET] Cached seat: {context.seat_name} is not available")
+            return None
+        return context
+
+    def _discover_seat(self, driver: WebDriver, target: PurchaseTarget) -> Optional[SeatContext]:
         all_seats = driver.find_element(By.CLASS_NAME, "area-list").find_elements(
             By.TAG_NAME, "a"
         )
@@ -257,69 +585,93 @@ class TixcraftTicketAssistant(Component):
         for seat in all_seats:
             status = seat.find_element(By.TAG_NAME, "font").text
             context = SeatContext(seat_name=seat.text, status=status, element=seat)
-            contexts.append(context)
+            if context.is_available:
+                contexts.append(context)
 
         calculator = WordSimilarityCalculator(
-            event.seat_key_word, [context.seat_name for context in contexts]
+            target.seat_key_word, [context.seat_name for context in contexts]
         )
+        if len(calculator.similarity_map) == 0:
+            logger.error("[PURCHASE TICKET] No available seat left")
+            return None
         optional_seat_context = None
         candidate_word = calculator.highest_similarity()
+        if calculator.similarity_map[candidate_word] == 0:
+            logger.error(f"[PURCHASE TICKET] No available seat matches: {target.seat_key_word}")
+            return None
         for context in contexts:
             if context.seat_name == candidate_word:
                 optional_seat_context = context
         if optional_seat_context is None:
             logger.error("[PURCHASE TICKET] Seat not found")
-            return
-        logger.success(
-            f"[PURCHASE TICKET] Seat: {optional_seat_context.seat_name} is available"
-        )
-        web_driver_utils.browser_scroll_to_element(
-            driver, optional_seat_context.element
-        )
-        time.sleep(1)
-        optional_seat_context.element.click()
-        logger.success(
-            f"[PURCHASE TICKET] Seat: {optional_seat_context.seat_name} is selected, waiting for redirect to another page"
-        )
-        web_driver_utils.wait_until_element_is_visible(
-            driver, 10, By.ID, "TicketForm_verifyCode-image"
-        )
+        return optional_seat_context
+
     def _keep_click_buttton_purchase_ticket_until_ticket_is_available(
-        self, driver: WebDriver, event: Event
-    ) -> Optional[EventContext]:
+        self,
+        driver: WebDriver,
+        event: Event,
+        control: PurchaseControl,
+        event_page_handles: dict[str, str],
+        prefetcher: Optional[TabPrefetcher] = None,
+    ) -> list[TargetCandidate]:
         # 持續點擊立即購票直到可以購票為止, 須小心對server短時間一直狂發request
+        primary_handle = next(iter(event_page_handles.values()))
+        transport = self.driver_service.get_transport(control.driver_key)
+        transport.sync_window()
         while True:
+            control.raise_if_cancelled()
             logger.info(
                 "[PURCHASE TICKET] Keep clicking purchase button until ticket is available"
             )
-
-            purchase_button = driver.find_element(By.CLASS_NAME, "buy")
-            web_driver_utils.browser_scroll_to_element(driver, purchase_button)
-            is_found_purchase_button = False
-            for _id in self.PURCHASE_BUTTON_TEXT_IDS:
-                if _id in purchase_button.text:
-                    is_found_purchase_button = True
-                    purchase_button.click()
-                    time.sleep(1)
-                    break
-            if not is_found_purchase_button:
-                raise ValueError(
-                    f"Button text is not in {self.PURCHASE_BUTTON_TEXT_IDS}"
-                )
-            purchase_button.click()
-            time.sleep(1.5)
-            contexts = self._get_all_event_context_from_page(driver)
-            if self._is_ticket_can_be_ordered(contexts):
+            # one #gameList snapshot per event page per cycle
+            snapshots: dict[str, list[EventContext]] = {}
+            for key_word, handle in event_page_handles.items():
+                if transport.current_handle != handle:
+                    transport.switch_to_window(handle)
+                snapshots[key_word] = self._poll_event_page(driver, key_word, control)
+            if transport.current_handle != primary_handle:
+                transport.switch_to_window(primary_handle)
+
+            all_contexts = [ctx for contexts in snapshots.values() for ctx in contexts]
+            # cached layouts are read on the selector cache worker while the seat page loads
+            self.selector_cache.preload(ctx.url for ctx in all_contexts if ctx.url != "")
+            if self._is_ticket_can_be_ordered(all_contexts):
                 # 等待購買按鈕可以按為止 (可防止下面日期抓不到的問題)
                 break
+            if prefetcher is not None:
+                # only the URLs known ahead of the sale can be warmed while waiting for it to open
+                prefetcher.prefetch(event.prefetch_urls)
+                prefetcher.refresh_stale_tabs()
         logger.success("[PURCHASE TICKET] Ticket is available")
+        return rank_targets(event, snapshots, event_page_handles)
 
-        for ctx in contexts:
-            if not ctx.is_available:
-                continue
-            logger.info(f"[PURCHASE TICKET] Event: {ctx.event_name} is available")
-            if event.event_datetime in ctx.event_datetime:
-                return ctx
+    def _poll_event_page(
+        self, driver: WebDriver, event_key_word: str, control: PurchaseControl
+    ) -> list[EventContext]:
+        # a queue page has no purchase button, wait in place rather than reloading
+        self.waiting_room_guard.hold(driver, control)
+        try:
+            purchase_button = driver.find_element(By.CLASS_NAME, "buy")
+        except SeleniumNoSuchElementException:
+            # a secondary event page may still be loading in its tab
+            logger.warning(f"[PURCHASE TICKET] Purchase button not found for event: {event_key_word}")
+            return []
+        web_driver_utils.browser_scroll_to_element(driver, purchase_button)
+        is_found_purchase_button = False
+        for _id in self.PURCHASE_BUTTON_TEXT_IDS:
+            if _id in purchase_button.text:
+                is_found_purchase_button = True
+                purchase_button.click()
+                control.sleep(1)
+                break
+        if not is_found_purchase_button:
+            raise ValueError(
+                f"Button text is not in {self.PURCHASE_BUTTON_TEXT_IDS}"
+            )
+        purchase_button.click()
+        control.notify_availability_poll(event_key_word)
+        control.sleep(1.5)
+        return self._get_all_event_context_from_page(self.driver_service.get_transport(control.driver_key))
 
     def _is_ticket_can_be_ordered(self, contexts: list[EventContext]) -> bool:
         for context in contexts:
@@ -327,47 +679,26 @@ class TixcraftTicketAssistant(Component):
                 return True
         return False
 
-    def _get_all_event_context_from_page(self, driver: WebDriver) -> list[EventContext]:
-        try:
-            event_context_container = driver.find_element("id", "gameList")
-            event_rows = event_context_container.find_elements(By.TAG_NAME, "tr")
-            contexts = []
-            for row in event_rows[1:]:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                evne_datetime, event_name, destination, status = cells
-                url = status.find_element(By.TAG_NAME, "button").get_attribute(
-                    "data-href"
-                )
-                event_context = EventContext(
-                    event_datetime=evne_datetime.text,
-                    event_name=event_name.text,
-                    destination=destination.text,
-                    status=status.text,
-                    url=url or "",
-                )
-                contexts.append(event_context)
-            return contexts
-        except SeleniumNoSuchElementException:
+    def _get_all_event_context_from_page(self, transport: CdpTransport) -> list[EventContext]:
+        # read the whole table in a single round trip instead of one call per cell
+        optional_rows = transport.execute_script(GAME_LIST_SCRIPT)
+        if optional_rows is None:
             logger.error("[EVENT CONTEXT] Event context not found")
             return []
+        return parse_event_contexts(optional_rows)
 
-    def _go_to_ticket_purchasing_enty_page(
-        self, driver: WebDriver, event: Event
-    ) -> bool:
-        logger.info(f"[EVENT PAGE] Go to event entry page: {event.event_key_word}")
-        all_anchor_tags:dict[str, WebElement] = {
-            tag.text: tag 
-            for tag in driver.find_element(By.ID, "all").find_elements(By.TAG_NAME, "a") 
-        }
+    def _find_event_url(
+        self, all_anchor_tags: dict[str, WebElement], event_key_word: str, exclude_key_words: list[str]
+    ) -> Optional[str]:
         target_events: dict[str, WebElement] = {}
         
         for tag_text, tag in all_anchor_tags.items():
-            if event.event_key_word in tag_text:
+            if event_key_word in tag_text:
                 target_events[tag_text] = tag
 
         popped_tags: set[str] = set()
         for tag_text in target_events.keys():
-            for excluded_keyword in event.exclude_key_words:
+            for excluded_keyword in exclude_key_words:
                 if excluded_keyword in tag_text:
                     popped_tags.add(tag_text)
                     break
@@ -375,18 +706,58 @@ class TixcraftTicketAssistant(Component):
             target_events.pop(tag_text)
 
         if len(target_events.keys()) == 0:
-            logger.error(f"[EVENT NOT FOUND] Event {event.event_key_word} not found")
-            return False
+            logger.error(f"[EVENT NOT FOUND] Event {event_key_word} not found")
+            return
         target_event_url = list(target_events.values()).pop().get_attribute("href")
         if target_event_url is None:
-            raise Exception(f"[EVENT URL NOT FOUND] Event {event.event_key_word} url not found")
-        driver.get(target_event_url)
+            raise Exception(f"[EVENT URL NOT FOUND] Event {event_key_word} url not found")
+        return target_event_url
+
+    def _go_to_ticket_purchasing_enty_page(
+        self, driver: WebDriver, event: Event, control: PurchaseControl
+    ) -> dict[str, str]:
+        """
+        Opens the page of every event key word, the first choice in the current tab
+        and the others in their own tabs, returns the window handle per key word
+        """
+        logger.info(f"[EVENT PAGE] Go to event entry page: {event.event_key_word}")
+        all_anchor_tags:dict[str, WebElement] = {
+            tag.text: tag 
+            for tag in driver.find_element(By.ID, "all").find_elements(By.TAG_NAME, "a") 
+        }
+        event_urls: dict[str, str] = {}
+        for key_word in event.all_event_key_words():
+            optional_url = self._find_event_url(all_anchor_tags, key_word, event.exclude_key_words)
+            if optional_url is not None:
+                event_urls[key_word] = optional_url
+        if event.event_key_word not in event_urls:
+            return {}
+
+        event_page_handles: dict[str, str] = {}
+        for key_word, url in event_urls.items():
+            if key_word == event.event_key_word:
+                continue
+            known_handles = set(driver.window_handles)
+            driver.execute_script("window.open(arguments[0], '_blank');", url)
+            new_handles = [handle for handle in driver.window_handles if handle not in known_handles]
+            if len(new_handles) != 0:
+                logger.info(f"[EVENT PAGE] Open fallback event page in tab: {key_word}")
+                event_page_handles[key_word] = new_handles[0]
+
+        primary_handle = driver.current_window_handle
+        for handle in driver.window_handles:
+            if handle not in event_page_handles.values():
+                primary_handle = handle
+                break
+        driver.switch_to.window(primary_handle)
+        driver.get(event_urls[event.event_key_word])
         logger.info(f"[EVENT PAGE] Go to event page: {event.event_key_word}")
+        self.waiting_room_guard.hold(driver, control)
         # 等待立即購票按鈕出現
         web_driver_utils.wait_until_element_is_visible(
-            driver, 10, By.CLASS_NAME, "buy"
+            driver, control.timeout_seconds(10), By.CLASS_NAME, "buy"
         )
-        return True
+        return {event.event_key_word: primary_handle, **event_page_handles}
         
 
     def _go_to_activities_page(self, driver: WebDriver) -> None:
@@ -406,22 +777,53 @@ class TixcraftTicketAssistant(Component):
                 return
             time.sleep(2)
 
-    def _load_token(self, driver: WebDriver, injected_cookie: dict[str, str | bool]) -> None:
+    def _load_token(
+        self, driver: WebDriver, injected_cookie: dict[str, str | bool], transport: CdpTransport
+    ) -> None:
         logger.info("[COOKIE] Loading token...")
-        for cookie in driver.get_cookies():
+        for cookie in transport.get_cookies():
             if cookie["name"] != injected_cookie["name"]:
                 continue
             logger.info(f"[COOKIE] {cookie}")
             cookie["value"] = injected_cookie["value"]
             driver.delete_cookie(cookie["name"])
-            driver.add_cookie(cookie)
+            transport.add_cookie(cookie)
         driver.refresh()
 
-    def _select_target_delivery_method(self, driver: WebDriver, event: Event) -> None:
+    def _method_input_locator(self, label_element: WebElement) -> Optional[str]:
+        try:
+            return locator_of(label_element.find_element(By.TAG_NAME, "input"))
+        except SeleniumNoSuchElementException:
+            return None
+
+    def _click_cached_input(
+        self, element: WebElement, layout_key: str, page_type: LayoutPageType, cache_key: str
+    ) -> bool:
+        try:
+            element.click()
+        except Exception as error:
+            # e.g. a restyled radio that is no longer interactable, rediscover through the labels
+            logger.warning(f"[SELECTOR CACHE] Cached input is not clickable: {error}")
+            self.selector_cache.forget(layout_key, page_type, cache_key)
+            return False
+        return True
+
+    def _select_target_delivery_method(
+        self, driver: WebDriver, event: Event, control: PurchaseControl, layout_key: str
+    ) -> None:
         logger.info("[DELIVERY METHOD] Selecting delivery method...")
         web_driver_utils.wait_until_element_is_visible(
-            driver, 10, By.CLASS_NAME, "pay-column"
+            driver, control.timeout_seconds(10), By.CLASS_NAME, "pay-column"
         )  # 等待下方取票方式出現
+        cache_key = ",".join(event.delivery_key_words)
+        optional_input = self.selector_cache.find_element(
+            driver, layout_key, LayoutPageType.DELIVERY_METHOD, cache_key
+        )
+        if optional_input is not None and self._click_cached_input(
+            optional_input, layout_key, LayoutPageType.DELIVERY_METHOD, cache_key
+        ):
+            logger.info("[DELIVERY METHOD] Selecting cached delivery method")
+            return
         delivery_method_label_elements = driver.find_element(
             By.ID, "shipmentList"
         ).find_elements("tag name", "label")
@@ -432,12 +834,29 @@ class TixcraftTicketAssistant(Component):
                     logger.info(
                         f"[DELIVERY METHOD] Selecting delivery method: {keyword}"
                     )
+                    self.selector_cache.remember(
+                        layout_key, LayoutPageType.DELIVERY_METHOD, cache_key, self._method_input_locator(element)
+                    )
                     return
 
-    def _select_target_payment_method(self, driver: WebDriver, event: Event) -> None:
+    def _select_target_payment_method(
+        self, driver: WebDriver, event: Event, control: PurchaseControl, layout_key: str
+    ) -> None:
         logger.info("[PAYMENT METHOD] Waiting for payment method to appear...")
-        web_driver_utils.wait_until_element_is_visible(driver, 300, By.ID, "paymentBox")
+        web_driver_utils.wait_until_element_is_visible(
+            driver, control.timeout_seconds(300), By.ID, "paymentBox"
+        )
         logger.info("[PAYMENT METHOD] Selecting payment method...")
+        cache_key = ",".join(event.payment_key_words)
+        optional_input = self.selector_cache.find_element(
+            driver, layout_key, LayoutPageType.PAYMENT_METHOD, cache_key
+        )
+        if optional_input is not None and self._click_cached_input(
+            optional_input, layout_key, LayoutPageType.PAYMENT_METHOD, cache_key
+        ):
+            logger.info("[PAYMENT METHOD] Selecting cached payment method")
+            web_driver_utils.browser_scroll_to_element(driver, optional_input)
+            return
         payment_method_label_elements = driver.find_element(
             By.ID, "paymentBox"
         ).find_elements(By.TAG_NAME, "label")
@@ -448,15 +867,16 @@ class TixcraftTicketAssistant(Component):
                     time.sleep(0.5)
                     logger.info(f"[PAYMENT METHOD] Selecting payment method: {keyword}")
                     web_driver_utils.browser_scroll_to_element(driver, element)
+                    self.selector_cache.remember(
+                        layout_key, LayoutPageType.PAYMENT_METHOD, cache_key, self._method_input_locator(element)
+                    )
                     return
 
-    def _click_checkout_button(self, driver: WebDriver) -> None:
+    def _click_checkout_button(self, driver: WebDriver, control: PurchaseControl) -> None:
         logger.info("[CHECKOUT BUTTON] Waiting for checkout button to appear...")
         web_driver_utils.wait_until_element_is_visible(
-            driver, 10, By.ID, "submitButton"
+            driver, control.timeout_seconds(10), By.ID, "submitButton"
         )
         logger.info("[CHECKOUT BUTTON] Clicking checkout button")
-        logger.info("[CHECKOUT BUTTON] Waiting for 0.5 seconds for scrolling...")
-        checkout_button = driver.find_element(By.ID, "submitButton")
-        web_driver_utils.browser_scroll_to_element(driver, checkout_button)
-        checkout_button.click()
+        # scrolls the button into view before clicking, over CDP when enabled
+        self.driver_service.get_transport(control.driver_key).click("#submitButton")
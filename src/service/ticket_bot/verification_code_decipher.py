@@ -1,13 +1,32 @@
 from py_spring_core import Component, BeanCollection
-from typing import cast
-from ddddocr import DdddOcr
+from typing import TYPE_CHECKING, cast
+
+from src.commons.lazy import Lazy
+
+if TYPE_CHECKING:
+    from ddddocr import DdddOcr
+
+
+def _create_ocr_engine() -> "DdddOcr":
+    # ddddocr pulls in onnxruntime and loads its model, only pay for it on first captcha
+    from ddddocr import DdddOcr
+
+    return DdddOcr()
+
+
+class LazyOcrEngine(Lazy["DdddOcr"]): ...
+
 
 class VerificationCodeDecipherBeanCollection(BeanCollection):
     @classmethod
-    def create_engine(cls) -> DdddOcr:
-        return DdddOcr()
+    def create_engine(cls) -> LazyOcrEngine:
+        return LazyOcrEngine("DdddOcr", _create_ocr_engine)
 
 class VerificationCodeDecipher(Component):
-    engine: DdddOcr
+    engine: LazyOcrEngine
+
+    def warm_up(self) -> None:
+        self.engine.get()
+
     def detect_verification_code(self, img_bytes: bytes) -> str:
-        return cast(str, self.engine.classification(img_bytes))
+        return cast(str, self.engine.get().classification(img_bytes))
@@ -0,0 +1,157 @@
+import re
+import time
+from typing import Optional
+
+from loguru import logger
+from py_spring_core import Component
+from pydantic import BaseModel
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from src.service.ticket_bot.commons import WaitingRoomProperties
+from src.service.ticket_bot.purchase_control import PurchaseControl
+
+
+class WaitingRoomTimeoutError(Exception):
+    """
+    Raised when the waiting room does not release the session within max_wait_seconds
+    """
+
+
+class WaitingRoomStatus(BaseModel):
+    url: str
+    is_queued: bool
+    position: Optional[int] = None
+    estimated_wait_seconds: Optional[int] = None
+    waited_seconds: float = 0
+
+
+WAIT_UNIT_PATTERN = re.compile(
+    r"(\d+)\s*(小時|時|hours?|hrs?|h|分鐘|分|minutes?|mins?|m|秒|seconds?|secs?|s)(?![a-z])", re.IGNORECASE
+)
+
+
+def parse_position(raw_text: str) -> Optional[int]:
+    """
+    Reads the first number, so "12 / 300" is position 12 and "1,234" is 1234
+    """
+    optional_number = re.search(r"\d[\d,]*", raw_text)
+    return int(optional_number.group().replace(",", "")) if optional_number is not None else None
+
+
+def _unit_seconds(unit: str) -> int:
+    lowered_unit = unit.lower()
+    if unit in ("小時", "時") or lowered_unit.startswith("h"):
+        return 3600
+    if unit in ("分鐘", "分") or lowered_unit.startswith("m"):
+        return 60
+    return 1
+
+
+def parse_wait_seconds(raw_text: str) -> Optional[int]:
+    """
+    Reads "12 分鐘", "1 小時 30 分", "1:05:00", "3 min" or "45 seconds" style estimates
+    """
+    clock = re.search(r"(\d+):(\d{2})(?::(\d{2}))?", raw_text)
+    if clock is not None:
+        parts = [int(part) for part in clock.groups() if part is not None]
+        # two parts read as mm:ss, three as hh:mm:ss
+        seconds = 0
+        for part in parts:
+            seconds = seconds * 60 + part
+        return seconds
+    unit_matches = WAIT_UNIT_PATTERN.findall(raw_text)
+    if len(unit_matches) > 0:
+        return sum(int(number) * _unit_seconds(unit) for number, unit in unit_matches)
+    # a bare number is read as seconds
+    optional_number = re.search(r"\d+", raw_text)
+    return int(optional_number.group()) if optional_number is not None else None
+
+
+class WaitingRoomGuard(Component):
+    """
+    Recognizes queue and interstitial pages and holds the session's place in them.
+    The page is never reloaded, every check is one script call reading the
+    markers, and the queue's own redirect hands the session back to the purchase.
+    """
+
+    properties: WaitingRoomProperties
+
+    STATUS_SCRIPT = """
+        const [hostMarkers, elementSelectors, positionSelectors, waitSelectors] = arguments;
+        const readFirst = (selectors) => {
+            for (const selector of selectors) {
+                const element = document.querySelector(selector);
+                if (element !== null && element.innerText.trim() !== "") {
+                    return element.innerText.trim();
+                }
+            }
+            return "";
+        };
+        const href = window.location.href;
+        const hostname = window.location.hostname.toLowerCase();
+        const isQueued = hostMarkers.some((marker) => hostname === marker || hostname.endsWith(`.${marker}`))
+            || elementSelectors.some((selector) => document.querySelector(selector) !== null);
+        return {
+            url: href,
+            is_queued: isQueued,
+            position_text: isQueued ? readFirst(positionSelectors) : "",
+            wait_text: isQueued ? readFirst(waitSelectors) : "",
+        };
+    """
+
+    def read_status(self, driver: WebDriver) -> WaitingRoomStatus:
+        raw_status = driver.execute_script(
+            self.STATUS_SCRIPT,
+            self.properties.host_markers,
+            self.properties.element_selectors,
+            self.properties.position_selectors,
+            self.properties.wait_selectors,
+        )
+        return WaitingRoomStatus(
+            url=raw_status["url"],
+            is_queued=raw_status["is_queued"],
+            position=parse_position(raw_status["position_text"]),
+            estimated_wait_seconds=parse_wait_seconds(raw_status["wait_text"]),
+        )
+
+    def hold(self, driver: WebDriver, control: PurchaseControl) -> Optional[WaitingRoomStatus]:
+        """
+        Returns immediately outside a waiting room, otherwise blocks until released
+        and returns the last queued status
+        """
+        if not self.properties.is_enabled:
+            return None
+        status = self.read_status(driver)
+        if not status.is_queued:
+            return None
+        logger.warning(f"[WAITING ROOM] Queued at: {status.url}, holding position")
+        with control.paused_budget():
+            return self._wait_for_release(driver, control, status)
+
+    def _wait_for_release(
+        self, driver: WebDriver, control: PurchaseControl, status: WaitingRoomStatus
+    ) -> WaitingRoomStatus:
+        start_time = time.monotonic()
+        reported_at = 0.0
+        last_status = status
+        while status.is_queued:
+            last_status = status
+            status.waited_seconds = time.monotonic() - start_time
+            if time.monotonic() - reported_at >= self.properties.report_interval_seconds:
+                # throttled, a long hold must not push every other event out of the job's event log
+                control.notify_waiting_room(status)
+                logger.info(
+                    f"[WAITING ROOM] Position: {status.position}, estimated wait: {status.estimated_wait_seconds} seconds, waited: {status.waited_seconds:.0f} seconds"
+                )
+                reported_at = time.monotonic()
+            if status.waited_seconds >= self.properties.max_wait_seconds:
+                raise WaitingRoomTimeoutError(
+                    f"Still queued after {self.properties.max_wait_seconds} seconds at {status.url}"
+                )
+            control.sleep(self.properties.check_interval_seconds)
+            status = self.read_status(driver)
+        last_status.waited_seconds = time.monotonic() - start_time
+        logger.success(
+            f"[WAITING ROOM] Released to: {status.url} after {last_status.waited_seconds:.0f} seconds"
+        )
+        return last_status
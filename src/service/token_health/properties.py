@@ -0,0 +1,9 @@
+from py_spring_core import Properties
+from pydantic import Field
+
+
+class TokenHealthProperties(Properties):
+    __key__: str = "token_health"
+    max_concurrency: int = Field(default=50, gt=0)
+    max_connections: int = Field(default=100, gt=0)
+    timeout_seconds: float = Field(default=5, gt=0)
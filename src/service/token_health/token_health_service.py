@@ -0,0 +1,213 @@
+import asyncio
+from collections import OrderedDict
+import datetime
+from enum import Enum
+import json
+import threading
+from typing import Iterable, Optional
+
+import httpx
+from loguru import logger
+from py_spring_core import Component
+from pydantic import BaseModel, Field
+
+from src.repository.common import LoginTokenRead, TixcraftApiSource
+from src.repository.models import LoginToken
+from src.repository.repository import LoginTokenRepository
+from src.service.ticket_bot.commons import LoginCredential
+from src.service.ticket_bot.google_login_farm import GoogleLoginFarm, LoginStatus
+from src.service.token_health.properties import TokenHealthProperties
+
+
+class TokenStatus(str, Enum):
+    VALID = "valid"
+    INVALID = "invalid"
+    EXPIRED = "expired"
+    ERROR = "error"
+
+
+class TokenHealthRead(BaseModel):
+    email: str
+    status: TokenStatus
+    checked_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+class TokenRecord(BaseModel):
+    """
+    Portable form of a token used by bulk import and export
+    """
+
+    email: str
+    token: str
+    expired_at: datetime.datetime
+
+
+class TokenHealthService(Component):
+    """
+    Checks stored SIDs against tixcraft concurrently over pooled connections,
+    marks rejected tokens invalid and queues their accounts for re-login
+    """
+
+    LOGIN_PATH_IDENTIFIER = "login"
+
+    properties: TokenHealthProperties
+    tixcraft_api_source: TixcraftApiSource
+    token_repo: LoginTokenRepository
+    login_farm: GoogleLoginFarm
+
+    def __init__(self) -> None:
+        # ordered set of emails waiting for a re-login
+        self.relogin_queue: OrderedDict[str, None] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check_tokens(self, emails: Optional[Iterable[str]] = None) -> list[TokenHealthRead]:
+        if emails is None:
+            tokens = self.token_repo.get_all_tokens()
+        else:
+            tokens = list(self.token_repo.get_tokens_by_emails(emails).values())
+        logger.info(f"[TOKEN HEALTH] Checking {len(tokens)} tokens")
+        results = asyncio.run(self._check_tokens(tokens))
+        validities: list[tuple[LoginTokenRead, bool]] = []
+        for token, result in zip(tokens, results):
+            optional_validity = self._apply_result(token, result)
+            if optional_validity is not None:
+                validities.append((token, optional_validity))
+        self.token_repo.mark_tokens_validity(validities)
+        return results
+
+    def queue_relogin(self, email: str) -> None:
+        with self.lock:
+            self.relogin_queue[email] = None
+
+    def get_relogin_queue(self) -> list[str]:
+        with self.lock:
+            return list(self.relogin_queue.keys())
+
+    def pop_relogin_emails(self, limit: Optional[int] = None) -> list[str]:
+        with self.lock:
+            emails = list(self.relogin_queue.keys())[:limit]
+            for email in emails:
+                self.relogin_queue.pop(email)
+        return emails
+
+    def process_relogin_queue(self, credentials: Iterable[LoginCredential]) -> list[str]:
+        """
+        Logs in again every queued account a credential is given for,
+        returns the emails that are still waiting afterwards
+        """
+        credential_by_email = {credential.email: credential for credential in credentials}
+        queued_credentials = [
+            credential_by_email[email]
+            for email in self.get_relogin_queue()
+            if email in credential_by_email
+        ]
+        for result in self.login_farm.login_all(queued_credentials):
+            if result.status != LoginStatus.LOGGED_IN:
+                continue
+            with self.lock:
+                self.relogin_queue.pop(result.email, None)
+        return self.get_relogin_queue()
+
+    def export_tokens(self) -> list[TokenRecord]:
+        return [
+            TokenRecord(email=token.email, token=token.token, expired_at=token.expired_at)
+            for token in self.token_repo.get_all_tokens()
+            if token.is_valid
+        ]
+
+    def import_tokens(self, records: Iterable[TokenRecord]) -> int:
+        saved_tokens = self.token_repo.save_tokens(
+            LoginToken(token=record.token, email=record.email, expired_at=record.expired_at)
+            for record in records
+        )
+        with self.lock:
+            for token in saved_tokens:
+                self.relogin_queue.pop(token.email, None)
+        imported_count = len(saved_tokens)
+        logger.info(f"[TOKEN IMPORT] Imported {imported_count} tokens")
+        return imported_count
+
+    async def _check_tokens(self, tokens: list[LoginTokenRead]) -> list[TokenHealthRead]:
+        semaphore = asyncio.Semaphore(self.properties.max_concurrency)
+        limits = httpx.Limits(
+            max_connections=self.properties.max_connections,
+            max_keepalive_connections=self.properties.max_connections,
+        )
+        async with httpx.AsyncClient(
+            limits=limits,
+            timeout=self.properties.timeout_seconds,
+            follow_redirects=False,
+        ) as client:
+
+            async def check(token: LoginTokenRead) -> TokenHealthRead:
+                async with semaphore:
+                    return await self._check_token(client, token)
+
+            return await asyncio.gather(*(check(token) for token in tokens))
+
+    async def _check_token(
+        self, client: httpx.AsyncClient, token: LoginTokenRead
+    ) -> TokenHealthRead:
+        if token.is_expired:
+            return TokenHealthRead(email=token.email, status=TokenStatus.EXPIRED)
+        try:
+            response = await client.get(
+                self.tixcraft_api_source.token_probe_url,
+                cookies={"SID": token.sid_value},
+            )
+        except httpx.HTTPError as error:
+            return TokenHealthRead(email=token.email, status=TokenStatus.ERROR, error=str(error))
+
+        location = response.headers.get("location", "")
+        is_redirected_to_login = (
+            response.is_redirect and self.LOGIN_PATH_IDENTIFIER in location.lower()
+        )
+        if is_redirected_to_login or response.status_code in (401, 403):
+            status = TokenStatus.INVALID
+        elif response.is_success:
+            status = TokenStatus.VALID
+        else:
+            return TokenHealthRead(
+                email=token.email,
+                status=TokenStatus.ERROR,
+                status_code=response.status_code,
+                error=f"Unexpected response from {self.tixcraft_api_source.token_probe_url}",
+            )
+        return TokenHealthRead(email=token.email, status=status, status_code=response.status_code)
+
+    def _apply_result(self, token: LoginTokenRead, result: TokenHealthRead) -> Optional[bool]:
+        """
+        Queues re-logins and returns the validity to persist, None keeps the stored state
+        """
+        match result.status:
+            case TokenStatus.VALID:
+                return True
+            case TokenStatus.INVALID:
+                logger.warning(f"[TOKEN HEALTH] Token for email: {token.email} is rejected")
+                self.queue_relogin(token.email)
+                return False
+            case TokenStatus.EXPIRED:
+                self.queue_relogin(token.email)
+            case TokenStatus.ERROR:
+                # network trouble says nothing about the token, keep its state
+                logger.error(f"[TOKEN HEALTH] Check failed for email: {token.email}: {result.error}")
+        return None
+
+
+def read_token_records(path: str) -> Iterable[TokenRecord]:
+    with open(path) as file:
+        for line in file:
+            if line.strip() == "":
+                continue
+            yield TokenRecord.model_validate(json.loads(line))
+
+
+def write_token_records(path: str, records: Iterable[TokenRecord]) -> int:
+    written_count = 0
+    with open(path, "w") as file:
+        for record in records:
+            file.write(record.model_dump_json() + "\n")
+            written_count += 1
+    return written_count
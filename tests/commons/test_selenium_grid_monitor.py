@@ -0,0 +1,222 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from src.commons.selenium_grid_monitor import (
+    GridCapacityTimeoutError,
+    SeleniumGridMonitor,
+    SeleniumGridProperties,
+    parse_grid_status,
+)
+
+# /status of a Selenium Grid 4.23 hub with one busy chrome node and one draining node
+GRID_STATUS_PAYLOAD = {
+    "value": {
+        "ready": True,
+        "message": "Selenium Grid ready.",
+        "nodes": [
+            {
+                "id": "b0c1a8d2-6f0e-4a4e-9a55-1f6a3d1f9c01",
+                "uri": "http://172.18.0.3:5555",
+                "maxSessions": 2,
+                "osInfo": {"arch": "amd64", "name": "Linux", "version": "6.5.0-1025-azure"},
+                "heartbeatPeriod": 60000,
+                "availability": "UP",
+                "version": "4.23.0 (revision 77010cd)",
+                "slots": [
+                    {
+                        "id": {
+                            "hostId": "b0c1a8d2-6f0e-4a4e-9a55-1f6a3d1f9c01",
+                            "id": "5e6a5b1c-1c3d-4f7b-8f0a-2b9e1d3c4a01",
+                        },
+                        "lastStarted": "2024-08-01T10:15:30.123456Z",
+                        "session": {
+                            "capabilities": {"browserName": "chrome", "browserVersion": "127.0.6533.88"},
+                            "sessionId": "8f1e2d3c4b5a69788796a5b4c3d2e1f0",
+                            "start": "2024-08-01T10:15:30.123456Z",
+                            "stereotype": {"browserName": "chrome", "platformName": "linux"},
+                            "uri": "http://172.18.0.3:5555",
+                        },
+                        "stereotype": {"browserName": "chrome", "platformName": "linux"},
+                    },
+                    {
+                        "id": {
+                            "hostId": "b0c1a8d2-6f0e-4a4e-9a55-1f6a3d1f9c01",
+                            "id": "5e6a5b1c-1c3d-4f7b-8f0a-2b9e1d3c4a02",
+                        },
+                        "lastStarted": "1970-01-01T00:00:00Z",
+                        "session": None,
+                        "stereotype": {"browserName": "chrome", "platformName": "linux"},
+                    },
+                ],
+            },
+            {
+                "id": "c7d8e9f0-1a2b-4c3d-8e4f-5a6b7c8d9e02",
+                "uri": "http://172.18.0.4:5555",
+                "maxSessions": 1,
+                "availability": "DRAINING",
+                "slots": [
+                    {
+                        "id": {
+                            "hostId": "c7d8e9f0-1a2b-4c3d-8e4f-5a6b7c8d9e02",
+                            "id": "9a8b7c6d-5e4f-4a3b-2c1d-0e9f8a7b6c01",
+                        },
+                        "lastStarted": "1970-01-01T00:00:00Z",
+                        "session": None,
+                        "stereotype": {"browserName": "chrome", "platformName": "linux"},
+                    }
+                ],
+            },
+        ],
+    }
+}
+
+
+def test_parse_grid_status_reads_nodes_and_sessions() -> None:
+    is_ready, nodes = parse_grid_status(GRID_STATUS_PAYLOAD)
+
+    assert is_ready
+    assert [node.uri for node in nodes] == ["http://172.18.0.3:5555", "http://172.18.0.4:5555"]
+    busy_node, draining_node = nodes
+    assert busy_node.max_sessions == 2
+    assert busy_node.slot_count == 2
+    assert busy_node.session_ids == ["8f1e2d3c4b5a69788796a5b4c3d2e1f0"]
+    assert busy_node.free_slots == 1
+    assert busy_node.is_healthy
+    assert draining_node.free_slots == 1
+    assert not draining_node.is_healthy
+
+
+def test_parse_grid_status_caps_free_slots_at_max_sessions() -> None:
+    payload = {
+        "value": {
+            "ready": True,
+            "nodes": [
+                {
+                    "id": "node",
+                    "uri": "http://node:5555",
+                    "maxSessions": 1,
+                    "availability": "UP",
+                    "slots": [{"session": None}, {"session": None}, {"session": None}],
+                }
+            ],
+        }
+    }
+
+    _, nodes = parse_grid_status(payload)
+
+    assert nodes[0].free_slots == 1
+
+
+def test_parse_grid_status_without_value_is_not_ready() -> None:
+    assert parse_grid_status({}) == (False, [])
+
+
+class StubHub:
+    """
+    /status of a one node hub whose slots are filled by session_ids
+    """
+
+    def __init__(self, max_sessions: int) -> None:
+        self.max_sessions = max_sessions
+        self.session_ids: list[str] = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        slots = [{"session": {"sessionId": session_id}} for session_id in self.session_ids]
+        slots += [{"session": None}] * (self.max_sessions - len(self.session_ids))
+        node = {
+            "id": "node",
+            "uri": "http://node:5555",
+            "maxSessions": self.max_sessions,
+            "availability": "UP",
+            "slots": slots,
+        }
+        return httpx.Response(200, json={"value": {"ready": True, "nodes": [node]}})
+
+
+def create_monitor(hub: StubHub, **properties) -> SeleniumGridMonitor:
+    monitor = SeleniumGridMonitor()
+    monitor.properties = SeleniumGridProperties(
+        poll_interval_seconds=0.01, is_probing_nodes=False, **properties
+    )
+    monitor.client = httpx.Client(transport=httpx.MockTransport(hub.handle))
+    return monitor
+
+
+def is_admitted(monitor: SeleniumGridMonitor) -> bool:
+    try:
+        with monitor.admit():
+            return True
+    except GridCapacityTimeoutError:
+        return False
+
+
+def test_admit_waits_until_a_slot_frees() -> None:
+    hub = StubHub(max_sessions=1)
+    hub.session_ids = ["busy"]
+    monitor = create_monitor(hub, admission_timeout_seconds=5)
+    admitted = threading.Event()
+
+    def admit() -> None:
+        with monitor.admit():
+            admitted.set()
+
+    waiter = threading.Thread(target=admit)
+    waiter.start()
+    assert not admitted.wait(0.2)
+
+    hub.session_ids = []
+    waiter.join(5)
+
+    assert admitted.is_set()
+
+
+def test_admit_reserves_the_slot_until_the_session_shows_up() -> None:
+    hub = StubHub(max_sessions=1)
+    monitor = create_monitor(hub, admission_timeout_seconds=0.1, pending_session_timeout_seconds=30)
+
+    with monitor.admit() as admission:
+        # the request is in flight, the only slot is taken
+        assert not is_admitted(monitor)
+        admission.session_id = "created"
+    # /status does not list the new session yet, it stays reserved
+    assert monitor.pending_sessions.keys() == {"created"}
+    assert not is_admitted(monitor)
+
+    hub.session_ids = ["created"]
+    monitor.refresh(is_forced=True)
+    assert monitor.pending_sessions == {}
+    assert not is_admitted(monitor)
+
+    hub.session_ids = []
+    monitor.notify_capacity_changed("created")
+    assert is_admitted(monitor)
+
+
+def test_pending_session_expires_after_its_timeout() -> None:
+    hub = StubHub(max_sessions=1)
+    monitor = create_monitor(hub, admission_timeout_seconds=0.1, pending_session_timeout_seconds=0.2)
+
+    with monitor.admit() as admission:
+        admission.session_id = "never-listed"
+    assert not is_admitted(monitor)
+
+    time.sleep(0.3)
+
+    assert is_admitted(monitor)
+    assert monitor.pending_sessions == {}
+
+
+def test_admit_raises_once_the_admission_timeout_passes() -> None:
+    hub = StubHub(max_sessions=1)
+    hub.session_ids = ["busy"]
+    monitor = create_monitor(hub, admission_timeout_seconds=0.2)
+
+    started_at = time.monotonic()
+    with pytest.raises(GridCapacityTimeoutError):
+        with monitor.admit():
+            pass
+
+    assert time.monotonic() - started_at >= 0.2
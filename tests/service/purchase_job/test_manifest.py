@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+
+from src.service.purchase_job.manifest import iter_manifest, split_key_words
+
+EVENT_RECORD = {
+    "event_key_word": "Concert",
+    "event_datetime": "2024/12/07 (六) 19:30",
+    "seat_key_word": "VIP",
+    "number_of_tickets": 2,
+    "delivery_key_words": ["電子票"],
+    "payment_key_words": ["ATM"],
+}
+
+CSV_HEADER = (
+    "email,password,event_key_word,event_datetime,seat_key_word,number_of_tickets,"
+    "delivery_key_words,payment_key_words,exclude_key_words,priority,start_at\n"
+)
+
+
+def write_manifest(tmp_path: Path, file_name: str, content: str) -> str:
+    manifest_path = tmp_path / file_name
+    manifest_path.write_text(content, encoding="utf-8")
+    return str(manifest_path)
+
+
+def test_iter_manifest_reads_jsonl_records(tmp_path: Path) -> None:
+    record = {
+        "credential": {"email": "user@example.com", "password": "secret"},
+        "event": EVENT_RECORD,
+        "priority": 3,
+        "start_at": "2024-12-07T12:00:00",
+    }
+    manifest_path = write_manifest(tmp_path, "manifest.jsonl", json.dumps(record) + "\n")
+
+    lines = list(iter_manifest(manifest_path))
+
+    assert len(lines) == 1
+    request = lines[0].request
+    assert request is not None
+    assert request.credential.email == "user@example.com"
+    assert request.event.seat_key_word == "VIP"
+    assert request.priority == 3
+    assert request.start_at is not None and request.start_at.hour == 12
+
+
+def test_iter_manifest_reports_bad_jsonl_lines_and_skips_blank_ones(tmp_path: Path) -> None:
+    valid_record = json.dumps({"credential": {"email": "a@example.com", "password": "p"}, "event": EVENT_RECORD})
+    missing_event = json.dumps({"credential": {"email": "b@example.com", "password": "p"}})
+    manifest_path = write_manifest(
+        tmp_path, "manifest.jsonl", "\n".join([valid_record, "{not json", "", missing_event]) + "\n"
+    )
+
+    lines = list(iter_manifest(manifest_path))
+
+    assert [line.line_number for line in lines] == [1, 2, 4]
+    assert lines[0].request is not None and lines[0].error is None
+    assert lines[1].request is None and lines[1].error is not None
+    assert lines[2].request is None and "event" in (lines[2].error or "")
+
+
+def test_iter_manifest_reads_csv_rows(tmp_path: Path) -> None:
+    row = 'user@example.com,secret,Concert,2024/12/07,VIP,2,"電子票, 超商",ATM,輪椅,1,\n'
+    manifest_path = write_manifest(tmp_path, "manifest.csv", CSV_HEADER + row)
+
+    lines = list(iter_manifest(manifest_path))
+
+    assert len(lines) == 1
+    request = lines[0].request
+    assert request is not None
+    assert request.event.delivery_key_words == ["電子票", "超商"]
+    assert request.event.exclude_key_words == ["輪椅"]
+    assert request.priority == 1
+    assert request.start_at is None
+
+
+def test_iter_manifest_reports_invalid_csv_rows(tmp_path: Path) -> None:
+    row = "user@example.com,secret,Concert,2024/12/07,VIP,two,,ATM,,,\n"
+    manifest_path = write_manifest(tmp_path, "manifest.csv", CSV_HEADER + row)
+
+    lines = list(iter_manifest(manifest_path))
+
+    assert len(lines) == 1
+    assert lines[0].line_number == 1
+    assert lines[0].request is None
+    assert "number_of_tickets" in (lines[0].error or "")
+
+
+def test_split_key_words_drops_empty_entries() -> None:
+    assert split_key_words(" ATM, ,信用卡,") == ["ATM", "信用卡"]
+    assert split_key_words("") == []
@@ -0,0 +1,38 @@
+from typing import Optional
+
+import pytest
+
+from src.service.ticket_bot.waiting_room import parse_position, parse_wait_seconds
+
+
+@pytest.mark.parametrize(
+    ("raw_text", "expected"),
+    [
+        ("12 / 300", 12),
+        ("您的順位: 1,234 / 5,000", 1234),
+        ("Position 7", 7),
+        ("", None),
+        ("請稍候", None),
+    ],
+)
+def test_parse_position_reads_the_first_number(raw_text: str, expected: Optional[int]) -> None:
+    assert parse_position(raw_text) == expected
+
+
+@pytest.mark.parametrize(
+    ("raw_text", "expected"),
+    [
+        ("12 分鐘", 720),
+        ("1 小時 30 分", 5400),
+        ("1 hour 5 min 10 seconds", 3910),
+        ("2h 15m", 8100),
+        ("3 mins", 180),
+        ("45 秒", 45),
+        ("1:05:00", 3900),
+        ("04:30", 270),
+        ("90", 90),
+        ("", None),
+    ],
+)
+def test_parse_wait_seconds_sums_every_unit(raw_text: str, expected: Optional[int]) -> None:
+    assert parse_wait_seconds(raw_text) == expected